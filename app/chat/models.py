@@ -1,4 +1,8 @@
-from pydantic import BaseModel
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from app.config import config
 
 
 class QueryRequest(BaseModel):
@@ -7,7 +11,36 @@ class QueryRequest(BaseModel):
     query: str  # Changed from 'question' to 'query' as per endpoint name
 
 
+class BatchQueryRequest(BaseModel):
+    """Request model for the batch query endpoint."""
+
+    queries: list[str] = Field(min_length=1, max_length=config.batch_max_queries)
+
+
+class CacheStatus(BaseModel):
+    """Whether the answer was served from a cache."""
+
+    hit: bool
+    # "exact", "semantic", or "coalesced" when it was shared with an identical
+    # request already in flight
+    source: Optional[str] = None
+    similarity: Optional[float] = None
+
+
 class QueryResponse(BaseModel):
     """Response model for the query endpoint."""
 
     answer: str
+    cache: Optional[CacheStatus] = None
+    # Shortcuts taken to stay within the request budget, e.g. "grading_skipped"
+    degraded: list[str] = []
+
+
+class BatchQueryResult(BaseModel):
+    """One line of the batch query response: the answer to ``queries[index]``,
+    or the error that stopped it."""
+
+    index: int
+    query: str
+    response: Optional[QueryResponse] = None
+    error: Optional[str] = None
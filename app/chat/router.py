@@ -1,10 +1,29 @@
+import asyncio
+import json
 import logging
+from functools import partial
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from langchain_core.messages import HumanMessage
 
-from app.chat.models import QueryRequest, QueryResponse
-from app.core.agents.agentic_graph import graph
+from app.chat.models import (
+    BatchQueryRequest,
+    BatchQueryResult,
+    CacheStatus,
+    QueryRequest,
+    QueryResponse,
+)
+from app.common.async_streams import map_unordered
+from app.config import config
+from app.core.agents.agentic_graph import (
+    get_graph,
+    run_within_deadline,
+    stream_within_deadline,
+)
+from app.core.agents.budget import start_budget
+from app.core.cache.response_cache import normalise_query, response_cache
+from app.core.cache.semantic_cache import lookup_semantic_cache, store_semantic_cache
 
 logger = logging.getLogger(__name__)
 
@@ -12,42 +31,69 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/query", tags=["Query"])
 
 
-async def get_agent_final_response(user_query: str) -> str:
-    """Invokes the agent graph and extracts the final response."""
-    logger.info("Received query for agent processing: '%s'", user_query)
-    # Initial state for the graph, ensuring correct message format
-    initial_state = {"messages": [HumanMessage(content=user_query)]}
+# Graph nodes reported to /query/stream clients as progress events
+GRAPH_NODES = {"route", "agent", "retrieve", "grade_documents", "rewrite", "generate"}
+
+
+def extract_final_answer(final_state) -> str:
+    """Extracts the text of the last message in the graph's final state."""
     final_answer = (
         "Sorry, I encountered an issue processing your query."  # Default error message
     )
-
-    try:
-        # Use ainvoke for a single, complete result
-        final_state = await graph.ainvoke(initial_state)
-
-        # --- Extract the final response ---
-        if final_state and "messages" in final_state and final_state["messages"]:
-            last_message = final_state["messages"][-1]
-            if isinstance(last_message, str):
-                final_answer = last_message
-                logger.debug("Extracted final answer as string from last message.")
-            elif hasattr(
-                last_message, "content"
-            ):  # Handles AIMessage, HumanMessage etc.
-                final_answer = last_message.content
-                logger.debug(
-                    "Extracted final answer from content of %s.", type(last_message)
-                )
-            else:
-                logger.warning(
-                    "Could not extract final answer from last message structure: %s",
-                    last_message,
-                )
+    if final_state and "messages" in final_state and final_state["messages"]:
+        last_message = final_state["messages"][-1]
+        if isinstance(last_message, str):
+            final_answer = last_message
+            logger.debug("Extracted final answer as string from last message.")
+        elif hasattr(last_message, "content"):  # Handles AIMessage, HumanMessage etc.
+            final_answer = last_message.content
+            logger.debug(
+                "Extracted final answer from content of %s.", type(last_message)
+            )
         else:
             logger.warning(
-                "Final state or messages list is missing/empty: %s", final_state
+                "Could not extract final answer from last message structure: %s",
+                last_message,
+            )
+    else:
+        logger.warning("Final state or messages list is missing/empty: %s", final_state)
+    return final_answer
+
+
+async def answer_query(user_query: str) -> tuple[QueryResponse, bool]:
+    """Invokes the agent graph and extracts the final response.
+
+    Answers to questions close enough to one already answered for the current
+    index version are served from the semantic cache instead. Also returns
+    whether the answer may be cached.
+    """
+    cache_status = None
+    query_embedding = None
+    if config.semantic_cache_enabled:
+        cached, query_embedding = await lookup_semantic_cache(user_query)
+        cache_status = CacheStatus(
+            hit=cached.hit, source="semantic", similarity=cached.similarity
+        )
+        if cached.hit:
+            logger.info("Semantic cache hit (similarity %.3f)", cached.similarity)
+            return QueryResponse(answer=cached.answer, cache=cache_status), True
+
+    # Initial state for the graph, ensuring correct message format
+    initial_state = {"messages": [HumanMessage(content=user_query)]} | start_budget()
+
+    try:
+        # Runs to a single, complete result, cut short at the deadline
+        final_state = await run_within_deadline(get_graph(), initial_state)
+        final_answer = extract_final_answer(final_state)
+        degraded = final_state.get("degraded") or []
+
+        # Only answers generated from retrieved documents, without cutting
+        # corners to meet the deadline, are worth reusing
+        cacheable = final_state.get("sources") is not None and not degraded
+        if query_embedding is not None and cacheable:
+            await store_semantic_cache(
+                user_query, query_embedding, final_answer, final_state["sources"]
             )
-        # --- End Extraction Logic ---
 
         logger.info(
             "Agent processing complete."
@@ -59,7 +105,27 @@ async def get_agent_final_response(user_query: str) -> str:
         error_detail = "An internal error occurred while processing your query."
         raise HTTPException(status_code=500, detail=error_detail) from e
 
-    return final_answer
+    response = QueryResponse(answer=final_answer, cache=cache_status, degraded=degraded)
+    return response, cacheable
+
+
+async def get_agent_final_response(user_query: str) -> QueryResponse:
+    """Answers the query, serving repeats of the same question from the exact
+    match cache and coalescing identical concurrent queries onto one run."""
+    logger.info("Received query for agent processing: '%s'", user_query)
+    if not config.response_cache_enabled:
+        response, _ = await answer_query(user_query)
+        return response
+
+    async def compute(query):
+        response, cacheable = await answer_query(query)
+        return response.model_dump(), cacheable
+
+    value, source = await response_cache.get_or_compute(user_query, compute)
+    response = QueryResponse(**value)
+    if source is not None:
+        response.cache = CacheStatus(hit=True, source=source)
+    return response
 
 
 # Define the POST endpoint
@@ -69,5 +135,157 @@ async def handle_query(request: QueryRequest):
     Accepts a user query via POST request (JSON body) and returns
     the agent's final response.
     """
-    final_answer = await get_agent_final_response(request.query)
-    return QueryResponse(answer=final_answer)
+    return await get_agent_final_response(request.query)
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Nodes whose output is forwarded to /query/stream clients when they finish
+NODE_OUTPUTS = {"route", "grade_documents", "generate"}
+
+
+def node_output_event(node: str, output: dict) -> str:
+    if node == "route":
+        return sse_event("route", output.get("query_route") or {})
+    if node == "grade_documents":
+        return sse_event("grading", {"grades": output.get("document_grades")})
+    return sse_event("sources", {"sources": output.get("sources") or []})
+
+
+async def stream_agent_response(user_query: str):
+    """Runs the agent graph and yields Server-Sent Events as it progresses.
+
+    Emits a ``node`` event as each graph node starts, a ``route`` event with
+    the pre-routing decision, a ``grading`` event with
+    the per-document relevance verdicts, ``token`` events for the
+    answer as the generate node produces it, then ``sources`` and ``done``,
+    which lists any degradations made to meet the request budget.
+    Answers that do not go through generate, or that the request deadline
+    cuts off before any token, are sent as a single ``answer``.
+    """
+    logger.info("Received query for streaming agent processing: '%s'", user_query)
+    initial_state = {"messages": [HumanMessage(content=user_query)]} | start_budget()
+    streamed_tokens = False
+    final_state = None
+
+    try:
+        async for event in stream_within_deadline(get_graph(), initial_state):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+
+            if (
+                kind == "on_chain_start"
+                and event["name"] == node
+                and node in GRAPH_NODES
+            ):
+                yield sse_event("node", {"node": node})
+            elif kind == "on_chat_model_stream" and node == "generate":
+                token = event["data"]["chunk"].content
+                if token:
+                    streamed_tokens = True
+                    yield sse_event("token", {"token": token})
+            elif (
+                kind == "on_chain_end"
+                and event["name"] == node
+                and node in NODE_OUTPUTS
+            ):
+                yield node_output_event(node, event["data"].get("output") or {})
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                final_state = event["data"].get("output")
+
+        if not streamed_tokens:
+            yield sse_event("answer", {"answer": extract_final_answer(final_state)})
+        degraded = (final_state or {}).get("degraded") or []
+        yield sse_event("done", {"degraded": degraded})
+        logger.info("Streaming agent processing complete.")
+
+    except Exception as e:
+        # Headers have already been sent, so report the failure in-stream
+        logger.exception("Error during streaming agent graph execution: %s", e)
+        yield sse_event(
+            "error",
+            {"detail": "An internal error occurred while processing your query."},
+        )
+
+
+@router.post("/stream")
+async def handle_query_stream(request: QueryRequest):
+    """
+    Accepts a user query via POST request (JSON body) and streams the agent's
+    progress and answer back as Server-Sent Events.
+    """
+    return StreamingResponse(
+        stream_agent_response(request.query),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Graph runs in flight across every /query/batch request, created on first
+# use so it belongs to the serving event loop
+_batch_semaphore = None
+
+
+def get_batch_semaphore() -> asyncio.Semaphore:
+    global _batch_semaphore
+    if _batch_semaphore is None:
+        _batch_semaphore = asyncio.Semaphore(config.batch_concurrency)
+    return _batch_semaphore
+
+
+def group_queries(queries: list[str]) -> list[list[int]]:
+    """Indices of each distinct query in the batch, compared as the response
+    cache compares them."""
+    groups: dict[str, list[int]] = {}
+    for index, query in enumerate(queries):
+        groups.setdefault(normalise_query(query), []).append(index)
+    return list(groups.values())
+
+
+async def answer_batch_group(
+    queries: list[str], indices: list[int]
+) -> list[BatchQueryResult]:
+    """Answers one distinct query and shares the result, or its error, with
+    every position in the batch it appears at."""
+    response = error = None
+    try:
+        async with get_batch_semaphore():
+            response = await get_agent_final_response(queries[indices[0]])
+    except HTTPException as e:
+        error = e.detail
+    except Exception as e:
+        logger.exception("Error answering batch query: %s", e)
+        error = "An internal error occurred while processing your query."
+    return [
+        BatchQueryResult(index=i, query=queries[i], response=response, error=error)
+        for i in indices
+    ]
+
+
+async def stream_batch_response(queries: list[str]):
+    """Answers the distinct queries concurrently and yields one NDJSON line
+    per query in the batch as its answer completes."""
+    groups = group_queries(queries)
+    logger.info("Received batch of %d queries (%d distinct)", len(queries), len(groups))
+    concurrency = min(config.batch_concurrency, len(groups))
+    answer = partial(answer_batch_group, queries)
+    async for results in map_unordered(answer, groups, concurrency):
+        for result in results:
+            yield result.model_dump_json() + "\n"
+
+
+@router.post("/batch")
+async def handle_query_batch(request: BatchQueryRequest):
+    """
+    Accepts a list of queries via POST request (JSON body) and streams one
+    JSON line per query back as each answer completes, so lines arrive out
+    of order; ``index`` gives the query's position in the request. Identical
+    queries are answered once, and a failed query is reported in its line's
+    ``error`` without failing the rest of the batch.
+    """
+    return StreamingResponse(
+        stream_batch_response(request.queries),
+        media_type="application/x-ndjson",
+    )
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.retrievers import BaseRetriever
+
+from app.chat import router as chat_router
+from app.core.agents import agentic_graph
+
+ANSWER = "yes, capital grants are open"
+
+
+class FakeChatModel(FakeListChatModel):
+    responses: list[str] = [ANSWER]
+
+    def bind_tools(self, *_args, **_kwargs):
+        return self
+
+
+class FakeRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query: str, *, run_manager):  # noqa: ARG002
+        return [
+            Document(
+                page_content=f"Guidance for {query}",
+                metadata={"title": "Capital Grants", "url": "https://www.gov.uk/x"},
+            )
+        ]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(chat_router.config, "semantic_cache_enabled", False)
+    monkeypatch.setattr(chat_router.config, "response_cache_enabled", False)
+    monkeypatch.setattr(agentic_graph, "azure_gpt4o", lambda **_: FakeChatModel())
+    monkeypatch.setattr(agentic_graph, "get_retriever", FakeRetriever)
+    monkeypatch.setattr(agentic_graph, "get_tools", list)
+    graph = agentic_graph.build_graph()
+    monkeypatch.setattr(chat_router, "get_graph", lambda: graph)
+
+    app = FastAPI()
+    app.include_router(chat_router.router)
+    return TestClient(app)
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_query_returns_full_answer(client):
+    response = client.post("/query/", json={"query": "Which farm grants are open?"})
+
+    assert response.status_code == 200
+    assert response.json()["answer"] == (
+        f"{ANSWER}\n\nSources:\nCapital Grants: https://www.gov.uk/x"
+    )
+
+
+def test_query_stream_sends_nodes_tokens_then_sources(client):
+    response = client.post(
+        "/query/stream", json={"query": "Which farm grants are open?"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    names = [name for name, _ in events]
+
+    assert [data["node"] for name, data in events if name == "node"] == [
+        "route",
+        "retrieve",
+        "grade_documents",
+        "generate",
+    ]
+    route = events[names.index("route")][1]
+    assert (route["route"], route["reason"], route["keyword"]) == (
+        "retrieve",
+        "keyword",
+        "farm",
+    )
+    assert events[names.index("grading")][1]["grades"][0]["relevant"]
+    tokens = [data["token"] for name, data in events if name == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == ANSWER
+    assert names.index("sources") > names.index("token")
+    assert events[names.index("sources")][1] == {
+        "sources": ["Capital Grants: https://www.gov.uk/x"]
+    }
+    assert names[-1] == "done"
+
+
+class StalledChatModel(FakeChatModel):
+    """Generator whose call runs far past the request deadline."""
+
+    async def _agenerate(self, *args, **kwargs):
+        await asyncio.sleep(10)
+        return await super()._agenerate(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        await asyncio.sleep(10)
+        async for chunk in super()._astream(*args, **kwargs):
+            yield chunk
+
+
+@pytest.fixture
+def stalled_client(client, monkeypatch):
+    # Only generate asks for a streaming client
+    monkeypatch.setattr(
+        agentic_graph,
+        "azure_gpt4o",
+        lambda streaming=False, **_: (
+            StalledChatModel() if streaming else FakeChatModel()
+        ),
+    )
+    monkeypatch.setattr(chat_router.config, "request_deadline_seconds", 0.5)
+    monkeypatch.setattr(chat_router.config, "budget_grading_seconds", 0.0)
+    return client
+
+
+def test_query_past_deadline_answers_with_best_sources(stalled_client):
+    start = time.perf_counter()
+    response = stalled_client.post(
+        "/query/", json={"query": "Which farm grants are open?"}
+    )
+
+    assert time.perf_counter() - start < 2
+    body = response.json()
+    assert body["answer"] == (
+        f"{agentic_graph.DEADLINE_ANSWER} These pages may help:\n"
+        "Capital Grants: https://www.gov.uk/x"
+    )
+    assert body["degraded"] == ["deadline_exceeded"]
+
+
+def test_query_stream_past_deadline_answers_with_best_sources(stalled_client):
+    start = time.perf_counter()
+    response = stalled_client.post(
+        "/query/stream", json={"query": "Which farm grants are open?"}
+    )
+
+    assert time.perf_counter() - start < 2
+    events = parse_sse(response.text)
+    assert [data["node"] for name, data in events if name == "node"][-1] == ("generate")
+    assert "token" not in [name for name, _ in events]
+    assert events[-2][0] == "answer"
+    assert events[-2][1]["answer"].startswith(agentic_graph.DEADLINE_ANSWER)
+    assert events[-1] == ("done", {"degraded": ["deadline_exceeded"]})
+
+
+class CountingGraph:
+    """Wraps the graph to count runs and fail queries mentioning "boom"."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.queries = []
+
+    async def astream(self, state, **kwargs):
+        query = state["messages"][0].content
+        self.queries.append(query)
+        if "boom" in query:
+            msg = "graph failed"
+            raise RuntimeError(msg)
+        async for values in self.graph.astream(state, **kwargs):
+            yield values
+
+
+def test_query_batch_dedupes_and_reports_errors_per_item(client, monkeypatch):
+    counting = CountingGraph(chat_router.get_graph())
+    monkeypatch.setattr(chat_router, "get_graph", lambda: counting)
+    monkeypatch.setattr(chat_router, "_batch_semaphore", None)
+    queries = [
+        "Which farm grants are open?",
+        "boom",
+        "which farm grants are open",
+        "Is there funding for slurry stores?",
+    ]
+
+    response = client.post("/query/batch", json={"queries": queries})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results = {line["index"]: line for line in lines}
+    assert sorted(results) == [0, 1, 2, 3]
+    assert sorted(counting.queries) == sorted([queries[0], queries[1], queries[3]])
+    assert results[1]["response"] is None
+    assert results[1]["error"]
+    for index in (0, 2, 3):
+        assert results[index]["error"] is None
+        assert results[index]["query"] == queries[index]
+        assert results[index]["response"]["answer"].startswith(ANSWER)
+
+
+def test_query_batch_rejects_empty_list(client):
+    assert client.post("/query/batch", json={"queries": []}).status_code == 422
@@ -1,17 +1,134 @@
+import weakref
+from logging import getLogger
+from typing import Optional
+
+import httpx
 from langchain_openai import AzureChatOpenAI
 
 from app.config import config as configs
 
+logger = getLogger(__name__)
 
-def azure_gpt4(temperature=0, streaming=True):
-    try:
-        gpt4_chat_azure = AzureChatOpenAI(
-            azure_deployment=configs.AZURE_OPENAI_DEPLOYMENT_NAME,
+
+class ConnectionPoolStats:
+    """Counts requests sent over the shared LLM connection pool and how many of
+    them reused an already open connection rather than opening a new one."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+        # httpcore exposes the underlying socket stream on each response, one
+        # stream per pooled connection, so a stream we have not seen before
+        # means a new connection (and TLS handshake) was made.
+        self._streams = weakref.WeakSet()
+
+    def record(self, response: httpx.Response):
+        self.requests += 1
+        stream = response.extensions.get("network_stream")
+        if stream is None:
+            return
+        if stream in self._streams:
+            self.connections_reused += 1
+        else:
+            self._streams.add(stream)
+            self.connections_opened += 1
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": self.connections_reused,
+        }
+
+
+pool_stats = ConnectionPoolStats()
+
+# Process-wide registry of chat clients keyed by (deployment, temperature, streaming).
+# Every client shares the same httpx pools so keep-alive connections to Azure
+# OpenAI are reused across graph nodes and requests.
+_chat_clients: dict[tuple[Optional[str], float, bool], AzureChatOpenAI] = {}
+_http_client: Optional[httpx.Client] = None
+_http_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _pool_limits():
+    return httpx.Limits(
+        max_connections=configs.llm_pool_max_connections,
+        max_keepalive_connections=configs.llm_pool_max_keepalive_connections,
+        keepalive_expiry=configs.llm_pool_keepalive_expiry,
+    )
+
+
+async def _async_record_response(response):
+    pool_stats.record(response)
+
+
+def get_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(
+            limits=_pool_limits(),
+            event_hooks={"response": [pool_stats.record]},
+        )
+    return _http_client
+
+
+def get_http_async_client() -> httpx.AsyncClient:
+    global _http_async_client
+    if _http_async_client is None:
+        _http_async_client = httpx.AsyncClient(
+            limits=_pool_limits(),
+            event_hooks={"response": [_async_record_response]},
+        )
+    return _http_async_client
+
+
+def get_chat_client(
+    deployment: Optional[str], temperature=0, streaming=False
+) -> AzureChatOpenAI:
+    """Returns the shared chat client for a deployment, creating it on first use."""
+    key = (deployment, float(temperature), bool(streaming))
+    chat_client = _chat_clients.get(key)
+    if chat_client is None:
+        chat_client = AzureChatOpenAI(
+            azure_deployment=deployment,
             temperature=temperature,
             api_key=configs.AZURE_OPENAI_API_KEY,
             azure_endpoint=configs.AZURE_OPENAI_ENDPOINT,
             api_version=configs.AZURE_API_VERSION,
             streaming=streaming,
+            http_client=get_http_client(),
+            http_async_client=get_http_async_client(),
+        )
+        _chat_clients[key] = chat_client
+        logger.info("Created chat client for %s (temperature=%s, streaming=%s)", *key)
+    return chat_client
+
+
+def llm_pool_stats():
+    """Connection reuse counters plus the number of pooled clients handed out."""
+    stats = pool_stats.as_dict()
+    stats["chat_clients"] = len(_chat_clients)
+    return stats
+
+
+async def close_chat_clients():
+    """Closes the shared connection pools. Called from the FastAPI lifespan."""
+    global _http_client, _http_async_client
+    _chat_clients.clear()
+    if _http_async_client is not None:
+        await _http_async_client.aclose()
+        _http_async_client = None
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
+
+
+def azure_gpt4(temperature=0, streaming=True):
+    try:
+        gpt4_chat_azure = get_chat_client(
+            configs.AZURE_OPENAI_DEPLOYMENT_NAME, temperature, streaming
         )
         print("gpt4_chat_azure initialized successfully.")
         return gpt4_chat_azure
@@ -21,13 +138,8 @@ def azure_gpt4(temperature=0, streaming=True):
 
 def azure_gpt4o(temperature=0, streaming=True):
     try:
-        gpt4o_chat_azure = AzureChatOpenAI(
-            azure_deployment=configs.AZURE_OPENAI_DEPLOYMENT_NAME_4o,
-            temperature=temperature,
-            api_key=configs.AZURE_OPENAI_API_KEY,
-            azure_endpoint=configs.AZURE_OPENAI_ENDPOINT,
-            api_version=configs.AZURE_API_VERSION,
-            streaming=streaming,
+        gpt4o_chat_azure = get_chat_client(
+            configs.AZURE_OPENAI_DEPLOYMENT_NAME_4o, temperature, streaming
         )
         print("gpt4o_chat_azure initialized successfully.")
         return gpt4o_chat_azure
@@ -0,0 +1,49 @@
+import httpx
+import pytest
+
+from app.clients import azure_openai_config
+from app.clients.azure_openai_config import (
+    ConnectionPoolStats,
+    close_chat_clients,
+    get_chat_client,
+    get_http_async_client,
+)
+
+
+@pytest.fixture(autouse=True)
+def azure_settings(monkeypatch):
+    monkeypatch.setattr(azure_openai_config.configs, "AZURE_OPENAI_API_KEY", "key")
+    monkeypatch.setattr(
+        azure_openai_config.configs,
+        "AZURE_OPENAI_ENDPOINT",
+        "https://example.openai.azure.com",
+    )
+    monkeypatch.setattr(azure_openai_config.configs, "AZURE_API_VERSION", "2024-06-01")
+
+
+@pytest.mark.asyncio
+async def test_chat_clients_are_reused_per_key():
+    first = get_chat_client("gpt-4o", temperature=0, streaming=False)
+
+    assert get_chat_client("gpt-4o", temperature=0, streaming=False) is first
+    assert get_chat_client("gpt-4o", temperature=0, streaming=True) is not first
+    assert first.http_async_client is get_http_async_client()
+
+    await close_chat_clients()
+    assert get_chat_client("gpt-4o", temperature=0, streaming=False) is not first
+    await close_chat_clients()
+
+
+def test_pool_stats_count_new_and_reused_connections():
+    stats = ConnectionPoolStats()
+    first_connection = httpx.ByteStream(b"")
+    second_connection = httpx.ByteStream(b"")
+
+    for stream in [first_connection, first_connection, second_connection]:
+        stats.record(httpx.Response(200, extensions={"network_stream": stream}))
+
+    assert stats.as_dict() == {
+        "requests": 3,
+        "connections_opened": 2,
+        "connections_reused": 1,
+    }
@@ -0,0 +1,139 @@
+import asyncio
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable
+from concurrent.futures import Executor
+from typing import Any, Optional, TypeVar, Union
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+async def aiter_items(items: Union[Iterable[T], AsyncIterable[T]]) -> AsyncIterator[T]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def _work(func, items, lock, results):
+    """Pulls items one at a time and queues each result, or the error."""
+    while True:
+        try:
+            async with lock:
+                item = await items.__anext__()
+            result = await func(item)
+        except StopAsyncIteration:
+            break
+        except Exception as e:
+            result = _Failed(e)
+        await results.put(result)
+    await results.put(_DONE)
+
+
+async def map_unordered(
+    func: Callable[[T], Awaitable[R]],
+    items: Union[Iterable[T], AsyncIterable[T]],
+    concurrency: int,
+) -> AsyncIterator[R]:
+    """Runs ``func`` over ``items`` with at most ``concurrency`` calls in flight
+    and yields results as they complete.
+
+    Items are pulled lazily, so a slow consumer holds back the producer
+    instead of results piling up in memory.
+    """
+    results: asyncio.Queue[Any] = asyncio.Queue(maxsize=concurrency)
+    iterator = aiter_items(items)
+    lock = asyncio.Lock()
+    tasks = [
+        asyncio.create_task(_work(func, iterator, lock, results))
+        for _ in range(concurrency)
+    ]
+    try:
+        finished = 0
+        while finished < concurrency:
+            result = await results.get()
+            if result is _DONE:
+                finished += 1
+            elif isinstance(result, _Failed):
+                raise result.error
+            else:
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def until_deadline(items: AsyncIterable[T], seconds: float) -> AsyncIterator[T]:
+    """Yields from ``items`` for at most ``seconds``, then closes it and raises
+    ``asyncio.TimeoutError``. Time the consumer spends between items counts."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    iterator = items.__aiter__()
+    try:
+        while True:
+            remaining = max(deadline - loop.time(), 0)
+            try:
+                item = await asyncio.wait_for(iterator.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        await iterator.aclose()
+
+
+async def batched(
+    items: Union[Iterable[T], AsyncIterable[T]], size: int
+) -> AsyncIterator[list[T]]:
+    batch = []
+    async for item in aiter_items(items):
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _call_each(func, batch):
+    """Runs in the executor: one ``(result, error)`` pair per item, so one
+    bad item does not fail the rest of its batch."""
+    results = []
+    for item in batch:
+        try:
+            results.append((func(item), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+
+async def map_in_executor(
+    executor: Optional[Executor],
+    func: Callable[[T], R],
+    items: Union[Iterable[T], AsyncIterable[T]],
+    concurrency: int = 1,
+    chunksize: int = 1,
+) -> AsyncIterator[tuple[T, Optional[R], Optional[Exception]]]:
+    """Runs the blocking ``func`` over ``items`` in ``executor`` (the default
+    thread pool if None) and yields ``(item, result, error)`` as each batch
+    of ``chunksize`` items completes.
+
+    With a process pool, ``func`` and the items must be picklable; batching
+    amortises the cost of sending them to the workers.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def run(batch):
+        results = await loop.run_in_executor(executor, _call_each, func, batch)
+        return zip(batch, results)
+
+    async for pairs in map_unordered(run, batched(items, chunksize), concurrency):
+        for item, (result, error) in pairs:
+            yield item, result, error
@@ -0,0 +1,59 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from app.common.async_streams import map_in_executor, map_unordered
+
+
+@pytest.mark.asyncio
+async def test_map_unordered_bounds_concurrency():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def double(n):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01 * (n % 3))
+        in_flight -= 1
+        return n * 2
+
+    results = [n async for n in map_unordered(double, range(10), concurrency=3)]
+
+    assert sorted(results) == [n * 2 for n in range(10)]
+    assert max_in_flight == 3
+
+
+@pytest.mark.asyncio
+async def test_map_unordered_raises_errors():
+    async def fail(n):
+        if n == 2:
+            raise ValueError(n)
+        return n
+
+    with pytest.raises(ValueError, match="2"):
+        async for _ in map_unordered(fail, range(5), concurrency=2):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_map_in_executor_runs_batches_in_worker_processes():
+    with ProcessPoolExecutor(
+        max_workers=2, mp_context=multiprocessing.get_context("forkserver")
+    ) as executor:
+        results = [
+            (item, result, type(error))
+            async for item, result, error in map_in_executor(
+                executor, int, ["1", "2", "x", "4", "5"], concurrency=2, chunksize=2
+            )
+        ]
+
+    assert sorted(results) == [
+        ("1", 1, type(None)),
+        ("2", 2, type(None)),
+        ("4", 4, type(None)),
+        ("5", 5, type(None)),
+        ("x", None, ValueError),
+    ]
@@ -0,0 +1,62 @@
+import time
+
+import httpx
+import pytest
+
+from app.common.rate_limit import (
+    RateLimiter,
+    TokenBucket,
+    backoff_delay,
+    is_retryable,
+    retry_after_seconds,
+)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.response = httpx.Response(status, headers=headers or {})
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_requests_beyond_capacity():
+    bucket = TokenBucket(rate=100, capacity=10)
+
+    start = time.monotonic()
+    await bucket.acquire(10)
+    await bucket.acquire(5)
+
+    assert time.monotonic() - start == pytest.approx(0.05, abs=0.03)
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_pause_delays_every_caller():
+    limiter = RateLimiter(tokens_per_minute=60000, requests_per_minute=6000)
+    limiter.pause(0.05)
+
+    start = time.monotonic()
+    await limiter.acquire(100)
+
+    assert time.monotonic() - start >= 0.05
+
+
+def test_retry_after_headers():
+    assert retry_after_seconds(HTTPError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(HTTPError(429, {"retry-after": "7"})) == 7
+    assert retry_after_seconds(HTTPError(429)) is None
+    assert retry_after_seconds(ValueError()) is None
+
+
+def test_is_retryable():
+    assert is_retryable(HTTPError(429))
+    assert is_retryable(HTTPError(503))
+    assert not is_retryable(HTTPError(400))
+    assert is_retryable(ConnectionError())
+    assert not is_retryable(ValueError())
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    delays = [backoff_delay(10, base=1, cap=5) for _ in range(100)]
+
+    assert all(0 <= delay <= 5 for delay in delays)
+    assert len(set(delays)) > 1
@@ -43,13 +43,13 @@ def load_certs_into_context(certs):
     return ctx
 
 
+# Called from the FastAPI lifespan rather than at import, so importing the app
+# does not write temp files. Updates custom_ca_certs in place for modules that
+# imported it directly.
 def init_custom_certificates():
-    global custom_ca_certs
     global ctx
     logger.info("Initializing custom certificates")
-    custom_ca_certs = extract_all_certs()
+    custom_ca_certs.clear()
+    custom_ca_certs.update(extract_all_certs())
     ctx = load_certs_into_context(custom_ca_certs)
     return custom_ca_certs
-
-
-init_custom_certificates()
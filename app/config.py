@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import HttpUrl
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -21,6 +21,130 @@ class AppConfig(BaseSettings):
     AZURE_OPENAI_DEPLOYMENT_NAME: Optional[str] = None
     AZURE_OPENAI_DEPLOYMENT_NAME_4o: Optional[str] = None
 
+    # Shared connection pool for Azure OpenAI chat clients
+    llm_pool_max_connections: int = 100
+    llm_pool_max_keepalive_connections: int = 20
+    llm_pool_keepalive_expiry: float = 60.0
+
+    # Maximum concurrent LLM calls when grading retrieved documents
+    grading_concurrency: int = 4
+
+    # POST /query/batch: queries per request, and graph runs in flight across
+    # every batch being served
+    batch_max_queries: int = 500
+    batch_concurrency: int = 8
+
+    # Relevance gate on retrieval scores (Chroma's 0-1 relevance scale). Documents
+    # at or above the high threshold are kept and those below the low threshold
+    # dropped without an LLM call; only the band in between is graded by the LLM.
+    retriever_keep_scores: bool = True
+    relevance_gate_enabled: bool = True
+    relevance_gate_high: float = 0.55
+    relevance_gate_low: float = 0.2
+
+    # Vector index: "chroma" (HNSW on disk) or "numpy" (brute-force matrix,
+    # exported from the Chroma collection on first start)
+    vector_backend: Literal["chroma", "numpy"] = "chroma"
+
+    # Compact embeddings: request fewer dimensions from the embedding model
+    # (re-ingest after changing it) and, with the numpy backend, keep int8 or
+    # float16 vectors in memory, rescoring the top candidates at float32
+    embedding_dimensions: Optional[int] = None
+    vector_quantisation: Literal["none", "float16", "int8"] = "none"
+    rescore_candidates: int = 40
+
+    # "hybrid" fuses BM25 and vector search with reciprocal rank fusion; falls
+    # back to "vector" when no BM25 index has been built by ingestion yet
+    retrieval_mode: Literal["vector", "hybrid"] = "hybrid"
+    retrieval_k: int = 4
+    hybrid_candidates: int = 10
+    hybrid_rrf_k: int = 60
+
+    # Pre-routing at START: queries matching a domain keyword, or whose
+    # embedding is at least QUERY_ROUTER_THRESHOLD cosine-similar to the mean
+    # embedding of the indexed chunks, go straight to retrieval without the
+    # tool-calling agent LLM call
+    query_router_enabled: bool = True
+    query_router_centroid: bool = True
+    query_router_threshold: float = 0.45
+
+    # When the agent LLM call is made, start retrieval for the latest query
+    # alongside it; the documents are used if the agent then searches for
+    # the same terms (Jaccard overlap at least SPECULATIVE_MATCH_THRESHOLD)
+    speculative_retrieval: bool = True
+    speculative_match_threshold: float = 0.8
+
+    # Per-request budget for the agent graph. As it runs out, grading falls
+    # back to retrieval scores, then the rewrite -> agent -> retrieve cycle
+    # stops and the answer is generated from the best documents so far. A run
+    # still going at the deadline is cancelled and answered with the sources
+    # of the best documents it had found. Grading needs BUDGET_GRADING_SECONDS left, another rewrite cycle
+    # BUDGET_REWRITE_SECONDS; STEPS counts agent, retrieve, grade and rewrite
+    # node runs
+    request_deadline_seconds: float = 20.0
+    request_max_steps: int = 12
+    max_rewrites: int = 2
+    budget_grading_seconds: float = 4.0
+    budget_rewrite_seconds: float = 10.0
+
+    # Embedding cache: in-memory LRU plus an optional "file" or "mongo" store
+    embedding_cache_max_entries: int = 10000
+    embedding_cache_store: Optional[Literal["file", "mongo"]] = None
+    embedding_cache_path: str = "./embedding_cache"
+
+    # Query embeddings that miss the cache within EMBEDDING_BATCH_WINDOW_MS of
+    # each other are sent as one API call of up to EMBEDDING_BATCH_MAX_SIZE
+    # texts (0 ms sends each on its own)
+    embedding_batch_window_ms: float = 5.0
+    embedding_batch_max_size: int = 64
+
+    # Exact-match answer cache, optionally shared between workers via MongoDB
+    response_cache_enabled: bool = True
+    response_cache_max_entries: int = 1024
+    response_cache_ttl_seconds: int = 3600
+    response_cache_mongo_enabled: bool = False
+
+    # Semantic answer cache, stored in MongoDB
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.95
+    semantic_cache_ttl_seconds: int = 86400
+    semantic_cache_refresh_seconds: float = 60.0
+    semantic_cache_max_entries: int = 10000
+
+    # Ingestion embeds batches concurrently, limited to the embedding
+    # deployment's Azure OpenAI quota
+    ingest_batch_size: int = 50
+    ingest_concurrency: int = 8
+    ingest_max_retries: int = 6
+    embedding_tokens_per_minute: int = 350000
+    embedding_requests_per_minute: int = 2100
+
+    # GOV.UK content download: concurrent requests, polite per-host rate and
+    # the on-disk cache revalidated with ETag / Last-Modified
+    govuk_fetch_concurrency: int = 10
+    govuk_requests_per_second: float = 10.0
+    govuk_http_cache_path: str = "./govuk_http_cache"
+    # Grant versions seen by the last crawl, so only changes are refetched
+    govuk_crawl_state_path: str = "./govuk_crawl_state.json"
+
+    # Processed grants, one JSON record per line (zstd-compressed when the
+    # path ends in .zst), streamed through split -> embed -> upsert stages
+    # joined by queues of this many items
+    processed_grants_path: str = "farming_grants_processed.jsonl"
+    pipeline_queue_size: int = 64
+    # HTML to Markdown and token splitting run in this many worker processes
+    # (-1 for one per core, 0 to keep them in-process), each sent batches of
+    # INGEST_WORKER_CHUNKSIZE grants
+    ingest_workers: int = 0
+    ingest_worker_chunksize: int = 4
+    # "markdown" chunks at headers then paragraphs, tokenising each grant once;
+    # "recursive" is the previous tiktoken RecursiveCharacterTextSplitter.
+    # Changing it re-embeds every chunk on the next ingestion.
+    chunker: Literal["markdown", "recursive"] = "markdown"
+
+    # Replace shipped prompt templates with their LangChain Hub versions at startup
+    prompt_hub_refresh: bool = False
+
     # LANGSMITH
     LANGCHAIN_API_KEY: Optional[str] = None
     LANGCHAIN_TRACING_V2: Optional[bool] = None
@@ -8,6 +8,8 @@ from typing_extensions import TypedDict
 
 
 class AgentState(TypedDict):
+    # How the query was routed at START (see query_router.classify_query)
+    query_route: Optional[dict]
     # Conversation so far, accumulated across turns
     messages: Annotated[Sequence[BaseMessage], operator.add]
     # Have we already done at least one retrieval?
@@ -15,3 +17,17 @@ class AgentState(TypedDict):
     # The raw list of Document objects from the last retrieval
     docs: Optional[list[Document]]
     should_generate: bool
+    # Per-document relevance verdicts and grading latency from grade_documents
+    document_grades: Optional[list[dict]]
+    # "Title: url" citations for the docs used by the generate node
+    sources: Optional[list[str]]
+    # Request budget (see budget.start_budget): time.monotonic() deadline,
+    # loop node runs so far and rewrites made
+    deadline: Optional[float]
+    steps: Annotated[int, operator.add]
+    rewrites: int
+    # Highest-scoring retrieval the grader rejected, to answer from when the
+    # budget runs out before a better one is found
+    best_docs: Optional[list[Document]]
+    # Degradations applied to this answer, e.g. "grading_skipped"
+    degraded: Annotated[list[str], operator.add]
@@ -1,6 +1,6 @@
 from langchain.tools.retriever import create_retriever_tool
 
-from app.core.rag.vector_store import retriever
+from app.core.rag.vector_store import get_retriever
 
 
 # Build description dynamically from resource metadata
@@ -15,13 +15,21 @@ def build_tool_description():
     return description  # noqa: RET504
 
 
-# Create retriever tool with rich description
-retriever_tool = create_retriever_tool(
-    retriever=retriever,
-    name="gov_knowledge_base",
-    description=build_tool_description(),
-)
+_tools = None
 
-tools = [retriever_tool]
 
-print("Retriever tool for GOV.UK farming grants knowledge base created.")
+def get_tools():
+    """Builds the agent's tools on first use, once the vector store is ready."""
+    global _tools
+    if _tools is None:
+        # Create retriever tool with rich description
+        retriever_tool = create_retriever_tool(
+            retriever=get_retriever(),
+            name="gov_knowledge_base",
+            description=build_tool_description(),
+        )
+
+        _tools = [retriever_tool]
+
+        print("Retriever tool for GOV.UK farming grants knowledge base created.")
+    return _tools
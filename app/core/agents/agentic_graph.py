@@ -1,36 +1,46 @@
+import asyncio
 import json
+import time
 from typing import Literal
 
-from langchain import hub
 from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import PromptTemplate
 from langgraph.graph import END, START, StateGraph
 from langgraph.prebuilt import tools_condition
 
 from app.clients.azure_openai_config import azure_gpt4o
+from app.common.async_streams import until_deadline
+from app.config import config
 from app.core.agents.agent_state import AgentState
-from app.core.agents.agent_tools import tools
-from app.core.rag.vector_store import retriever
+from app.core.agents.agent_tools import get_tools
+from app.core.agents.budget import (
+    grading_allowed,
+    record_degradation,
+    remaining_seconds,
+    rewrite_blocked,
+)
+from app.core.agents.query_router import match_keyword, route_from_start, route_query
+from app.core.agents.speculation import SpeculativeRetrieval
+from app.core.prompts.registry import get_prompt
+from app.core.rag.retrievers import RELEVANCE_SCORE_KEY
+from app.core.rag.vector_store import get_retriever
+
+# How each query's retrieval was judged: settled on scores alone (straight to
+# generate or rewrite) or sent to the LLM grader for the ambiguous documents
+relevance_gate_stats = {
+    "generate_direct": 0,
+    "rewrite_direct": 0,
+    "llm_grader": 0,
+    "docs_gated_by_score": 0,
+    "docs_graded_by_llm": 0,
+}
 
 
 def debug_tools_condition(state):
-    user_query = state["messages"][0].content.lower()
-    farming_grant_keywords = [
-        "farm",
-        "farming",
-        "grant",
-        "grants",
-        "agriculture",
-        "agricultural",
-        "rural",
-        "defra",
-        "funding",
-        "support scheme",
-    ]
+    user_query = state["messages"][0].content
     result = tools_condition(state)
     print(f"TOOL CONDITION OUTPUT FROM LLM: {result}")
-    if any(keyword in user_query for keyword in farming_grant_keywords):
+    if match_keyword(user_query):
         print(
             "Detected farming grant-related keyword and no retrieval yet — forcing retriever tool."
         )
@@ -38,60 +48,202 @@ def debug_tools_condition(state):
     return result
 
 
-def check_document_relevance(state) -> Literal["generate", "rewrite"]:
-    print("---CHECK RELEVANCE---")
-    model = azure_gpt4o(temperature=0, streaming=False)
-    prompt = PromptTemplate(
-        template="""You are a grader assessing relevance of a retrieved document to a user question.
-        Here is the retrieved document:
-        {context}
+async def route_after_agent(state) -> Literal["grade", "tools", "__end__"]:
+    if state.get("should_generate"):
+        return "grade"
+    return debug_tools_condition(state)
+
+
+def document_grade(doc, relevant, graded_by, latency_ms=0.0):
+    return {
+        "title": doc.metadata.get("title"),
+        "url": doc.metadata.get("url"),
+        "score": doc.metadata.get(RELEVANCE_SCORE_KEY),
+        "relevant": relevant,
+        "graded_by": graded_by,
+        "latency_ms": round(latency_ms, 1),
+    }
+
+
+def score_verdict(doc):
+    """True/False when the retrieval score alone settles relevance, else None."""
+    score = doc.metadata.get(RELEVANCE_SCORE_KEY)
+    if score is None or not config.relevance_gate_enabled:
+        return None
+    if score >= config.relevance_gate_high:
+        return True
+    if score < config.relevance_gate_low:
+        return False
+    return None
+
+
+def gate_on_scores(docs):
+    """Settles the scored documents from their scores when the retrieval is
+    clearly good or bad.
+
+    Returns one grade per document, None where the LLM grader is still
+    needed: always for documents without a score (BM25-only hits from
+    hybrid retrieval), and for all of them when the best score is ambiguous.
+    """
+    scores = [doc.metadata.get(RELEVANCE_SCORE_KEY) for doc in docs]
+    scored = [score for score in scores if score is not None]
+    if not config.relevance_gate_enabled or not scored:
+        return [None] * len(docs)
+    if max(scored) >= config.relevance_gate_high:
+        relevance_gate_stats["generate_direct"] += 1
+        relevant = [
+            score is not None and score >= config.relevance_gate_low for score in scores
+        ]
+    elif max(scored) < config.relevance_gate_low:
+        relevance_gate_stats["rewrite_direct"] += 1
+        relevant = [False] * len(docs)
+    else:
+        return [None] * len(docs)
+    relevance_gate_stats["docs_gated_by_score"] += len(scored)
+    return [
+        None if score is None else document_grade(doc, verdict, "score")
+        for doc, score, verdict in zip(docs, scores, relevant)
+    ]
 
-        Here is the user question:
-        {question}
 
-        If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant.
-        Respond ONLY with 'yes' or 'no'.
+async def grade_document(chain, semaphore, question, doc):
+    """Asks the grader whether one retrieved document is relevant to the question."""
+    verdict = score_verdict(doc)
+    if verdict is not None:
+        relevance_gate_stats["docs_gated_by_score"] += 1
+        return document_grade(doc, verdict, "score")
+
+    relevance_gate_stats["docs_graded_by_llm"] += 1
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            raw_output = await chain.ainvoke(
+                {"question": question, "context": doc.page_content}
+            )
+            relevant = "yes" in raw_output.strip().lower()
+        except Exception as e:
+            # Keep the document rather than lose context on a grader failure
+            print(f"Error grading document {doc.metadata.get('url')}: {e}")
+            relevant = True
+        latency_ms = (time.perf_counter() - start) * 1000
+    return document_grade(doc, relevant, "llm", latency_ms)
+
+
+async def llm_grades(question, docs):
+    relevance_gate_stats["llm_grader"] += 1
+    model = azure_gpt4o(temperature=0, streaming=False)
+    chain = get_prompt("grade_document") | model | StrOutputParser()
+    semaphore = asyncio.Semaphore(config.grading_concurrency)
 
-        Response:""",
-        input_variables=["context", "question"],
+    return await asyncio.gather(
+        *(grade_document(chain, semaphore, question, doc) for doc in docs)
     )
-    chain = prompt | model | StrOutputParser()
 
-    messages = state["messages"]
-    last_message = messages[-1]
-    question = messages[0].content
-    docs = last_message.content
 
-    raw_output = chain.invoke({"question": question, "context": docs})
-    print(f"DEBUG: Raw output from grading model: {raw_output}")
+def budget_grades(docs):
+    """Grades from scores alone when the budget leaves no time for the LLM
+    grader; documents the scores do not settle are kept."""
+    return [
+        document_grade(doc, score_verdict(doc) is not False, "budget") for doc in docs
+    ]
 
-    cleaned_output = raw_output.strip().lower()
-    print(f"*********Cleaned String to parse: {cleaned_output}")
 
-    if "yes" in cleaned_output:
-        print("---DECISION: DOCS RELEVANT---")
-        return "generate"
+def top_score(docs):
+    return max(doc.metadata.get(RELEVANCE_SCORE_KEY) or 0.0 for doc in docs)
+
+
+def best_retrieval(best, docs):
+    """The better of two rejected retrievals, by their top score."""
+    if not best or top_score(docs) > top_score(best):
+        return docs
+    return best
 
-    print(f"---DECISION: DOCS NOT RELEVANT (Score: {cleaned_output})---")
+
+async def grade_documents(state):
+    """Grades every retrieved document concurrently and keeps the relevant ones.
+
+    Retrieval scores settle clearly relevant or irrelevant results without an
+    LLM call; only documents in the ambiguous band or without a score go to
+    the LLM grader, and only while the request budget allows it. When nothing is relevant the
+    retrieval is kept in ``best_docs`` in case the budget runs out.
+    """
+    print("---CHECK RELEVANCE---")
+    question = state["messages"][0].content
+    docs = state.get("docs") or []
+
+    degraded = []
+    grades = gate_on_scores(docs)
+    pending = [doc for doc, grade in zip(docs, grades) if grade is None]
+    graded = iter(())
+    if pending and grading_allowed(state):
+        graded = iter(await llm_grades(question, pending))
+    elif pending:
+        graded = iter(budget_grades(pending))
+        degraded = record_degradation("grading_skipped")
+    grades = [grade or next(graded) for grade in grades]
+    relevant_docs = [doc for doc, grade in zip(docs, grades) if grade["relevant"]]
+    for grade in grades:
+        print(
+            f"Graded {grade['url']} by {grade['graded_by']}: relevant={grade['relevant']} "
+            f"(score={grade['score']}, {grade['latency_ms']} ms)"
+        )
+    print(f"---DECISION: {len(relevant_docs)}/{len(docs)} DOCS RELEVANT---")
+    result = {
+        "docs": relevant_docs,
+        "document_grades": grades,
+        "degraded": degraded,
+        "steps": 1,
+    }
+    if docs and not relevant_docs:
+        result["best_docs"] = best_retrieval(state.get("best_docs"), docs)
+    return result
+
+
+async def route_after_grading(state) -> Literal["generate", "rewrite"]:
+    """Rewrites the question while nothing relevant has been found, until
+    the rewrite cap or the request budget stops it."""
+    if state.get("docs") or rewrite_blocked(state):
+        return "generate"
     return "rewrite"
 
 
-def agent(state):
+def start_speculation(query):
+    """Starts retrieving ``query`` while the agent decides whether to search."""
+    if not config.speculative_retrieval:
+        return None
+    retriever = get_retriever()
+    return SpeculativeRetrieval(retriever, query) if retriever else None
+
+
+async def search_knowledge_base(query, speculation, agent_seconds):
+    """Documents for the agent's search, prefetched if it was speculated."""
+    if speculation:
+        docs = await speculation.take(query, agent_seconds)
+        if docs is not None:
+            return docs
+    return await get_retriever().ainvoke(query)
+
+
+async def agent(state):
     print("---CALL AGENT---")
     messages = state["messages"]
     system_msg = HumanMessage(
-        content="""You are a helpful assistant.
-You have access to a specialized knowledge base about UK farming grants.
-You MUST use the `gov_knowledge_base` tool for any question related to farming, farming grants, agricultural funding, rural support schemes, or similar topics.
-Do NOT attempt to answer on your own for these topics — always use the `gov_knowledge_base` tool to ensure accuracy based on the provided documents.
-For other general queries, you can answer directly or use other tools if appropriate.""",
+        content=get_prompt("agent_system").format(),
         name="system",
     )
 
     model = azure_gpt4o(temperature=0, streaming=False)
-    model = model.bind_tools(tools)
-
-    response = model.invoke([system_msg] + messages)
+    model = model.bind_tools(get_tools())
+
+    speculation = start_speculation(messages[-1].content)
+    start = time.perf_counter()
+    try:
+        response = await model.ainvoke([system_msg] + messages)
+    except BaseException:
+        if speculation:
+            speculation.discard()
+        raise
+    agent_seconds = time.perf_counter() - start
     tool_calls = response.additional_kwargs.get("tool_calls", [])
 
     # Prepare the list of new messages to add
@@ -113,7 +265,9 @@ For other general queries, you can answer directly or use other tools if appropr
 
             if tool_name == "gov_knowledge_base":
                 # Store the retrieved docs temporarily
-                tool_response_docs = retriever.invoke(tool_args["query"])
+                tool_response_docs = await search_knowledge_base(
+                    tool_args["query"], speculation, agent_seconds
+                )
                 tool_messages.append(
                     ToolMessage(
                         tool_call_id=tool_call_id,
@@ -129,116 +283,229 @@ For other general queries, you can answer directly or use other tools if appropr
         # Add the tool messages to the list of new messages
         new_messages_to_add.extend(tool_messages)
 
+    if speculation:
+        speculation.discard()
+
     # Return only the new messages and other state updates
     return_dict = {"messages": new_messages_to_add}
     if tool_response_docs is not None:
         return_dict["docs"] = tool_response_docs
     if retrieval_attempted_in_node:
         return_dict["retrieval_attempted"] = True  # Or update based on logic
-    if should_generate_in_node:
-        return_dict["should_generate"] = True  # Or update based on logic
+    # Reset on every call so a later turn without a tool call is not routed
+    # to grading with documents from an earlier retrieval
+    return_dict["should_generate"] = should_generate_in_node
+    return_dict["steps"] = 1
 
     return return_dict
 
 
-def retrieve_and_store(state):
+async def retrieve_and_store(state):
     print("---RETRIEVE AND STORE---")
     query = state["messages"][-1].content
-    documents = retriever.invoke(query)
+    documents = await get_retriever().ainvoke(query)
 
     retrieval_message = HumanMessage(content="Documents retrieved.")
     return {
         "messages": [retrieval_message],
         "docs": documents,
         "retrieval_attempted": True,
+        "steps": 1,
     }
 
 
-def rewrite(state):
+async def rewrite(state):
     print("---TRANSFORM QUERY---")
     messages = state["messages"]
     question = messages[0].content
 
-    msg = [
-        HumanMessage(
-            content=f"""
-    Look at the input and try to reason about the underlying semantic intent / meaning.
-    Here is the initial question:
-    \n ------- \n
-    {question}
-    \n ------- \n
-    Formulate an improved question: """,
-        )
-    ]
-
     model = azure_gpt4o(temperature=0, streaming=False)
-    response = model.invoke(msg)
-    return {"messages": [response]}
+    chain = get_prompt("rewrite_question") | model
+    response = await chain.ainvoke({"question": question})
+    return {
+        "messages": [response],
+        "rewrites": state.get("rewrites", 0) + 1,
+        "steps": 1,
+    }
 
 
-def generate(state):
-    print("---GENERATE---")
-    question = state["messages"][0].content
-    docs = state.get("docs", [])
+def format_docs(docs):
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
+def collect_sources(docs):
+    source = set()
+    for doc in docs:
+        url = doc.metadata.get("url")
+        title = doc.metadata.get("title", "Unknown Title")
+        if url:
+            source.add(f"{title}: {url}")
+    return sorted(source)
 
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
 
-    def collect_sources(docs):
-        source = set()
-        for doc in docs:
-            url = doc.metadata.get("url")
-            title = doc.metadata.get("title", "Unknown Title")
-            if url:
-                source.add(f"{title}: {url}")
-        return "\n".join(sorted(source)) if source else "No sources found."
+def format_sources(sources):
+    return "\n".join(sources) if sources else "No sources found."
 
-    prompt = hub.pull("rlm/rag-prompt")
-    llm = azure_gpt4o(temperature=0, streaming=False)
-    rag_chain = prompt | llm | StrOutputParser()
 
-    response = rag_chain.invoke({"context": format_docs(docs), "question": question})
+def fallback_docs(state):
+    """Documents to answer from when grading left none and no further rewrite
+    can run: the best rejected retrieval so far, with the degradations."""
+    reasons = [rewrite_blocked(state) or "rewrite_skipped"]
+    best_docs = state.get("best_docs") or []
+    if best_docs:
+        reasons.append("best_docs")
+    return best_docs, record_degradation(*reasons)
+
+
+async def generate(state):
+    print("---GENERATE---")
+    question = state["messages"][0].content
+    docs = state.get("docs") or []
+    degraded = []
+    if not docs and state.get("retrieval_attempted"):
+        docs, degraded = fallback_docs(state)
+
+    # Streaming client so /query/stream can forward tokens as they arrive
+    llm = azure_gpt4o(temperature=0, streaming=True)
+    rag_chain = get_prompt("rag") | llm | StrOutputParser()
+
+    response = await rag_chain.ainvoke(
+        {"context": format_docs(docs), "question": question}
+    )
     cited_sources = collect_sources(docs)
-    full_response = f"{response}\n\nSources:\n{cited_sources}"
+    full_response = f"{response}\n\nSources:\n{format_sources(cited_sources)}"
 
     # Return the new message as an AIMessage object in a list
-    return {"messages": [AIMessage(content=full_response)]}
+    return {
+        "messages": [AIMessage(content=full_response)],
+        "sources": cited_sources,
+        "degraded": degraded,
+    }
+
+
+DEADLINE_ANSWER = "Sorry, I could not finish answering your question in time."
+# State keys the graph adds each node's update to rather than replacing
+ACCUMULATED_KEYS = {"messages", "steps", "degraded"}
+
+
+def apply_update(state, update):
+    """``state`` after one node's update, merged as the graph merges it."""
+    merged = dict(state)
+    for key, value in (update or {}).items():
+        if key in ACCUMULATED_KEYS and merged.get(key) is not None:
+            merged[key] = merged[key] + value
+        else:
+            merged[key] = value
+    return merged
+
+
+def deadline_state(state):
+    """Final state for a run the request deadline cut off. There is no time
+    for another LLM call, so the answer lists the sources of the best
+    documents found so far."""
+    cited_sources = collect_sources(state.get("docs") or state.get("best_docs") or [])
+    answer = DEADLINE_ANSWER
+    if cited_sources:
+        answer += f" These pages may help:\n{format_sources(cited_sources)}"
+    return apply_update(
+        state,
+        {
+            "messages": [AIMessage(content=answer)],
+            "sources": cited_sources,
+            "degraded": record_degradation("deadline_exceeded"),
+        },
+    )
+
+
+async def run_within_deadline(graph, state):
+    """Runs ``graph`` to its final state, cancelling it at the request deadline."""
+    latest = state
+
+    async def run():
+        nonlocal latest
+        async for values in graph.astream(state, stream_mode="values"):
+            latest = values
+
+    try:
+        await asyncio.wait_for(run(), max(remaining_seconds(state), 0))
+    except asyncio.TimeoutError:
+        print("---DEADLINE EXCEEDED---")
+        return deadline_state(latest)
+    return latest
+
+
+async def stream_within_deadline(graph, state):
+    """``graph.astream_events`` until the request deadline.
+
+    A run cut off by the deadline ends with a root ``on_chain_end`` event
+    like a finished run's, its output the ``deadline_state`` of the updates
+    seen so far.
+    """
+    latest = state
+    events = until_deadline(
+        graph.astream_events(state, version="v2"), max(remaining_seconds(state), 0)
+    )
+    try:
+        async for event in events:
+            if event["event"] == "on_chain_stream" and not event.get("parent_ids"):
+                for update in event["data"]["chunk"].values():
+                    latest = apply_update(latest, update)
+            yield event
+    except asyncio.TimeoutError:
+        print("---DEADLINE EXCEEDED---")
+        yield {
+            "event": "on_chain_end",
+            "name": "deadline",
+            "parent_ids": [],
+            "data": {"output": deadline_state(latest)},
+        }
 
 
 # ========== BUILD GRAPH ===========
-print("****************** Prompt[rlm/rag-prompt] ******************")
-hub.pull("rlm/rag-prompt").pretty_print()
-
-workflow = StateGraph(AgentState)
-workflow.add_node("agent", agent)
-workflow.add_node("retrieve", retrieve_and_store)
-workflow.add_node("rewrite", rewrite)
-workflow.add_node("generate", generate)
-
-workflow.add_edge(START, "agent")
-
-workflow.add_conditional_edges(
-    "agent",
-    lambda state: "generate"
-    if state.get("should_generate")
-    else debug_tools_condition(state),
-    {"generate": "generate", "tools": "retrieve", END: END},
-)
+_graph = None
+
+
+def build_graph():
+    workflow = StateGraph(AgentState)
+    workflow.add_node("route", route_query)
+    workflow.add_node("agent", agent)
+    workflow.add_node("retrieve", retrieve_and_store)
+    workflow.add_node("grade_documents", grade_documents)
+    workflow.add_node("rewrite", rewrite)
+    workflow.add_node("generate", generate)
+
+    # In-domain queries skip the agent's tool-decision call
+    workflow.add_edge(START, "route")
+    workflow.add_conditional_edges(
+        "route", route_from_start, {"retrieve": "retrieve", "agent": "agent"}
+    )
 
-workflow.add_conditional_edges(
-    "retrieve", check_document_relevance, {"generate": "generate", "rewrite": "rewrite"}
-)
+    workflow.add_conditional_edges(
+        "agent",
+        route_after_agent,
+        {"grade": "grade_documents", "tools": "retrieve", END: END},
+    )
+
+    workflow.add_edge("retrieve", "grade_documents")
+    workflow.add_conditional_edges(
+        "grade_documents",
+        route_after_grading,
+        {"generate": "generate", "rewrite": "rewrite"},
+    )
+
+    workflow.add_edge("generate", END)
+    workflow.add_edge("rewrite", "agent")
 
-workflow.add_edge("generate", END)
-workflow.add_edge("rewrite", "agent")
+    # Compile graph
+    return workflow.compile()
 
-# Compile graph
-graph = workflow.compile()
 
-# Save mermaid diagram
-image_data = graph.get_graph().draw_mermaid_png()
-with open("agentic_graph_new.png", "wb") as f:
-    f.write(image_data)
+def get_graph():
+    """Returns the compiled graph, building it on first use."""
+    global _graph
+    if _graph is None:
+        _graph = build_graph()
+    return _graph
 
 
 # create image of nodes
@@ -0,0 +1,62 @@
+import time
+from typing import Optional
+
+from app.config import config
+
+# How often each degradation was applied, for /stats
+degradation_stats = {
+    "grading_skipped": 0,
+    "rewrite_skipped": 0,
+    "rewrite_limit": 0,
+    "best_docs": 0,
+    "deadline_exceeded": 0,
+}
+
+
+def start_budget() -> dict:
+    """Initial graph state for a request: its deadline and step counters."""
+    return {
+        "deadline": time.monotonic() + config.request_deadline_seconds,
+        "steps": 0,
+        "rewrites": 0,
+    }
+
+
+def remaining_seconds(state) -> float:
+    deadline = state.get("deadline")
+    if deadline is None:
+        return float("inf")
+    return deadline - time.monotonic()
+
+
+def steps_exhausted(state) -> bool:
+    return state.get("steps", 0) >= config.request_max_steps
+
+
+def grading_allowed(state) -> bool:
+    """Whether there is time left to send documents to the LLM grader."""
+    return not steps_exhausted(state) and (
+        remaining_seconds(state) >= config.budget_grading_seconds
+    )
+
+
+def rewrite_blocked(state) -> Optional[str]:
+    """Why another rewrite -> agent -> retrieve cycle cannot run, or None.
+
+    "rewrite_limit" once MAX_REWRITES rewrites have been made, else
+    "rewrite_skipped" when the step budget is spent or the deadline is too
+    close for a further cycle and generation.
+    """
+    if state.get("rewrites", 0) >= config.max_rewrites:
+        return "rewrite_limit"
+    if steps_exhausted(state):
+        return "rewrite_skipped"
+    if remaining_seconds(state) < config.budget_rewrite_seconds:
+        return "rewrite_skipped"
+    return None
+
+
+def record_degradation(*reasons: str) -> list[str]:
+    for reason in reasons:
+        degradation_stats[reason] += 1
+    return list(reasons)
@@ -0,0 +1,25 @@
+"""Renders the agent graph as a Mermaid PNG.
+
+Usage: python -m app.core.agents.draw_graph [--output agentic_graph_new.png]
+
+Rendering calls the mermaid.ink web service, so it is kept out of the
+application's import path and only runs from this command.
+"""
+
+import argparse
+
+from app.core.agents.agentic_graph import build_graph
+
+
+def draw_graph(output_path):
+    image_data = build_graph().get_graph().draw_mermaid_png()
+    with open(output_path, "wb") as f:
+        f.write(image_data)
+    print(f"Saved agent graph diagram to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="agentic_graph_new.png")
+    args = parser.parse_args()
+    draw_graph(args.output)
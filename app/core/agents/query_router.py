@@ -0,0 +1,105 @@
+import re
+import time
+from typing import Optional
+
+from app.config import config
+from app.core.rag.vector_store import get_domain_centroid, get_embedding_model
+
+# Queries mentioning any of these go straight to retrieval. Matched from the
+# start of a word, so "farm" also covers "farmer" and "farmland".
+DOMAIN_KEYWORDS = (
+    "farm",
+    "farming",
+    "grant",
+    "grants",
+    "agriculture",
+    "agricultural",
+    "rural",
+    "defra",
+    "funding",
+    "support scheme",
+    "sustainable farming incentive",
+    "countryside stewardship",
+    "rural payments agency",
+    "livestock",
+    "hedgerow",
+    "woodland",
+    "slurry",
+)
+
+# How queries were routed at START, for /stats
+query_route_stats = {
+    "retrieve_keyword": 0,
+    "retrieve_centroid": 0,
+    "agent": 0,
+}
+
+
+def compile_keywords(keywords) -> re.Pattern:
+    """One case-insensitive alternation over every keyword, longest first, so
+    the regex engine scans the query once whatever the keyword count."""
+    alternatives = sorted((re.escape(k) for k in keywords), key=len, reverse=True)
+    return re.compile(rf"\b(?:{'|'.join(alternatives)})", re.IGNORECASE)
+
+
+KEYWORD_PATTERN = compile_keywords(DOMAIN_KEYWORDS)
+
+
+def match_keyword(query: str) -> Optional[str]:
+    match = KEYWORD_PATTERN.search(query)
+    return match.group(0).lower() if match else None
+
+
+def route_decision(route, reason, start, keyword=None, similarity=None):
+    return {
+        "route": route,
+        "reason": reason,
+        "keyword": keyword,
+        "similarity": None if similarity is None else round(similarity, 3),
+        "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+
+
+async def classify_query(query: str) -> dict:
+    """Decides before any LLM call whether ``query`` is about farming grants.
+
+    In-domain queries are sent to "retrieve"; the rest to "agent", whose
+    model decides whether to search. A keyword match settles it; otherwise,
+    if ingestion has written a corpus centroid, the query embedding's
+    similarity to it is compared with QUERY_ROUTER_THRESHOLD. The embedding
+    goes through the embedding cache, which the semantic cache has usually
+    filled for this query already.
+    """
+    start = time.perf_counter()
+    if not config.query_router_enabled:
+        return route_decision("agent", "disabled", start)
+    keyword = match_keyword(query)
+    if keyword:
+        return route_decision("retrieve", "keyword", start, keyword=keyword)
+    centroid = get_domain_centroid() if config.query_router_centroid else None
+    embedding_model = get_embedding_model()
+    if centroid is None or embedding_model is None:
+        return route_decision("agent", "no_match", start)
+    try:
+        similarity = centroid.similarity(await embedding_model.aembed_query(query))
+    except Exception as e:
+        print(f"Query router could not embed the query: {e}")
+        return route_decision("agent", "no_match", start)
+    if similarity >= config.query_router_threshold:
+        return route_decision("retrieve", "centroid", start, similarity=similarity)
+    return route_decision("agent", "no_match", start, similarity=similarity)
+
+
+async def route_query(state):
+    """Graph entry node: records how the query is routed."""
+    decision = await classify_query(state["messages"][0].content)
+    if decision["route"] == "retrieve":
+        query_route_stats[f"retrieve_{decision['reason']}"] += 1
+    else:
+        query_route_stats["agent"] += 1
+    print(f"---ROUTE: {decision['route']} ({decision['reason']})---")
+    return {"query_route": decision}
+
+
+async def route_from_start(state) -> str:
+    return state["query_route"]["route"]
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from typing import Optional
+
+from langchain_core.documents import Document
+
+from app.config import config
+from app.core.rag.lexical_index import tokenize
+
+# Outcome of each speculative retrieval, for /stats
+speculation_stats = {
+    "started": 0,
+    # The agent searched for the same query, so the prefetched docs were used
+    "hits": 0,
+    # The agent searched for a different query; the prefetch was discarded
+    "misses": 0,
+    # The agent answered without searching
+    "unused": 0,
+    "errors": 0,
+    "latency_saved_ms": 0.0,
+}
+
+
+def speculation_summary():
+    decided = speculation_stats["hits"] + speculation_stats["misses"]
+    hits = speculation_stats["hits"]
+    return speculation_stats | {
+        "hit_rate": round(hits / decided, 3) if decided else None,
+        "mean_latency_saved_ms": (
+            round(speculation_stats["latency_saved_ms"] / hits, 1) if hits else None
+        ),
+    }
+
+
+def same_query(first: str, second: str) -> bool:
+    """True if the queries have the same search terms, or nearly so.
+
+    Compares the BM25 terms of each, so case, punctuation and stopwords
+    such as "what" or "for" make no difference.
+    """
+    first_terms, second_terms = set(tokenize(first)), set(tokenize(second))
+    if first_terms == second_terms:
+        return True
+    union = first_terms | second_terms
+    overlap = len(first_terms & second_terms) / len(union)
+    return overlap >= config.speculative_match_threshold
+
+
+class SpeculativeRetrieval:
+    """Retrieval for the raw query, started alongside the agent's LLM call.
+
+    If the agent then asks for the same search the prefetched documents are
+    used, hiding the retrieval latency behind the LLM call; otherwise the
+    prefetch is cancelled and thrown away.
+    """
+
+    def __init__(self, retriever, query: str):
+        self.query = query
+        self.start = time.perf_counter()
+        self.retrieval_seconds = None
+        self.settled = False
+        self.task = asyncio.create_task(self._retrieve(retriever))
+        speculation_stats["started"] += 1
+
+    async def _retrieve(self, retriever):
+        docs = await retriever.ainvoke(self.query)
+        self.retrieval_seconds = time.perf_counter() - self.start
+        return docs
+
+    async def take(self, query: str, agent_seconds: float) -> Optional[list[Document]]:
+        """The prefetched documents if ``query`` matches, else None.
+
+        The latency saved is the overlap of the two calls: the shorter of
+        the retrieval and the agent call that it ran alongside. Only the
+        first search the agent asks for can use the prefetch.
+        """
+        if self.settled:
+            return None
+        self.settled = True
+        if not same_query(self.query, query):
+            self._cancel()
+            speculation_stats["misses"] += 1
+            return None
+        try:
+            docs = await self.task
+        except Exception as e:
+            print(f"Speculative retrieval failed, retrieving again: {e}")
+            speculation_stats["errors"] += 1
+            return None
+        speculation_stats["hits"] += 1
+        saved = min(agent_seconds, self.retrieval_seconds)
+        speculation_stats["latency_saved_ms"] += round(saved * 1000, 1)
+        return docs
+
+    def discard(self):
+        """Cancels the prefetch if the agent did not use it."""
+        if not self.settled:
+            self.settled = True
+            self._cancel()
+            speculation_stats["unused"] += 1
+
+    def _cancel(self):
+        if not self.task.done():
+            self.task.cancel()
+        elif not self.task.cancelled() and self.task.exception() is not None:
+            # Retrieving the exception stops asyncio logging it as never
+            # retrieved when the task is garbage collected
+            speculation_stats["errors"] += 1
@@ -0,0 +1,357 @@
+import asyncio
+import gc
+import json
+import time
+
+import pytest
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.retrievers import BaseRetriever
+
+from app.core.agents import agentic_graph, budget, query_router
+from app.core.agents.speculation import SpeculativeRetrieval, speculation_stats
+from app.core.rag.lexical_index import BM25Index
+from app.core.rag.retrievers import HybridRetriever
+
+DELAY = 0.1
+# One entry per agent node run, which binds the tools to its model
+agent_calls = []
+# Query of every retriever call
+retrieved_queries = []
+
+
+class SlowFakeChatModel(BaseChatModel):
+    """Chat model that only answers on the async path, after a fixed delay.
+
+    As a grader it rejects documents marked "Unrelated".
+    """
+
+    @property
+    def _llm_type(self):
+        return "slow-fake"
+
+    def _generate(self, *_args, **_kwargs):
+        msg = "graph nodes must not call the blocking model API"
+        raise AssertionError(msg)
+
+    async def _agenerate(self, messages, *_args, **_kwargs):
+        await asyncio.sleep(DELAY)
+        reply = "no" if "Unrelated" in messages[-1].content else "yes"
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=reply))]
+        )
+
+    def bind_tools(self, *_args, **_kwargs):
+        agent_calls.append(1)
+        return self
+
+
+class SlowFakeRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query: str, *, run_manager):  # noqa: ARG002
+        msg = "graph nodes must not call the blocking retriever API"
+        raise AssertionError(msg)
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,  # noqa: ARG002
+    ):
+        retrieved_queries.append(query)
+        await asyncio.sleep(DELAY)
+        return [
+            Document(
+                page_content=f"Guidance for {query}",
+                metadata={"title": "Capital Grants", "url": "https://www.gov.uk/x"},
+            ),
+            Document(
+                page_content="Unrelated guidance on fishing licences",
+                metadata={"title": "Fishing", "url": "https://www.gov.uk/fish"},
+            ),
+        ]
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    monkeypatch.setattr(agentic_graph, "azure_gpt4o", lambda **_: SlowFakeChatModel())
+    monkeypatch.setattr(agentic_graph, "get_retriever", SlowFakeRetriever)
+    monkeypatch.setattr(agentic_graph, "get_tools", list)
+    monkeypatch.setattr(query_router, "get_domain_centroid", lambda: None)
+    agent_calls.clear()
+    retrieved_queries.clear()
+    return agentic_graph.build_graph()
+
+
+async def run_query(graph, query):
+    return await graph.ainvoke({"messages": [HumanMessage(content=query)]})
+
+
+@pytest.mark.asyncio
+async def test_query_runs_through_async_nodes(graph):
+    final_state = await run_query(graph, "Which farming grants cover hedgerows?")
+
+    answer = final_state["messages"][-1].content
+    assert answer.startswith("yes")
+    assert final_state["sources"] == ["Capital Grants: https://www.gov.uk/x"]
+    assert final_state["retrieval_attempted"]
+
+
+@pytest.mark.asyncio
+async def test_in_domain_query_skips_agent_call(graph):
+    routed = await run_query(graph, "Which farming grants cover hedgerows?")
+    assert agent_calls == []
+    assert routed["query_route"]["route"] == "retrieve"
+
+    chat = await run_query(graph, "Hello, who are you?")
+    assert agent_calls == [1]
+    assert chat["query_route"]["route"] == "agent"
+    assert not chat.get("retrieval_attempted")
+
+
+@pytest.mark.asyncio
+async def test_grading_keeps_only_relevant_documents(graph):
+    final_state = await run_query(graph, "Which farming grants cover hedgerows?")
+
+    assert [doc.metadata["title"] for doc in final_state["docs"]] == ["Capital Grants"]
+    grades = {g["title"]: g for g in final_state["document_grades"]}
+    assert grades["Capital Grants"]["relevant"]
+    assert not grades["Fishing"]["relevant"]
+    assert grades["Fishing"]["latency_ms"] >= DELAY * 1000
+
+
+@pytest.mark.asyncio
+async def test_parallel_queries_do_not_block_each_other(graph):
+    start = time.perf_counter()
+    await run_query(graph, "What farming grants are open?")
+    single = time.perf_counter() - start
+
+    queries = [f"Tell me about farming grant {i}" for i in range(10)]
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_query(graph, q) for q in queries))
+    parallel = time.perf_counter() - start
+
+    assert len(results) == len(queries)
+    assert parallel < single * 2
+
+
+class StaticRetriever(BaseRetriever):
+    docs: list[Document]
+
+    def _get_relevant_documents(self, query, *, run_manager):  # noqa: ARG002
+        return [doc.model_copy(deep=True) for doc in self.docs]
+
+
+def scored_doc(score, content="Guidance on hedgerows"):
+    return Document(
+        page_content=content,
+        metadata={"title": str(score), "url": f"https://www.gov.uk/{score}"}
+        | {"relevance_score": score},
+    )
+
+
+@pytest.fixture
+def gate_thresholds(monkeypatch):
+    monkeypatch.setattr(agentic_graph.config, "relevance_gate_enabled", True)
+    monkeypatch.setattr(agentic_graph.config, "relevance_gate_high", 0.8)
+    monkeypatch.setattr(agentic_graph.config, "relevance_gate_low", 0.2)
+
+
+def grading_state(*docs):
+    return {"messages": [HumanMessage(content="Hedgerow grants?")], "docs": list(docs)}
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("gate_thresholds")
+async def test_relevance_gate_skips_llm_when_scores_are_clear(monkeypatch):
+    def no_llm(**_):
+        msg = "the grader should not be called"
+        raise AssertionError(msg)
+
+    monkeypatch.setattr(agentic_graph, "azure_gpt4o", no_llm)
+
+    good = await agentic_graph.grade_documents(
+        grading_state(scored_doc(0.9), scored_doc(0.5), scored_doc(0.1))
+    )
+    bad = await agentic_graph.grade_documents(
+        grading_state(scored_doc(0.15), scored_doc(0.1))
+    )
+
+    assert [doc.metadata["title"] for doc in good["docs"]] == ["0.9", "0.5"]
+    assert bad["docs"] == []
+    assert await agentic_graph.route_after_grading(bad) == "rewrite"
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("gate_thresholds")
+async def test_relevance_gate_settles_scored_hybrid_results(monkeypatch):
+    monkeypatch.setattr(agentic_graph, "azure_gpt4o", lambda **_: SlowFakeChatModel())
+    lexical = BM25Index([Document(page_content="CSHT1 hedgerow item")])
+    vector = StaticRetriever(
+        docs=[scored_doc(0.9), scored_doc(0.5, "Slurry"), scored_doc(0.1, "Fish")]
+    )
+    hybrid = HybridRetriever(vector_retriever=vector, lexical_index=lexical, k=4)
+    docs = await hybrid.ainvoke("CSHT1 hedgerow")
+
+    result = await agentic_graph.grade_documents(grading_state(*docs))
+
+    grades = {g["title"]: g for g in result["document_grades"]}
+    assert (grades["0.9"]["graded_by"], grades["0.9"]["relevant"]) == ("score", True)
+    assert (grades["0.5"]["graded_by"], grades["0.5"]["relevant"]) == ("score", True)
+    assert (grades["0.1"]["graded_by"], grades["0.1"]["relevant"]) == ("score", False)
+    # The BM25-only hit has no relevance score, so only it goes to the LLM
+    assert (grades[None]["graded_by"], grades[None]["relevant"]) == ("llm", True)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("gate_thresholds")
+async def test_relevance_gate_sends_only_ambiguous_docs_to_llm(monkeypatch):
+    monkeypatch.setattr(agentic_graph, "azure_gpt4o", lambda **_: SlowFakeChatModel())
+
+    result = await agentic_graph.grade_documents(
+        grading_state(
+            scored_doc(0.5, "Unrelated guidance on fishing"),
+            scored_doc(0.4),
+            scored_doc(0.1),
+        )
+    )
+
+    assert [doc.metadata["title"] for doc in result["docs"]] == ["0.4"]
+    assert [g["graded_by"] for g in result["document_grades"]] == [
+        "llm",
+        "llm",
+        "score",
+    ]
+
+
+class SearchingChatModel(SlowFakeChatModel):
+    """Agent model that always asks to search the knowledge base for ``search``."""
+
+    search: str
+
+    async def _agenerate(self, *_args, **_kwargs):
+        await asyncio.sleep(DELAY)
+        tool_call = {
+            "id": "call_1",
+            "type": "function",
+            "function": {
+                "name": "gov_knowledge_base",
+                "arguments": json.dumps({"query": self.search}),
+            },
+        }
+        message = AIMessage(content="", additional_kwargs={"tool_calls": [tool_call]})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+async def run_agent(monkeypatch, query, search):
+    monkeypatch.setattr(
+        agentic_graph, "azure_gpt4o", lambda **_: SearchingChatModel(search=search)
+    )
+    start = time.perf_counter()
+    result = await agentic_graph.agent({"messages": [HumanMessage(content=query)]})
+    return result, time.perf_counter() - start
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("graph")
+async def test_speculative_retrieval_overlaps_agent_call(monkeypatch):
+    hits = speculation_stats["hits"]
+
+    result, seconds = await run_agent(
+        monkeypatch, "What grants cover hedgerows?", "grants cover hedgerows"
+    )
+
+    assert retrieved_queries == ["What grants cover hedgerows?"]
+    assert result["docs"][0].page_content == "Guidance for What grants cover hedgerows?"
+    assert result["should_generate"]
+    assert speculation_stats["hits"] == hits + 1
+    assert seconds < DELAY * 1.8
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("graph")
+async def test_speculative_retrieval_discarded_for_different_search(monkeypatch):
+    misses = speculation_stats["misses"]
+
+    result, _ = await run_agent(
+        monkeypatch, "Tell me about the scheme", "slurry store grant eligibility"
+    )
+
+    assert retrieved_queries == [
+        "Tell me about the scheme",
+        "slurry store grant eligibility",
+    ]
+    assert (
+        result["docs"][0].page_content == "Guidance for slurry store grant eligibility"
+    )
+    assert speculation_stats["misses"] == misses + 1
+
+
+class FailingRetriever(SlowFakeRetriever):
+    async def _aget_relevant_documents(self, *_args, **_kwargs):
+        msg = "vector store unavailable"
+        raise RuntimeError(msg)
+
+
+@pytest.mark.asyncio
+async def test_failed_prefetch_is_retrieved_when_discarded():
+    unhandled = []
+    asyncio.get_running_loop().set_exception_handler(
+        lambda _loop, context: unhandled.append(context)
+    )
+    errors = speculation_stats["errors"]
+
+    speculation = SpeculativeRetrieval(FailingRetriever(), "hedgerow grants")
+    await asyncio.wait([speculation.task])
+    speculation.discard()
+    del speculation
+    gc.collect()
+
+    assert speculation_stats["errors"] == errors + 1
+    assert unhandled == []
+
+
+class RejectingChatModel(SlowFakeChatModel):
+    """Grader that finds no document relevant, so the question is rewritten."""
+
+    async def _agenerate(self, *_args, **_kwargs):
+        await asyncio.sleep(DELAY / 10)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="no"))])
+
+
+@pytest.mark.asyncio
+async def test_rejected_retrievals_stop_at_rewrite_cap(graph, monkeypatch):
+    monkeypatch.setattr(agentic_graph, "azure_gpt4o", lambda **_: RejectingChatModel())
+    monkeypatch.setattr(budget.config, "max_rewrites", 2)
+    monkeypatch.setattr(budget.config, "speculative_retrieval", False)
+
+    final_state = await graph.ainvoke(
+        {"messages": [HumanMessage(content="Which farming grants cover hedgerows?")]}
+        | budget.start_budget()
+    )
+
+    assert final_state["rewrites"] == 2
+    assert len(retrieved_queries) == 3
+    assert final_state["degraded"] == ["rewrite_limit", "best_docs"]
+    assert final_state["sources"]
+
+
+@pytest.mark.asyncio
+async def test_close_deadline_skips_grading_and_rewrite(graph, monkeypatch):
+    monkeypatch.setattr(agentic_graph, "azure_gpt4o", lambda **_: RejectingChatModel())
+    monkeypatch.setattr(budget.config, "budget_grading_seconds", 5.0)
+
+    final_state = await graph.ainvoke(
+        {
+            "messages": [HumanMessage(content="Which farming grants cover hedgerows?")],
+            "deadline": time.monotonic() + 1.0,
+        }
+    )
+
+    grades = final_state["document_grades"]
+    assert {g["graded_by"] for g in grades} == {"budget"}
+    assert final_state["degraded"] == ["grading_skipped"]
+    assert not final_state.get("rewrites")
+    assert len(final_state["docs"]) == 2
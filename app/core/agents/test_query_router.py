@@ -0,0 +1,68 @@
+import pytest
+
+from app.core.agents import query_router
+from app.core.agents.query_router import classify_query, match_keyword
+from app.core.rag.domain_centroid import DomainCentroid
+
+
+class FakeEmbeddings:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    async def aembed_query(self, text):
+        return self.vectors[text]
+
+
+@pytest.fixture
+def centroid(monkeypatch, tmp_path):
+    path = str(tmp_path / "centroid.npy")
+    DomainCentroid.from_vectors([[3.0, 0.0], [1.0, 0.2]]).save(path)
+    monkeypatch.setattr(query_router.config, "query_router_threshold", 0.8)
+    monkeypatch.setattr(
+        query_router, "get_domain_centroid", lambda: DomainCentroid.load(path)
+    )
+    monkeypatch.setattr(
+        query_router,
+        "get_embedding_model",
+        lambda: FakeEmbeddings(
+            {"How much are herbal leys paid?": [0.9, 0.1], "Weather?": [0.1, 0.9]}
+        ),
+    )
+
+
+def test_match_keyword():
+    assert match_keyword("Can FARMERS apply?") == "farm"
+    assert match_keyword("Is there a support scheme for ponds?") == "support scheme"
+    assert match_keyword("Advice for an immigrant worker") is None
+
+
+@pytest.mark.asyncio
+async def test_keyword_match_routes_to_retrieval_without_embedding(monkeypatch):
+    monkeypatch.setattr(query_router, "get_embedding_model", None)
+
+    decision = await classify_query("Which grants cover hedgerows?")
+
+    assert decision["route"] == "retrieve"
+    assert decision["reason"] == "keyword"
+    assert decision["keyword"] == "grants"
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("centroid")
+async def test_centroid_similarity_routes_in_domain_queries():
+    in_domain = await classify_query("How much are herbal leys paid?")
+    off_domain = await classify_query("Weather?")
+
+    assert (in_domain["route"], in_domain["reason"]) == ("retrieve", "centroid")
+    assert in_domain["similarity"] > 0.8
+    assert (off_domain["route"], off_domain["reason"]) == ("agent", "no_match")
+    assert off_domain["similarity"] < 0.8
+
+
+@pytest.mark.asyncio
+async def test_router_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(query_router.config, "query_router_enabled", False)
+
+    decision = await classify_query("Which grants cover hedgerows?")
+
+    assert (decision["route"], decision["reason"]) == ("agent", "disabled")
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from logging import getLogger
+
+from app.common.mongo import get_db, get_mongo_client
+from app.config import config
+from app.core.rag.vector_store import read_index_version
+
+logger = getLogger(__name__)
+
+COLLECTION_NAME = "response_cache"
+
+
+def normalise_query(query: str) -> str:
+    """Case-folds, collapses whitespace and drops trailing punctuation."""
+    return " ".join(query.casefold().split()).rstrip("?!. ")
+
+
+def cache_key(query: str) -> str:
+    # Keyed on the index version too, so re-ingestion invalidates every entry
+    normalised = normalise_query(query)
+    digest = hashlib.sha256(normalised.encode("utf-8")).hexdigest()
+    return f"{read_index_version()}:{digest}"
+
+
+class ResponseCache:
+    """In-process LRU/TTL cache of answers keyed by the normalised query text.
+
+    Concurrent requests for the same key are coalesced: the first one runs the
+    graph and the rest await its result. An optional MongoDB tier shares
+    answers between workers. Values are plain dicts so they can be stored in
+    Mongo as-is.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._indexes_ready = False
+
+    def _get_local(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_local(self, key, value):
+        expires_at = time.monotonic() + config.response_cache_ttl_seconds
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > config.response_cache_max_entries:
+            self._entries.popitem(last=False)
+
+    async def _collection(self):
+        db = await get_db(await get_mongo_client())
+        collection = db[COLLECTION_NAME]
+        if not self._indexes_ready:
+            await collection.create_index(
+                "created_at", expireAfterSeconds=config.response_cache_ttl_seconds
+            )
+            self._indexes_ready = True
+        return collection
+
+    async def _get_shared(self, key):
+        if not config.response_cache_mongo_enabled:
+            return None
+        try:
+            collection = await self._collection()
+            entry = await collection.find_one({"_id": key})
+        except Exception as e:
+            logger.warning("Response cache lookup in MongoDB failed: %s", e)
+            return None
+        return entry["value"] if entry else None
+
+    async def _put_shared(self, key, value):
+        if not config.response_cache_mongo_enabled:
+            return
+        try:
+            collection = await self._collection()
+            await collection.replace_one(
+                {"_id": key},
+                {"value": value, "created_at": datetime.now(timezone.utc)},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning("Response cache store in MongoDB failed: %s", e)
+
+    async def get_or_compute(self, query, compute):
+        """Returns ``(value, source)`` for the query.
+
+        ``source`` is "exact" for a cache hit, "coalesced" when the value came
+        from another in-flight request, or None when ``compute`` ran.
+        ``compute(query)`` must return ``(value, cacheable)``.
+
+        The computation runs in a task owned by the cache, so it carries on
+        for the requests coalesced onto it if the one that started it is
+        cancelled.
+        """
+        key = cache_key(query)
+        value = self._get_local(key)
+        if value is not None:
+            self.hits += 1
+            return value, "exact"
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            # Shield so one caller going away does not cancel the shared result
+            value, _ = await asyncio.shield(inflight)
+            return value, "coalesced"
+
+        task = asyncio.create_task(self._fill(key, query, compute))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._finish(key, task))
+        return await asyncio.shield(task)
+
+    async def _fill(self, key, query, compute):
+        value = await self._get_shared(key)
+        if value is not None:
+            self.shared_hits += 1
+            self._put_local(key, value)
+            return value, "exact"
+        self.misses += 1
+        value, cacheable = await compute(query)
+        if cacheable:
+            self._put_local(key, value)
+            await self._put_shared(key, value)
+        return value, None
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark any exception as retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "enabled": config.response_cache_enabled,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,199 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from logging import getLogger
+from typing import Optional
+
+import numpy as np
+
+from app.common.mongo import get_db, get_mongo_client
+from app.config import config
+from app.core.rag.vector_store import get_embedding_model, read_index_version
+
+logger = getLogger(__name__)
+
+COLLECTION_NAME = "semantic_cache"
+
+
+class SemanticCacheResult:
+    def __init__(self, hit, similarity=None, answer=None, sources=None):
+        self.hit = hit
+        self.similarity = similarity
+        self.answer = answer
+        self.sources = sources
+
+
+class SemanticCache:
+    """Answers for past questions, looked up by embedding similarity.
+
+    Entries live in MongoDB so every worker shares them and the TTL index
+    expires them. Each worker keeps a normalised float32 matrix of the entries
+    for the current index version, so a lookup is one matrix-vector product;
+    it is reloaded from Mongo every ``semantic_cache_refresh_seconds`` to pick
+    up answers cached by other workers, and immediately when ingestion writes
+    a new index version.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._indexes_ready = False
+        self._refresh_lock = asyncio.Lock()
+        self._loaded_version = None
+        self._loaded_at = 0.0
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._entries: list[dict] = []
+        self._created_at: list[float] = []
+
+    async def _collection(self):
+        db = await get_db(await get_mongo_client())
+        collection = db[COLLECTION_NAME]
+        if not self._indexes_ready:
+            await collection.create_index(
+                "created_at", expireAfterSeconds=config.semantic_cache_ttl_seconds
+            )
+            await collection.create_index("index_version")
+            self._indexes_ready = True
+        return collection
+
+    def _is_current(self, index_version):
+        age = time.monotonic() - self._loaded_at
+        return (
+            self._loaded_version == index_version
+            and age < config.semantic_cache_refresh_seconds
+        )
+
+    async def _refresh(self, index_version):
+        if self._is_current(index_version):
+            return
+        async with self._refresh_lock:
+            if not self._is_current(index_version):
+                await self._load(index_version)
+
+    async def _load(self, index_version):
+        collection = await self._collection()
+        cursor = (
+            collection.find({"index_version": index_version})
+            .sort("created_at", -1)
+            .limit(config.semantic_cache_max_entries)
+        )
+        entries = [entry async for entry in cursor]
+        vectors = [entry.pop("embedding") for entry in entries]
+        self._matrix = (
+            np.asarray(vectors, dtype=np.float32)
+            if vectors
+            else np.empty((0, 0), dtype=np.float32)
+        )
+        self._entries = entries
+        self._created_at = [
+            entry["created_at"].replace(tzinfo=timezone.utc).timestamp()
+            for entry in entries
+        ]
+        self._loaded_version = index_version
+        self._loaded_at = time.monotonic()
+        logger.info(
+            "Loaded %d semantic cache entries for index version %s",
+            len(entries),
+            index_version,
+        )
+
+    @staticmethod
+    def _normalise(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def embed(self, query: str):
+        embedding_model = get_embedding_model()
+        if embedding_model is None:
+            return None
+        return self._normalise(await embedding_model.aembed_query(query))
+
+    async def lookup(self, query_embedding) -> SemanticCacheResult:
+        """Returns the closest cached answer if it is above the threshold."""
+        await self._refresh(read_index_version())
+        if not self._entries:
+            self.misses += 1
+            return SemanticCacheResult(hit=False)
+
+        similarities = self._matrix @ query_embedding
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        expired = (
+            time.time() - self._created_at[best] > config.semantic_cache_ttl_seconds
+        )
+        if similarity < config.semantic_cache_threshold or expired:
+            self.misses += 1
+            return SemanticCacheResult(hit=False, similarity=similarity)
+
+        self.hits += 1
+        entry = self._entries[best]
+        return SemanticCacheResult(
+            hit=True,
+            similarity=similarity,
+            answer=entry["answer"],
+            sources=entry.get("sources"),
+        )
+
+    async def store(self, query, query_embedding, answer, sources):
+        index_version = read_index_version()
+        created_at = datetime.now(timezone.utc)
+        entry = {
+            "query": query,
+            "answer": answer,
+            "sources": sources,
+            "index_version": index_version,
+            "created_at": created_at,
+        }
+        collection = await self._collection()
+        await collection.insert_one({**entry, "embedding": query_embedding.tolist()})
+
+        # Make the answer visible to this worker straight away
+        if self._loaded_version == index_version:
+            row = query_embedding.reshape(1, -1)
+            self._matrix = (
+                np.vstack([self._matrix, row]) if self._matrix.size else row.copy()
+            )
+            self._entries.append(entry)
+            self._created_at.append(created_at.timestamp())
+
+    def stats(self):
+        return {
+            "enabled": config.semantic_cache_enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "entries": len(self._entries),
+            "index_version": self._loaded_version,
+        }
+
+
+semantic_cache = SemanticCache()
+
+
+async def lookup_semantic_cache(query: str):
+    """Embeds the query and checks the cache.
+
+    Returns ``(result, query_embedding)``. Cache failures are logged and
+    treated as a miss so the query still goes through the graph.
+    """
+    try:
+        query_embedding = await semantic_cache.embed(query)
+        if query_embedding is None:
+            return SemanticCacheResult(hit=False), None
+        return await semantic_cache.lookup(query_embedding), query_embedding
+    except Exception as e:
+        semantic_cache.errors += 1
+        logger.warning("Semantic cache lookup failed: %s", e)
+        return SemanticCacheResult(hit=False), None
+
+
+async def store_semantic_cache(
+    query: str, query_embedding, answer: str, sources: Optional[list[str]]
+):
+    try:
+        await semantic_cache.store(query, query_embedding, answer, sources)
+    except Exception as e:
+        semantic_cache.errors += 1
+        logger.warning("Semantic cache store failed: %s", e)
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from app.core.cache import response_cache as response_cache_module
+from app.core.cache.response_cache import ResponseCache, normalise_query
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(response_cache_module, "read_index_version", lambda: "v1")
+    monkeypatch.setattr(response_cache_module.config, "response_cache_max_entries", 2)
+    return ResponseCache()
+
+
+def counting_compute(delay=0.0):
+    calls = []
+
+    async def compute(query):
+        calls.append(query)
+        await asyncio.sleep(delay)
+        return {"answer": f"answer to {query}"}, True
+
+    return compute, calls
+
+
+def test_normalise_query():
+    assert normalise_query("  What grants   are OPEN? ") == "what grants are open"
+
+
+@pytest.mark.asyncio
+async def test_repeated_query_is_served_from_cache(cache):
+    compute, calls = counting_compute()
+
+    first = await cache.get_or_compute("What grants are open?", compute)
+    second = await cache.get_or_compute("what grants are open", compute)
+
+    assert first == ({"answer": "answer to What grants are open?"}, None)
+    assert second == (first[0], "exact")
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_queries_share_one_run(cache):
+    compute, calls = counting_compute(delay=0.05)
+
+    results = await asyncio.gather(
+        *(cache.get_or_compute("Is there a hedgerow grant?", compute) for _ in range(5))
+    )
+
+    assert len(calls) == 1
+    assert [source for _, source in results].count("coalesced") == 4
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entry_is_evicted(cache):
+    compute, calls = counting_compute()
+
+    for query in ["a", "b", "a", "c", "a", "b"]:
+        await cache.get_or_compute(query, compute)
+
+    assert calls == ["a", "b", "c", "b"]
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_coalesced_callers_and_are_not_cached(cache):
+    async def failing(_query):
+        await asyncio.sleep(0.01)
+        msg = "graph failed"
+        raise RuntimeError(msg)
+
+    results = await asyncio.gather(
+        *(cache.get_or_compute("q", failing) for _ in range(3)),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelling_first_caller_does_not_fail_coalesced_callers(cache):
+    compute, calls = counting_compute(delay=0.05)
+
+    leader = asyncio.create_task(cache.get_or_compute("q", compute))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(cache.get_or_compute("q", compute))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await follower == ({"answer": "answer to q"}, "coalesced")
+    assert leader.cancelled()
+    assert len(calls) == 1
+    assert cache.stats()["in_flight"] == 0
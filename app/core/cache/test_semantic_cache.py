@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from app.core.cache import semantic_cache as semantic_cache_module
+from app.core.cache.semantic_cache import SemanticCache
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, key, direction):
+        self._docs = sorted(self._docs, key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self._docs = self._docs[:n]
+        return self
+
+    async def __aiter__(self):
+        for doc in self._docs:
+            yield dict(doc)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    async def create_index(self, *_args, **_kwargs):
+        return None
+
+    async def insert_one(self, doc):
+        # Mongo hands datetimes back without tzinfo
+        self.docs.append({**doc, "created_at": doc["created_at"].replace(tzinfo=None)})
+
+    def find(self, query):
+        return FakeCursor(
+            [d for d in self.docs if all(d[k] == v for k, v in query.items())]
+        )
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def index_version(monkeypatch):
+    version = {"current": "v1"}
+    monkeypatch.setattr(
+        semantic_cache_module, "read_index_version", lambda: version["current"]
+    )
+    return version
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    collection = FakeCollection()
+    cache = SemanticCache()
+
+    async def fake_collection():
+        return collection
+
+    monkeypatch.setattr(cache, "_collection", fake_collection)
+    monkeypatch.setattr(semantic_cache_module.config, "semantic_cache_threshold", 0.9)
+    return cache
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("index_version")
+async def test_near_duplicate_question_hits(cache):
+    await cache.store("Who can apply?", unit(1, 0, 0), "Farmers.", ["A: url"])
+
+    hit = await cache.lookup(unit(1, 0.1, 0))
+    miss = await cache.lookup(unit(0, 1, 0))
+
+    assert hit.hit
+    assert hit.answer == "Farmers."
+    assert hit.sources == ["A: url"]
+    assert hit.similarity > 0.99
+    assert not miss.hit
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_new_index_version_invalidates_entries(cache, index_version):
+    await cache.store("Who can apply?", unit(1, 0, 0), "Farmers.", None)
+    assert (await cache.lookup(unit(1, 0, 0))).hit
+
+    index_version["current"] = "v2"
+
+    assert not (await cache.lookup(unit(1, 0, 0))).hit
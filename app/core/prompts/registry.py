@@ -0,0 +1,81 @@
+from logging import getLogger
+from pathlib import Path
+from typing import Optional
+
+from langchain_core.prompts import (
+    BasePromptTemplate,
+    ChatPromptTemplate,
+    PromptTemplate,
+)
+
+logger = getLogger(__name__)
+
+TEMPLATES_DIR = Path(__file__).parent / "templates"
+
+# Prompts used by the agent graph. Each template ships in the repo as
+# templates/<name>.v<version>.txt; "hub" names the LangChain Hub prompt that
+# may optionally replace the local copy at startup.
+PROMPT_SPECS = {
+    "rag": {"version": 1, "kind": "chat", "hub": "rlm/rag-prompt"},
+    "grade_document": {"version": 1, "kind": "text"},
+    "rewrite_question": {"version": 1, "kind": "chat"},
+    "agent_system": {"version": 1, "kind": "text"},
+}
+
+_prompts: dict[str, BasePromptTemplate] = {}
+_sources: dict[str, str] = {}
+
+
+def _load_local_prompt(name: str, spec: dict) -> BasePromptTemplate:
+    path = TEMPLATES_DIR / f"{name}.v{spec['version']}.txt"
+    template = path.read_text(encoding="utf-8").strip()
+    if spec["kind"] == "chat":
+        return ChatPromptTemplate.from_messages([("human", template)])
+    return PromptTemplate.from_template(template)
+
+
+def refresh_from_hub():
+    """Replaces local templates with their LangChain Hub versions where available.
+
+    Failures are logged and the local template is kept, so the service still
+    starts without network access.
+    """
+    from langchain import hub
+
+    for name, spec in PROMPT_SPECS.items():
+        hub_ref = spec.get("hub")
+        if not hub_ref:
+            continue
+        try:
+            _prompts[name] = hub.pull(hub_ref)
+            _sources[name] = f"hub:{hub_ref}"
+            logger.info("Refreshed prompt '%s' from hub %s", name, hub_ref)
+        except Exception as e:
+            logger.warning(
+                "Could not refresh prompt '%s' from hub %s, keeping local copy: %s",
+                name,
+                hub_ref,
+                e,
+            )
+
+
+def load_prompts(refresh: bool = False) -> dict[str, BasePromptTemplate]:
+    """Loads every prompt template once from the files shipped in the repo."""
+    for name, spec in PROMPT_SPECS.items():
+        _prompts[name] = _load_local_prompt(name, spec)
+        _sources[name] = f"local:v{spec['version']}"
+    if refresh:
+        refresh_from_hub()
+    logger.info("Loaded prompts: %s", _sources)
+    return _prompts
+
+
+def get_prompt(name: str) -> BasePromptTemplate:
+    if not _prompts:
+        load_prompts()
+    return _prompts[name]
+
+
+def prompt_sources() -> dict[str, Optional[str]]:
+    """Where each loaded prompt came from, e.g. {'rag': 'local:v1'}."""
+    return {name: _sources.get(name) for name in PROMPT_SPECS}
@@ -0,0 +1,20 @@
+from app.core.prompts.registry import (
+    PROMPT_SPECS,
+    get_prompt,
+    load_prompts,
+    prompt_sources,
+)
+
+
+def test_prompts_load_from_shipped_templates():
+    prompts = load_prompts()
+
+    assert set(prompts) == set(PROMPT_SPECS)
+    assert prompt_sources()["rag"] == "local:v1"
+    assert set(get_prompt("rag").input_variables) == {"context", "question"}
+    assert set(get_prompt("grade_document").input_variables) == {
+        "context",
+        "question",
+    }
+    assert get_prompt("rewrite_question").input_variables == ["question"]
+    assert get_prompt("agent_system").input_variables == []
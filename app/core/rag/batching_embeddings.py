@@ -0,0 +1,96 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+
+class BatchingEmbeddings(Embeddings):
+    """Coalesces concurrent query embeddings into one API call.
+
+    Each ``aembed_query`` joins a pending batch, which is sent through the
+    underlying model's ``aembed_documents`` once ``window_ms`` has passed
+    since its first query or it holds ``max_batch_size`` texts; every caller
+    then gets its own vector back. A text asked for twice in one batch is
+    only sent once. Document embedding and the blocking methods pass
+    straight through, as ingestion does its own batching.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        window_ms: float = 5.0,
+        max_batch_size: int = 64,
+    ):
+        self.underlying = underlying
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self._loop = None
+        self._texts: list[str] = []
+        self._futures: list[asyncio.Future] = []
+        self._timer = None
+        self._sending: set[asyncio.Task] = set()
+        self.queries = 0
+        self.api_calls = 0
+        self.largest_batch = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.underlying.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # A batch pending on another (closed) event loop cannot be sent
+            self._loop = loop
+            self._texts, self._futures, self._timer = [], [], None
+        future = loop.create_future()
+        self._texts.append(text)
+        self._futures.append(future)
+        self.queries += 1
+        if len(self._texts) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        texts, futures = self._texts, self._futures
+        self._texts, self._futures, self._timer = [], [], None
+        task = self._loop.create_task(self._send(texts, futures))
+        # Keep a reference so the task is not garbage collected mid-call
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, texts, futures):
+        unique = list(dict.fromkeys(texts))
+        self.api_calls += 1
+        self.largest_batch = max(self.largest_batch, len(unique))
+        try:
+            vectors = await self.underlying.aembed_documents(unique)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        vector_for_text = dict(zip(unique, vectors))
+        for text, future in zip(texts, futures):
+            # Callers that gave up have cancelled their future
+            if not future.done():
+                future.set_result(vector_for_text[text])
+
+    def stats(self):
+        return {
+            "queries": self.queries,
+            "api_calls": self.api_calls,
+            "mean_batch": round(self.queries / self.api_calls, 2)
+            if self.api_calls
+            else None,
+            "largest_batch": self.largest_batch,
+            "window_ms": self.window_ms,
+        }
@@ -0,0 +1,222 @@
+import hashlib
+from collections import OrderedDict
+from logging import getLogger
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.stores import ByteStore
+from pymongo import MongoClient, ReplaceOne
+
+from app.common.tls import custom_ca_certs
+from app.config import config
+
+logger = getLogger(__name__)
+
+
+class MongoByteStore(ByteStore):
+    """ByteStore backed by a MongoDB collection, one document per key."""
+
+    def __init__(self, collection_name="embedding_cache"):
+        cert = custom_ca_certs.get(config.mongo_truststore)
+        client = (
+            MongoClient(config.mongo_uri, tlsCAFile=cert)
+            if cert
+            else MongoClient(config.mongo_uri)
+        )
+        self._collection = client.get_database(config.mongo_database)[collection_name]
+
+    def mget(self, keys):
+        found = {
+            doc["_id"]: doc["value"]
+            for doc in self._collection.find({"_id": {"$in": list(keys)}})
+        }
+        return [found.get(key) for key in keys]
+
+    def mset(self, key_value_pairs):
+        requests = [
+            ReplaceOne({"_id": key}, {"value": value}, upsert=True)
+            for key, value in key_value_pairs
+        ]
+        if requests:
+            self._collection.bulk_write(requests, ordered=False)
+
+    def mdelete(self, keys):
+        self._collection.delete_many({"_id": {"$in": list(keys)}})
+
+    def yield_keys(self, *, prefix=None):
+        query = {"_id": {"$regex": f"^{prefix}"}} if prefix else {}
+        for doc in self._collection.find(query, {"_id": 1}):
+            yield doc["_id"]
+
+
+def _encode(vector):
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def _decode(value):
+    return np.frombuffer(value, dtype=np.float32).tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """Caches embeddings by model name and text hash in front of another model.
+
+    Lookups go to a bounded in-memory LRU first, then to an optional
+    persistent ``ByteStore``; only texts missing from both are sent to the
+    underlying model, in a single call per batch. Used for both query
+    embedding and ingestion, so re-ingesting unchanged chunks is free.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        max_entries: int = 10000,
+        store: Optional[ByteStore] = None,
+    ):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.store = store
+        self._lru: OrderedDict[str, list[float]] = OrderedDict()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.api_calls = 0
+
+    def _key(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}/{digest}"
+
+    def _remember(self, key, vector):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _from_memory(self, keys):
+        """Returns cached vectors (None where missing) and the keys still needed."""
+        vectors = []
+        missing = []
+        for key in keys:
+            vector = self._lru.get(key)
+            if vector is None:
+                missing.append(key)
+            else:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+            vectors.append(vector)
+        # Texts repeated within one batch are only looked up / embedded once
+        return vectors, list(dict.fromkeys(missing))
+
+    def _from_store(self, keys, values):
+        found = {}
+        for key, value in zip(keys, values):
+            if value is not None:
+                found[key] = _decode(value)
+                self._remember(key, found[key])
+        self.store_hits += len(found)
+        return found
+
+    def _collect(self, keys, vectors, found):
+        return [
+            vector if vector is not None else found[key]
+            for key, vector in zip(keys, vectors)
+        ]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors, missing = self._from_memory(keys)
+        found = {}
+        if missing and self.store is not None:
+            found = self._from_store(missing, self.store.mget(missing))
+        missing = [key for key in missing if key not in found]
+        if missing:
+            text_for_key = dict(zip(keys, texts))
+            embedded = self.underlying.embed_documents(
+                [text_for_key[key] for key in missing]
+            )
+            self._record_embedded(missing, embedded, found)
+            if self.store is not None:
+                self.store.mset(
+                    [(key, _encode(vector)) for key, vector in zip(missing, embedded)]
+                )
+        return self._collect(keys, vectors, found)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        vectors, missing = self._from_memory([key])
+        if not missing:
+            return vectors[0]
+        if self.store is not None:
+            found = self._from_store(missing, self.store.mget(missing))
+            if found:
+                return found[key]
+        vector = self.underlying.embed_query(text)
+        self._record_embedded([key], [vector], {})
+        if self.store is not None:
+            self.store.mset([(key, _encode(vector))])
+        return vector
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors, missing = self._from_memory(keys)
+        found = {}
+        if missing and self.store is not None:
+            found = self._from_store(missing, await self.store.amget(missing))
+        missing = [key for key in missing if key not in found]
+        if missing:
+            text_for_key = dict(zip(keys, texts))
+            embedded = await self.underlying.aembed_documents(
+                [text_for_key[key] for key in missing]
+            )
+            self._record_embedded(missing, embedded, found)
+            if self.store is not None:
+                await self.store.amset(
+                    [(key, _encode(vector)) for key, vector in zip(missing, embedded)]
+                )
+        return self._collect(keys, vectors, found)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        vectors, missing = self._from_memory([key])
+        if not missing:
+            return vectors[0]
+        if self.store is not None:
+            found = self._from_store(missing, await self.store.amget(missing))
+            if found:
+                return found[key]
+        vector = await self.underlying.aembed_query(text)
+        self._record_embedded([key], [vector], {})
+        if self.store is not None:
+            await self.store.amset([(key, _encode(vector))])
+        return vector
+
+    def _record_embedded(self, keys, vectors, found):
+        self.api_calls += 1
+        self.misses += len(keys)
+        for key, vector in zip(keys, vectors):
+            found[key] = vector
+            self._remember(key, vector)
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "api_calls": self.api_calls,
+            "entries": len(self._lru),
+            "store": type(self.store).__name__ if self.store is not None else None,
+        }
+
+
+def build_embedding_store() -> Optional[ByteStore]:
+    """Persistent tier selected by EMBEDDING_CACHE_STORE ("file" or "mongo")."""
+    if config.embedding_cache_store == "file":
+        from langchain.storage import LocalFileStore
+
+        return LocalFileStore(config.embedding_cache_path)
+    if config.embedding_cache_store == "mongo":
+        return MongoByteStore()
+    return None
@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from app.common.async_streams import map_in_executor
+from app.config import config
+
+
+def init_worker():
+    """Builds the Markdown converter and tokenizer once per worker process."""
+    # Importing the module constructs its HtmlConverter
+    import app.core.rag.download_farming_grants  # noqa: F401
+    from app.core.rag.ingest_markdown_docs import get_text_splitter
+
+    get_text_splitter()
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    workers = config.ingest_workers if workers is None else workers
+    if workers < 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+class CpuPool:
+    """Runs the CPU-bound ingestion stages (HTML to Markdown, token
+    splitting) across worker processes.
+
+    With no workers the stages run one item at a time on a thread in this
+    process, as they did before the pool existed.
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunksize: Optional[int] = None):
+        self.workers = resolve_workers(workers)
+        self.chunksize = chunksize or config.ingest_worker_chunksize
+        self.executor = (
+            ProcessPoolExecutor(
+                max_workers=self.workers,
+                # Forking the threaded ingestion process risks deadlocks
+                mp_context=multiprocessing.get_context("forkserver"),
+                initializer=init_worker,
+            )
+            if self.workers
+            else None
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    def map(self, func, items):
+        """Yields ``(item, result, error)`` for each item as it is processed;
+        ``func`` must be a module-level function when workers are used."""
+        if self.executor is None:
+            return map_in_executor(None, func, items)
+        # Two batches per worker keep every worker busy while results are
+        # handed back
+        return map_in_executor(
+            self.executor, func, items, 2 * self.workers, self.chunksize
+        )
@@ -0,0 +1,60 @@
+import json
+import os
+
+
+def result_version(result: dict):
+    """The timestamp that changes when a grant is republished."""
+    return result.get("updated_at") or result.get("public_timestamp")
+
+
+class CrawlDiff:
+    def __init__(self, new, updated, unchanged, removed):
+        self.new = new
+        self.updated = updated
+        self.unchanged = unchanged
+        self.removed = removed
+
+    def summary(self):
+        return (
+            f"{len(self.new)} new, {len(self.updated)} updated, "
+            f"{len(self.unchanged)} unchanged, {len(self.removed)} removed"
+        )
+
+
+class CrawlState:
+    """The version of every grant seen by the last crawl, keyed by link."""
+
+    def __init__(self, versions: dict[str, str]):
+        self.versions = versions
+
+    @classmethod
+    def load(cls, path: str) -> "CrawlState":
+        if not os.path.exists(path):
+            return cls({})
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["versions"])
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"versions": self.versions}, f, indent=2, sort_keys=True)
+        os.replace(f"{path}.tmp", path)
+
+    def diff(self, results: list[dict], complete: bool = True) -> CrawlDiff:
+        """Compares search results with this state.
+
+        Removals are only reported for a ``complete`` crawl; a partial one
+        cannot tell a removed grant from one it did not reach.
+        """
+        new, updated, unchanged = [], [], []
+        for result in results:
+            previous = self.versions.get(result["link"])
+            if previous is None:
+                new.append(result)
+            elif previous != result_version(result):
+                updated.append(result)
+            else:
+                unchanged.append(result)
+        seen = {result["link"] for result in results}
+        removed = sorted(set(self.versions) - seen) if complete else []
+        return CrawlDiff(new, updated, unchanged, removed)
@@ -0,0 +1,110 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+
+def _unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class DomainCentroid:
+    """Mean direction of the indexed chunk embeddings.
+
+    A query embedding's cosine similarity to it says how close the query is
+    to the corpus as a whole, without searching it. The sum and count of the
+    unit vectors it was averaged from are saved with it, so ingestion can
+    update it as chunks are added and deleted (see ``CentroidSum``).
+    """
+
+    def __init__(
+        self,
+        centroid: np.ndarray,
+        total: Optional[np.ndarray] = None,
+        count: Optional[int] = None,
+    ):
+        self.centroid = centroid.astype(np.float32)
+        self.total = total
+        self.count = count
+
+    @classmethod
+    def from_total(cls, total, count: int) -> "DomainCentroid":
+        total = np.asarray(total, dtype=np.float64)
+        return cls(total / np.linalg.norm(total), total, count)
+
+    @classmethod
+    def from_vectors(cls, vectors) -> "DomainCentroid":
+        vectors = _unit_rows(vectors)
+        return cls.from_total(vectors.sum(axis=0, dtype=np.float64), len(vectors))
+
+    @classmethod
+    def load(cls, path: str) -> "DomainCentroid":
+        data = np.load(path)
+        if isinstance(data, np.ndarray):
+            # Saved before the sum was kept: the centroid alone
+            return cls(data)
+        return cls(data["centroid"], data["total"], int(data["count"]))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "wb") as f:
+            if self.total is None:
+                np.save(f, self.centroid)
+            else:
+                np.savez(f, centroid=self.centroid, total=self.total, count=self.count)
+        os.replace(f"{path}.tmp", path)
+
+    def similarity(self, vector) -> float:
+        vector = np.asarray(vector, dtype=np.float32)
+        if len(vector) != len(self.centroid):
+            return 0.0  # Index built with different embedding dimensions
+        return float(vector @ self.centroid / np.linalg.norm(vector))
+
+
+class CentroidSum:
+    """Running sum of the unit-length embeddings of every indexed chunk.
+
+    Ingestion adds the vectors it stores and subtracts those it deletes, so
+    the centroid is kept current without reading the index back. ``count``
+    lets the caller check the sum still covers exactly the indexed chunks.
+    """
+
+    def __init__(self, total: Optional[np.ndarray] = None, count: int = 0):
+        self.total = total
+        self.count = count
+
+    @classmethod
+    def load(cls, path: str) -> "CentroidSum":
+        """The sum saved with the centroid at ``path``; empty if there is
+        none, which the count check then catches if chunks are indexed."""
+        if not os.path.exists(path):
+            return cls()
+        centroid = DomainCentroid.load(path)
+        if centroid.total is None:
+            return cls()
+        return cls(centroid.total, centroid.count)
+
+    def _update(self, vectors, sign):
+        if len(vectors) == 0:
+            return
+        rows = _unit_rows(vectors)
+        change = sign * rows.sum(axis=0, dtype=np.float64)
+        self.total = change if self.total is None else self.total + change
+        self.count += sign * len(rows)
+
+    def add(self, vectors):
+        self._update(vectors, 1)
+
+    def remove(self, vectors):
+        self._update(vectors, -1)
+
+    def clear(self):
+        self.total, self.count = None, 0
+
+    def centroid(self) -> Optional[DomainCentroid]:
+        if not self.count:
+            return None
+        return DomainCentroid.from_total(self.total, self.count)
@@ -1,70 +1,101 @@
+import argparse
+import asyncio
+import importlib.util
 import json
 import time
 
 import httpx
 from markitdown.converters._html_converter import HtmlConverter
 
+from app.common.async_streams import map_unordered
+from app.common.rate_limit import (
+    TokenBucket,
+    backoff_delay,
+    is_retryable,
+    retry_after_seconds,
+)
+from app.config import config
+from app.core.rag.cpu_pool import CpuPool
+from app.core.rag.crawl_state import CrawlState, result_version
+from app.core.rag.http_cache import HttpCache
+from app.core.rag.jsonl import JsonlWriter, iter_jsonl
+
 # --- Configuration ---
 SEARCH_API_URL = "https://www.gov.uk/api/search.json"
 CONTENT_API_BASE_URL = "https://www.gov.uk/api/content"  # Base URL for content API
 SEARCH_PARAMS = {
     "filter_format": "farming_grant",
-    "fields": "link",  # Only fetch the link field from search results
-    "count": 500,  # Number of results to fetch (adjust as needed)
+    # Link plus the timestamps used to spot new and updated grants
+    "fields": ["link", "public_timestamp", "updated_at"],
+    # Oldest first, so grants published mid-crawl land on the last page
+    "order": "public_timestamp",
 }
+SEARCH_PAGE_SIZE = 100  # Results per search API page; pages are fetched concurrently
+GOVUK_BASE_URL = "https://www.gov.uk"
 
 # It's good practice to identify your script with a User-Agent
 HEADERS = {"User-Agent": "MyFarmingGrantFetcherScript/1.0 (stewart.jumbe@defra.gov.uk)"}
-# Add a small delay between content API calls to be polite to the server
-DELAY_BETWEEN_REQUESTS = 0.2  # seconds
+# Content requests are rate limited per host (GOVUK_REQUESTS_PER_SECOND) to be
+# polite to the server; failed requests are retried this many times
+FETCH_MAX_RETRIES = 2
 
 # Instantiate HtmlConverter
 html_converter = HtmlConverter()
 
 
 # --- Main Logic ---
-def fetch_farming_grant_content():
-    """
-    Searches for farming grants on GOV.UK and fetches content for each.
-    Returns a list of dictionaries, each containing the link and its content data.
+async def fetch_search_page(client, limiter, start):
+    params = SEARCH_PARAMS | {"start": start, "count": SEARCH_PAGE_SIZE}
+    for attempt in range(1, FETCH_MAX_RETRIES + 2):
+        await limiter.wait(SEARCH_API_URL)
+        try:
+            response = await client.get(SEARCH_API_URL, params=params)
+            response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
+            return response.json()
+        except (httpx.HTTPStatusError, httpx.RequestError) as e:
+            if attempt > FETCH_MAX_RETRIES or not is_retryable(e):
+                raise
+            await asyncio.sleep(retry_after_seconds(e) or backoff_delay(attempt, 0.5))
+    return None  # Unreachable: the last attempt returns or raises
+
+
+async def search_all_grants(client, limiter):
+    """Pages through every farming grant in the search API.
+
+    The first page gives the total; the remaining pages are fetched
+    concurrently. Returns ``(results, complete)``, where ``complete`` is False
+    if the result set shifted while paging and some grants may be missing, or
+    None if a page could not be fetched.
     """
-    print("--- Starting GOV.UK Farming Grant Fetcher ---")
-
-    # 1. Search for farming grants
     print(f"Searching for farming grants using: {SEARCH_API_URL}")
     print(f"Parameters: {SEARCH_PARAMS}")
-    search_response = None  # Initialize to None for error handling avoid unbound local error, if get request fails
     try:
-        search_response = httpx.get(
-            SEARCH_API_URL, params=SEARCH_PARAMS, headers=HEADERS, timeout=30
-        )
-        search_response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-        search_data = search_response.json()  # Parse the JSON response
-        print(
-            f" First item in search data: {search_response.json().get('results', [])[0]}"
-        )
-        results = search_data.get("results", [])
-        print(
-            f"Search successful. Found {len(results)} potential items (limit {SEARCH_PARAMS['count']})."
+        first_page = await fetch_search_page(client, limiter, 0)
+        total = first_page["total"]
+        pages = await asyncio.gather(
+            *(
+                fetch_search_page(client, limiter, start)
+                for start in range(SEARCH_PAGE_SIZE, total, SEARCH_PAGE_SIZE)
+            )
         )
-        print(f"total number of results from search api is: {search_data['total']}")
-
-    except httpx.RequestError as e:
+    except (httpx.HTTPStatusError, httpx.RequestError) as e:
         print(f"Error during search API request: {e}")
         return None  # Indicate failure
-    except json.JSONDecodeError as e:
+    except (json.JSONDecodeError, KeyError) as e:
         print(f"Error decoding JSON from search API: {e}")
-        print(
-            f"Response text: {search_response.text[:500]}..."
-        )  # Print beginning of response
         return None
 
-    # 2. Extract links and fetch content for each
-    if not results:
-        print("No results found matching the criteria.")
-        return []
-    # print(f"results: {results}")
-    return results
+    results = {}
+    for page in [first_page, *pages]:
+        for result in page.get("results", []):
+            results.setdefault(result["link"], result)
+    complete = len(results) >= total
+    print(
+        f"Search successful. Found {len(results)} of {total} items in {len(pages) + 1} pages."
+    )
+    if not complete:
+        print("Search results shifted while paging; removals will not be detected.")
+    return list(results.values()), complete
 
 
 def convert_grant_data_to_metadata_and_markdown(grant_item):
@@ -136,159 +167,301 @@ def convert_grant_data_to_metadata_and_markdown(grant_item):
     return {"markdown_content": markdown_content, "metadata": metadata}
 
 
-def save_markdown_in_json_file(processed_docs):
-    average_document_length = []
-
-    # Save the processed documents (metadata + markdown) to a JSON file
-    if processed_docs:
-        for item in processed_docs:
-            # Calculate length of the actual markdown content
-            content_length = len(item.get("markdown_content", ""))
-            average_document_length.append(content_length)
-            print(
-                f"******Document content length: {content_length} characters for link: {item.get('metadata', {}).get('url', 'N/A')}"
-            )
-        try:
-            output_filename = "farming_grants_processed.json"  # Save as JSON
-            with open(output_filename, "w", encoding="utf-8") as f:
-                json.dump(processed_docs, f, indent=4, ensure_ascii=False)
-            print(f"\nSaved processed documents to {output_filename}")
-            if average_document_length:  # Ensure list is not empty
-                avg_len = sum(average_document_length) / len(average_document_length)
-                print(
-                    f"\nAverage Markdown content length is: {avg_len:.2f} characters."
-                )
-        except OSError as e:
-            print(f"\nError saving processed documents to file: {e}")
-        except TypeError as e:
-            print(f"\nError preparing data for JSON saving: {e}")
+async def save_processed_docs(processed_docs, writer):
+    """Writes each processed document to ``writer`` as it passes through."""
+    total_length = 0
+    async for item in processed_docs:
+        # Calculate length of the actual markdown content
+        content_length = len(item.get("markdown_content", ""))
+        total_length += content_length
+        print(
+            f"******Document content length: {content_length} characters for link: {item.get('metadata', {}).get('url', 'N/A')}"
+        )
+        writer.write(item)
+        yield item
+    if writer.count:
+        print(
+            f"\nAverage Markdown content length is: {total_length / writer.count:.2f} characters."
+        )
     else:
         print("\nNo documents were successfully processed to save.")
 
 
-def fetch_content_for_items(results):
-    """
-    Fetches content for each item in the results list.
-    Each item is expected to be a dictionary with a 'link' key.
-    Returns a list of dictionaries with the original link and the fetched content.
-    """
-    all_grant_data = []
-    # Iterate over each result and fetch its content
-    for i, item in enumerate(results):
-        link = item.get("link")
-        if not link or not link.startswith("/"):
-            print(
-                f"Item {i + 1}/{len(results)}: Skipping - Invalid or missing link: {link}"
-            )
-            continue
-
-        # Construct the full content API URL (e.g., https://www.gov.uk/api/content/path/to/page)
-        # The link from search results already starts with '/', so just append it.
-        content_url = f"{CONTENT_API_BASE_URL}{link}"
-        print(f"Item {i + 1}/{len(results)}: Fetching content from {content_url}")
-        content_response = None  # Initialize to None for error handling avoid unbound local error, if get request fails
+def http2_available():
+    return importlib.util.find_spec("h2") is not None
+
+
+def build_async_client(**kwargs):
+    """One pooled client for every content request (HTTP/2 if h2 is installed)."""
+    return httpx.AsyncClient(
+        headers=HEADERS,
+        timeout=30,
+        http2=http2_available(),
+        limits=httpx.Limits(
+            max_connections=config.govuk_fetch_concurrency,
+            max_keepalive_connections=config.govuk_fetch_concurrency,
+        ),
+        **kwargs,
+    )
+
+
+class HostRateLimiter:
+    """Polite per-host request rate, shared by all concurrent fetches."""
+
+    def __init__(self, requests_per_second):
+        self.requests_per_second = requests_per_second
+        self._buckets = {}
+
+    async def wait(self, url):
+        host = httpx.URL(url).host
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(self.requests_per_second, capacity=1)
+            self._buckets[host] = bucket
+        await bucket.acquire(1)
+
+
+async def fetch_item_content(client, cache, limiter, item, index, total):
+    """Fetches one item's content, returning its data or its error record."""
+    link = item.get("link")
+    content_url = f"{CONTENT_API_BASE_URL}{link}"
+    print(f"Item {index}/{total}: Fetching content from {content_url}")
+    body = None
+    for attempt in range(1, FETCH_MAX_RETRIES + 2):
+        await limiter.wait(content_url)
         try:
-            # Add a small delay
-            time.sleep(DELAY_BETWEEN_REQUESTS)
-
-            content_response = httpx.get(content_url, headers=HEADERS, timeout=30)
-            content_response.raise_for_status()  # Check for HTTP errors for this specific item
-            content_data = content_response.json()
-
-            # Store the original link and the fetched content
-            all_grant_data.append(
-                {
-                    "link": link,
-                    "content_url": content_url,
-                    "content_data": content_data,  # This is the full JSON content for the item
-                }
-            )  # Append raw data first
-            # Optional: Print a snippet for progress indication
+            body = await cache.fetch(client, content_url)
+            content_data = json.loads(body)
             print(f"  -> Fetched title: {content_data.get('title', 'N/A')}")
-
+            return {
+                "link": link,
+                "content_url": content_url,
+                "content_data": content_data,  # This is the full JSON content for the item
+            }
         except httpx.HTTPStatusError as e:  # More specific exception for HTTP errors
+            if attempt <= FETCH_MAX_RETRIES and is_retryable(e):
+                await asyncio.sleep(
+                    retry_after_seconds(e) or backoff_delay(attempt, base=0.5)
+                )
+                continue
             # Handle specific content fetch errors (e.g., 404 Not Found) gracefully
             print(
-                f"  -> Error fetching content for {link}: {e.response.status_code} {e.response.reason}"
-            )
-            # Optionally store error information
-            all_grant_data.append(
-                {
-                    "link": link,
-                    "content_url": content_url,
-                    "error": f"HTTP Error: {e.response.status_code} {e.response.reason_phrase}",
-                }
+                f"  -> Error fetching content for {link}: {e.response.status_code} {e.response.reason_phrase}"
             )
+            return {
+                "link": link,
+                "content_url": content_url,
+                "error": f"HTTP Error: {e.response.status_code} {e.response.reason_phrase}",
+            }
         except httpx.RequestError as e:
+            if attempt <= FETCH_MAX_RETRIES:
+                await asyncio.sleep(backoff_delay(attempt, base=0.5))
+                continue
             print(f"  -> Network error fetching content for {link}: {e}")
-            all_grant_data.append(
-                {
-                    "link": link,
-                    "content_url": content_url,
-                    "error": f"Request Error: {e}",
-                }
-            )
+            return {
+                "link": link,
+                "content_url": content_url,
+                "error": f"Request Error: {e}",
+            }
         except json.JSONDecodeError as e:
             print(f"  -> Error decoding JSON content for {link}: {e}")
-            print(
-                f"     Response text: {content_response.text[:200]}..."
-            )  # Print beginning of response
-            all_grant_data.append(
-                {
-                    "link": link,
-                    "content_url": content_url,
-                    "error": f"JSON Decode Error: {e}",
-                }
-            )
+            print(f"     Response text: {body[:200]}...")  # Print beginning of response
+            return {
+                "link": link,
+                "content_url": content_url,
+                "error": f"JSON Decode Error: {e}",
+            }
+    return None  # Unreachable: the last attempt always returns
 
-    print("\n--- Fetching complete ---")
-    return all_grant_data
+
+def iter_previous_processed_docs():
+    """Streams the last run's processed documents."""
+    try:
+        yield from iter_jsonl(config.processed_grants_path)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Could not read previous processed documents: {e}")
 
 
-def fetch_and_convert_grant_data():
+def convert_fetched_item(item):
+    """Converts one fetched item to a processed document, or None on failure."""
+    if "error" in item:
+        print(f"- [FAILED] Fetch Error: {item['link']}, Error: {item['error']}")
+        return None
+    processed_result = convert_grant_data_to_metadata_and_markdown(item)
+    if processed_result is None:
+        print(f"- [ FAILED] Processing Error: {item['link']}")
+    return processed_result
+
+
+def reuse_previous_docs(current, keep, state, versions, complete):
+    """Streams the last run's documents for the grants in ``keep``, plus any
+    grants a partial crawl did not reach, carrying their versions over."""
+    for doc in iter_previous_processed_docs():
+        result = current.get(doc.get("metadata", {}).get("url"))
+        if result is None:
+            if not complete:
+                yield doc  # A grant the crawl did not reach is kept as it was
+        elif result["link"] in keep:
+            if result["link"] in state.versions:
+                versions[result["link"]] = state.versions[result["link"]]
+            yield doc
+
+
+async def fetch_grants(client, cache, limiter, to_fetch, versions, failed, cpu_pool):
+    """Fetches grants concurrently and converts them in ``cpu_pool``, yielding
+    each as it is ready.
+
+    Links that could not be fetched or converted are added to ``failed``.
     """
-    Fetches farming grant data from GOV.UK and converts it to Markdown format.
-    Returns a list of dictionaries with the original link and the converted Markdown content.
+    print(f"\nFetching content for {len(to_fetch)} items...")
+    # Links that are not GOV.UK paths have no content to fetch
+    fetchable = [result for result in to_fetch if result["link"].startswith("/")]
+    by_link = {result["link"]: result for result in fetchable}
+
+    async def fetch(numbered):
+        index, result = numbered
+        return await fetch_item_content(
+            client, cache, limiter, result, index, len(to_fetch)
+        )
+
+    fetched = map_unordered(
+        fetch, enumerate(fetchable, start=1), config.govuk_fetch_concurrency
+    )
+    async for item, doc, error in cpu_pool.map(convert_fetched_item, fetched):
+        if doc is None:
+            if error is not None:
+                print(f"- [ FAILED] Processing Error: {item['link']}: {error}")
+            failed.add(item["link"])
+            continue
+        versions[item["link"]] = result_version(by_link[item["link"]])
+        yield doc
+    print(
+        f"\nTotal items fetched: {len(fetchable)}\nFailed/Errored items: {len(failed)} items."
+    )
+
+
+async def refresh_grants(
+    client, cache, limiter, search_results, complete, versions, cpu_pool=None
+):
+    """Yields the processed document for every current grant.
+
+    Unchanged grants are streamed from the last run's file first; new and
+    updated ones are fetched concurrently and yielded as each is converted
+    (in ``cpu_pool``'s worker processes, if it has any).
+    ``versions`` is filled in with the crawl state to save once the stream
+    has been consumed. Grants no longer listed are left out, so ingestion
+    deletes their chunks.
     """
-    # 1. Fetch search results
-    search_results = fetch_farming_grant_content()
-
-    if search_results:
-        # 2. Fetch content for each item
-        print("\n--- Fetching content for each item ---")
-        print(f"\nFetching content for {len(search_results)} items...")
-        fetched_data = fetch_content_for_items(results=search_results)
-        processed_docs = []
-        successful_processing = 0
-        failed_fetches_or_conversions = 0
-
-        # Note: successful_fetches is initialized but not used below.
-        # 3. Convert fetched data to Markdown and save individual files
-        print("\n--- Converting content to Markdown ---")
-        print("\n--- Summary ---")
-        for item in fetched_data:
-            if "error" in item:
-                print(f"- [FAILED] Fetch Error: {item['link']}, Error: {item['error']}")
-                failed_fetches_or_conversions += 1
-                continue
+    state = CrawlState.load(config.govuk_crawl_state_path)
+    diff = state.diff(search_results, complete)
+    print(f"Crawl diff: {diff.summary()}")
+    for link in diff.removed:
+        print(f"- [REMOVED] {link} marked for deletion")
+
+    # Unchanged grants are refetched only if the last run has no document for them
+    previous_urls = {
+        doc.get("metadata", {}).get("url") for doc in iter_previous_processed_docs()
+    }
+    current = {f"{GOVUK_BASE_URL}{result['link']}": result for result in search_results}
+    unchanged = {
+        result["link"]
+        for result in diff.unchanged
+        if f"{GOVUK_BASE_URL}{result['link']}" in previous_urls
+    }
+    to_fetch = [result for result in search_results if result["link"] not in unchanged]
+
+    if not complete:
+        versions.update(state.versions)
+    for link in diff.removed:
+        versions.pop(link, None)
+    for doc in reuse_previous_docs(current, unchanged, state, versions, complete):
+        yield doc
+
+    failed = set()
+    async for doc in fetch_grants(
+        client,
+        cache,
+        limiter,
+        to_fetch,
+        versions,
+        failed,
+        cpu_pool or CpuPool(workers=0),
+    ):
+        yield doc
+    # Failed fetches keep the previous document and version, so they are
+    # retried on the next run
+    if failed:
+        for doc in reuse_previous_docs(current, failed, state, versions, True):
+            yield doc
+
+
+async def ingest_grants(processed_docs, cpu_pool):
+    # Imported here so fetching alone does not load the vector store
+    from app.core.rag.ingest_markdown_docs import ingest_records
+    from app.core.rag.vector_store import get_embedding_model, get_vector_store
+
+    vector_store = get_vector_store()
+    if vector_store is None:
+        print("Error: Grants vector store is not initialized; saving only.")
+        async for _ in processed_docs:
+            pass
+        return
+    await ingest_records(processed_docs, vector_store, get_embedding_model(), cpu_pool)
+
+
+def fetch_and_convert_grant_data(ingest=False):
+    """
+    Fetches farming grant data from GOV.UK, converts it to Markdown format and
+    streams it to the processed grants JSONL file. Only new or updated grants
+    are downloaded; the rest come from the last run.
 
-            processed_result = convert_grant_data_to_metadata_and_markdown(item)
-            if processed_result:
-                processed_docs.append(processed_result)
-                successful_processing += 1
-            elif "error" in item:
-                print(f"- [ FAILED] Link: {item['link']}, Error: {item['error']}")
-                failed_fetches_or_conversions += 1
-            else:
-                print(f"- [ FAILED] Processing Error: {item['link']}")
-                failed_fetches_or_conversions += 1
+    With ``ingest``, each grant also flows straight on to split, embed and
+    upsert, so the first chunks are stored while the crawl is still running.
+    Returns the number of documents saved, or None on failure.
+    """
+    print("--- Starting GOV.UK Farming Grant Fetcher ---")
 
-        print(
-            f"\nTotal items processed: {len(fetched_data)}\nSuccessfully saved content for: {successful_processing} items\nFailed/Errored items: {failed_fetches_or_conversions} items."
-        )
-        return save_markdown_in_json_file(processed_docs)
-    return None
+    async def run():
+        cache = HttpCache(config.govuk_http_cache_path)
+        limiter = HostRateLimiter(config.govuk_requests_per_second)
+        async with build_async_client() as client:
+            crawl = await search_all_grants(client, limiter)
+            if crawl is None or not crawl[0]:
+                # An empty crawl would otherwise delete every grant
+                print("No results found matching the criteria.")
+                return None
+            versions = {}
+            with (
+                CpuPool() as cpu_pool,
+                JsonlWriter(config.processed_grants_path) as writer,
+            ):
+                docs = save_processed_docs(
+                    refresh_grants(client, cache, limiter, *crawl, versions, cpu_pool),
+                    writer,
+                )
+                if ingest:
+                    await ingest_grants(docs, cpu_pool)
+                else:
+                    async for _ in docs:
+                        pass
+            print(f"\nSaved {writer.count} processed documents to {writer.path}")
+            print(f"HTTP cache: {cache.hits} not modified, {cache.misses} downloaded")
+            if writer.count:
+                CrawlState(versions).save(config.govuk_crawl_state_path)
+            return writer.count
+
+    start = time.perf_counter()
+    saved = asyncio.run(run())
+    print(f"\n--- Fetching complete in {time.perf_counter() - start:.1f}s ---")
+    return saved
 
 
 # running the file
-fetch_and_convert_grant_data()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download GOV.UK farming grants")
+    parser.add_argument(
+        "--ingest",
+        action="store_true",
+        help="Embed and store each grant in the vector store as it is fetched",
+    )
+    fetch_and_convert_grant_data(ingest=parser.parse_args().ingest)
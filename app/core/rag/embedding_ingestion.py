@@ -0,0 +1,57 @@
+import asyncio
+import functools
+
+import tiktoken
+
+from app.common.rate_limit import (
+    backoff_delay,
+    is_retryable,
+    retry_after_seconds,
+    status_code,
+)
+
+# Tokenizer used by text-embedding-3 models, to charge the TPM limiter
+EMBEDDING_ENCODING = "cl100k_base"
+
+
+@functools.cache
+def _encoding():
+    return tiktoken.get_encoding(EMBEDDING_ENCODING)
+
+
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode(text))
+
+
+def token_offsets(text: str) -> list[int]:
+    """The character offset at which each token of ``text`` starts."""
+    encoding = _encoding()
+    return encoding.decode_with_offsets(encoding.encode(text))[1]
+
+
+async def embed_batch(embedding_model, limiter, texts, tokens, max_retries, report):
+    """Embeds one batch under the rate limiter, retrying retryable errors.
+
+    A 429 with ``Retry-After`` pauses every batch for that long, not just this
+    one; each retry also waits a jittered exponential backoff so the batches
+    do not all resume at the same moment.
+    """
+    attempt = 0
+    while True:
+        await limiter.acquire(tokens)
+        try:
+            return await embedding_model.aembed_documents(texts)
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries or not is_retryable(e):
+                raise
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None and status_code(e) == 429:
+                limiter.pause(retry_after)
+            delay = (retry_after or 0.0) + backoff_delay(attempt)
+            report.retries += 1
+            print(
+                f"Embedding batch failed ({e.__class__.__name__}: {e}). "
+                f"Retrying in {delay:.1f}s (attempt {attempt}/{max_retries})"
+            )
+            await asyncio.sleep(delay)
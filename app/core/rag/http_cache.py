@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+import httpx
+
+
+class HttpCache:
+    """On-disk cache of GET responses, revalidated with conditional requests.
+
+    One JSON file per URL holds the body and its ``ETag`` / ``Last-Modified``
+    validators. Callers send ``conditional_headers(url)`` with the request and
+    use the cached body when the server answers 304 Not Modified.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    def get(self, url: str) -> Optional[dict]:
+        try:
+            with open(self._path(url), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def conditional_headers(self, url: str) -> dict[str, str]:
+        entry = self.get(url)
+        if entry is None:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url: str, response: httpx.Response):
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if not etag and not last_modified:
+            return  # Nothing to revalidate with next time
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": response.text,
+        }
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(f"{path}.tmp", path)
+
+    async def fetch(self, client: httpx.AsyncClient, url: str) -> str:
+        """GETs ``url`` conditionally and returns the body to use.
+
+        A 304 is answered from the cache; error statuses are raised as
+        ``httpx.HTTPStatusError``.
+        """
+        response = await client.get(url, headers=self.conditional_headers(url))
+        if response.status_code == 304:
+            entry = self.get(url)
+            if entry is not None:
+                self.hits += 1
+                return entry["body"]
+            # Cache entry vanished between the request and now; fetch again
+            response = await client.get(url)
+        response.raise_for_status()
+        self.misses += 1
+        self.put(url, response)
+        return response.text
@@ -0,0 +1,49 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+from typing import Optional
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(url: str, position: int, content: str) -> str:
+    """Deterministic ID from the source URL, the chunk's position within that
+    document and its content, so an unchanged chunk keeps its ID across runs."""
+    return f"{_sha256(url)[:16]}-{position}-{_sha256(content)[:16]}"
+
+
+def assign_chunk_ids(doc_splits):
+    """Sets ``doc.id`` on each chunk, numbering chunks per source URL."""
+    positions = defaultdict(int)
+    for doc in doc_splits:
+        url = doc.metadata.get("url", "")
+        doc.id = chunk_id(url, positions[url], doc.page_content)
+        positions[url] += 1
+    return doc_splits
+
+
+class IndexManifest:
+    """Which chunk IDs are indexed for each source URL, saved as JSON next to
+    the vector store after every successful ingestion, with the embedding
+    model (and dimensions) their vectors came from."""
+
+    def __init__(self, chunks: dict[str, list[str]], embedding: Optional[str] = None):
+        self.chunks = chunks
+        self.embedding = embedding
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IndexManifest"]:
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["chunks"], data.get("embedding"))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"chunks": self.chunks, "embedding": self.embedding}, f)
+        os.replace(f"{path}.tmp", path)
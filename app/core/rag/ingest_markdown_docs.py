@@ -1,81 +1,135 @@
-import json
-import time
+import asyncio
+import os
 
 from langchain.schema.document import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from app.config import config
+from app.core.rag.cpu_pool import CpuPool
+from app.core.rag.domain_centroid import CentroidSum
+from app.core.rag.jsonl import iter_jsonl
+from app.core.rag.lexical_index import BM25Writer
+from app.core.rag.markdown_chunker import MarkdownChunker
+from app.core.rag.pipeline import PipelineReport, ingest_stream
+
 # Import the pre-configured vector store and its path from vector_store.py
-from app.core.rag.vector_store import GRANTS_VECTORSTORE_PATH, vector_store_grants
+from app.core.rag.vector_store import (
+    DOMAIN_CENTROID_PATH,
+    GRANTS_VECTORSTORE_PATH,
+    LEXICAL_INDEX_PATH,
+    MANIFEST_PATH,
+    embedding_cache_model_name,
+    get_embedding_model,
+    get_vector_store,
+    save_domain_centroid,
+    write_index_version,
+)
 
 # --- Configuration ---
-PROCESSED_JSON_PATH = "farming_grants_processed.json"  # Path to the JSON file from data_ingest_via_search_apiv2.py
 CHUNK_SIZE = 1000  # Adjust based on your LLM's context window and typical grant length
 CHUNK_OVERLAP = 200  # Adjust overlap based on chunk size
 # Ensure OPENAI_API_KEY is set as an environment variable
 
+_text_splitter = None
+
 
 # --- Main Logic ---
-def load_processed_data(json_path):
-    """Loads the processed data (markdown + metadata) from the JSON file."""
+def load_processed_data(jsonl_path):
+    """Yields the processed grants (markdown + metadata) from the JSONL file,
+    one record at a time."""
     try:
-        with open(json_path, encoding="utf-8") as f:
-            data = json.load(f)
-        print(f"Loaded {len(data)} documents from {json_path}")
-        return data
+        count = 0
+        for record in iter_jsonl(jsonl_path):
+            count += 1
+            yield record
+        print(f"Loaded {count} documents from {jsonl_path}")
     except FileNotFoundError:
-        print(f"Error: Processed data file not found at {json_path}")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from {json_path}: {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred loading {json_path}: {e}")
-        return []
-
-
-def create_langchain_documents(processed_data):
-    """Converts processed data dictionaries into LangChain Document objects."""
-    documents = []
-    for item in processed_data:
-        if "markdown_content" in item and "metadata" in item:
-            # Ensure metadata values are strings or basic types suitable for vector stores
-            metadata = {
-                k: str(v) if v is not None else "" for k, v in item["metadata"].items()
-            }
-            doc = Document(page_content=item["markdown_content"], metadata=metadata)
-            documents.append(doc)
+        print(f"Error: Processed data file not found at {jsonl_path}")
+
+
+def record_to_document(item):
+    """Converts one processed grant into a LangChain Document, or None if it
+    has no content."""
+    if "markdown_content" not in item or "metadata" not in item:
+        print(
+            f"Skipping item due to missing 'markdown_content' or 'metadata': {item.get('metadata', {}).get('url', 'N/A')}"
+        )
+        return None
+    # Ensure metadata values are strings or basic types suitable for vector stores
+    metadata = {k: str(v) if v is not None else "" for k, v in item["metadata"].items()}
+    return Document(page_content=item["markdown_content"], metadata=metadata)
+
+
+def get_text_splitter():
+    global _text_splitter
+    if _text_splitter is None:
+        if config.chunker == "markdown":
+            _text_splitter = MarkdownChunker(
+                chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+            )
         else:
-            print(
-                f"Skipping item due to missing 'markdown_content' or 'metadata': {item.get('metadata', {}).get('url', 'N/A')}"
+            # Using RecursiveCharacterTextSplitter suitable for Markdown
+            _text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+                chunk_size=CHUNK_SIZE,
+                chunk_overlap=CHUNK_OVERLAP,
+                # separators=["\n\n", "\n", " ", ""] # Default separators often work well
             )
-    print(f"Created {len(documents)} LangChain Document objects.")
-    return documents
-
-
-def split_documents(documents):
-    """Splits LangChain Documents into smaller chunks."""
-    if not documents:
-        return []
-    print(
-        f"Splitting {len(documents)} documents into chunks (size={CHUNK_SIZE}, overlap={CHUNK_OVERLAP})..."
-    )
-    # Using RecursiveCharacterTextSplitter suitable for Markdown
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        # separators=["\n\n", "\n", " ", ""] # Default separators often work well
-    )
-    doc_splits = text_splitter.split_documents(documents)
-    print(f"Created {len(doc_splits)} document chunks.")
-    return doc_splits
-
-
-def ingest_to_vectorstore(doc_splits, batch_size=50, max_retries=3, backoff=60):
-    """Adds document splits to the pre-configured grants vector store with retry logic."""
-    if not doc_splits:
-        print("No document splits to ingest.")
-        return
-
+    return _text_splitter
+
+
+def split_record(record):
+    """Splits one processed grant into chunks (none if it has no content)."""
+    doc = record_to_document(record)
+    return get_text_splitter().split_documents([doc]) if doc is not None else []
+
+
+async def ingest_records(
+    records, vector_store, embedding_model, cpu_pool=None
+) -> PipelineReport:
+    """Streams processed grants into the vector store, re-indexing only chunks
+    that changed, and writes the BM25 index over the same chunks and the
+    domain centroid from their embeddings as they pass.
+    """
+    # BM25 side of hybrid retrieval, kept only if the index changed or is missing
+    lexical_writer = BM25Writer(LEXICAL_INDEX_PATH)
+    # Updated with the vectors stored and deleted, for the query router
+    centroid_sum = CentroidSum.load(DOMAIN_CENTROID_PATH)
+    try:
+        report = await ingest_stream(
+            records,
+            split_record,
+            vector_store,
+            embedding_model,
+            MANIFEST_PATH,
+            embedding_cache_model_name(),
+            cpu_pool,
+            lexical_writer,
+            centroid_sum,
+        )
+    except BaseException:
+        lexical_writer.discard()
+        raise
+    print(report.summary())
+    if report.changed or not os.path.exists(LEXICAL_INDEX_PATH):
+        lexical_writer.commit()
+    else:
+        lexical_writer.discard()
+    if not report.changed:
+        print("Vector store is already up to date.")
+        return report
+    print("Ingestion complete. Vector store updated (auto-persisted)")
+    save_domain_centroid(vector_store, centroid_sum)
+    write_index_version()
+    return report
+
+
+def ingest_to_vectorstore(records, cpu_pool=None):
+    """Incrementally re-indexes the grants vector store from processed grants.
+
+    ``records`` must hold every current grant; grants missing from it have
+    their chunks deleted.
+    """
+    vector_store_grants = get_vector_store()
     if vector_store_grants is None:
         print(
             "Error: Grants vector store is not initialized. "
@@ -84,48 +138,29 @@ def ingest_to_vectorstore(doc_splits, batch_size=50, max_retries=3, backoff=60):
         )
         return
 
-    print(
-        f"Using pre-configured Chroma vector store for grants at {GRANTS_VECTORSTORE_PATH}."
-    )
+    print(f"Using pre-configured vector store for grants at {GRANTS_VECTORSTORE_PATH}.")
 
-    print(f"Adding {len(doc_splits)} document chunks to the vector store...")
     try:
-        for i in range(0, len(doc_splits), batch_size):
-            batch = doc_splits[i : i + batch_size]
-            retries = 0
-            while retries <= max_retries:
-                try:
-                    vector_store_grants.add_documents(batch)
-                    print(
-                        f"Added batch {i // batch_size + 1} /{-(-len(doc_splits) // batch_size)} to vector store."
-                    )
-                    break  # Exit retry loop if successful
-                except Exception as e:
-                    if "429" in str(e):
-                        retries += 1
-                        print(
-                            f"Rate limit hit. Retrying batch {i // batch_size + 1} in {backoff} seconds... (Attempt {retries}/{max_retries})"
-                        )
-                        time.sleep(backoff)
-                        backoff *= 2  # Exponential backoff
-                    else:
-                        raise e
-            else:
-                print(
-                    f"Failed to add batch {i // batch_size + 1} after {max_retries} retries. Skipping..."
-                )
-        print("Ingestion complete. Documents added to vector store (auto-persisted)")
+        asyncio.run(
+            ingest_records(
+                records, vector_store_grants, get_embedding_model(), cpu_pool
+            )
+        )
     except Exception as e:
         print(f"An error occurred during vector store ingestion: {e}")
 
 
 def load_to_vectorstore():
     print("--- Starting Markdown Grant Ingestion Process ---")
-    processed_data = load_processed_data(PROCESSED_JSON_PATH)
-    langchain_docs = create_langchain_documents(processed_data)
-    doc_splits = split_documents(langchain_docs)
-    ingest_to_vectorstore(doc_splits)
+    path = config.processed_grants_path
+    if not os.path.exists(path):
+        # An empty stream would delete every indexed grant
+        print(f"Error: Processed data file not found at {path}")
+        return
+    with CpuPool() as cpu_pool:
+        ingest_to_vectorstore(load_processed_data(path), cpu_pool)
     print("--- Ingestion Process Finished ---")
 
 
-load_to_vectorstore()
+if __name__ == "__main__":
+    load_to_vectorstore()
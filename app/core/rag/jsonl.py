@@ -0,0 +1,69 @@
+import io
+import json
+import os
+from collections.abc import Iterable, Iterator
+
+
+def _open(path: str, mode: str):
+    """Opens a text stream, zstd-compressed when the path ends in ``.zst``.
+
+    zstandard is installed with pymongo's zstd extra; it is only imported
+    when a compressed file is used.
+    """
+    if not path.endswith(".zst"):
+        return open(path, mode, encoding="utf-8")  # noqa: SIM115
+    import zstandard
+
+    raw = open(path, f"{mode}b")  # noqa: SIM115
+    if mode == "r":
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    else:
+        stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def iter_jsonl(path: str) -> Iterator[dict]:
+    """Yields one record per line, without reading the whole file."""
+    with _open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class JsonlWriter:
+    """Writes records one per line to ``<path>.tmp`` and renames it over
+    ``path`` on a clean exit, so readers never see a half-written file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def _tmp_path(self):
+        # Keep the compression suffix, which selects the stream type
+        root, ext = os.path.splitext(self.path)
+        return f"{root}.tmp{ext}"
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = _open(self._tmp_path(), "w")
+        return self
+
+    def write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False))
+        self._file.write("\n")
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is None:
+            os.replace(self._tmp_path(), self.path)
+        else:
+            os.remove(self._tmp_path())
+
+
+def write_jsonl(path: str, records: Iterable[dict]) -> int:
+    with JsonlWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.count
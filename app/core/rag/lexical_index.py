@@ -0,0 +1,152 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from logging import getLogger
+
+from langchain_core.documents import Document
+
+logger = getLogger(__name__)
+
+# Thousands separators are dropped first so "£5,000" and "5000" match
+_DIGIT_GROUPING = re.compile(r"(?<=\d),(?=\d)")
+# Keeps scheme and item codes such as "CSHT", "FG1" or "AHW-2" as single terms
+_TOKEN = re.compile(r"\w+(?:[-./]\w+)*")
+_STOP_WORDS = frozenset(
+    [
+        "a",
+        "an",
+        "and",
+        "are",
+        "as",
+        "at",
+        "be",
+        "by",
+        "can",
+        "do",
+        "for",
+        "from",
+        "how",
+        "i",
+        "in",
+        "is",
+        "it",
+        "of",
+        "on",
+        "or",
+        "that",
+        "the",
+        "this",
+        "to",
+        "was",
+        "what",
+        "when",
+        "where",
+        "which",
+        "who",
+        "will",
+        "with",
+        "you",
+    ]
+)
+
+
+def tokenize(text: str) -> list[str]:
+    text = _DIGIT_GROUPING.sub("", text.casefold())
+    return [token for token in _TOKEN.findall(text) if token not in _STOP_WORDS]
+
+
+class BM25Index:
+    """In-memory Okapi BM25 inverted index over the ingested chunks.
+
+    Each posting stores its precomputed BM25 weight, so a search is a sum over
+    the postings of the query terms with no per-query length normalisation.
+    The index is saved as JSON next to the Chroma store by ingestion and
+    loaded once at startup.
+    """
+
+    def __init__(self, documents: list[Document], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, list[tuple[int, float]]] = {}
+        self._build()
+
+    def _build(self):
+        term_counts = [Counter(tokenize(doc.page_content)) for doc in self.documents]
+        lengths = [sum(counts.values()) for counts in term_counts]
+        average_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+        frequencies: dict[str, list[tuple[int, int]]] = {}
+        for doc_index, counts in enumerate(term_counts):
+            for term, count in counts.items():
+                frequencies.setdefault(term, []).append((doc_index, count))
+
+        total = len(self.documents)
+        for term, postings in frequencies.items():
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            weighted = []
+            for doc_index, count in postings:
+                norm = 1 - self.b + self.b * lengths[doc_index] / average_length
+                weight = idf * count * (self.k1 + 1) / (count + self.k1 * norm)
+                weighted.append((doc_index, weight))
+            self.postings[term] = weighted
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search(self, query: str, k: int = 4) -> list[tuple[Document, float]]:
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            for doc_index, weight in self.postings.get(term, ()):
+                scores[doc_index] = scores.get(doc_index, 0.0) + weight
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.documents[doc_index], score) for doc_index, score in best]
+
+    def save(self, path: str):
+        writer = BM25Writer(path, self.k1, self.b)
+        writer.add(self.documents)
+        writer.commit()
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            # Indexes saved as a single JSON object list their documents in it
+            documents = [Document(**doc) for doc in header.get("documents", ())]
+            documents.extend(Document(**json.loads(line)) for line in f)
+        return cls(documents, k1=header["k1"], b=header["b"])
+
+
+class BM25Writer:
+    """Writes the documents of a BM25 index to disk as they arrive.
+
+    The file is a JSON header line with the BM25 parameters followed by one
+    JSON line per document, so ingestion can stream chunks into it without
+    holding the corpus in memory. It is written to a temporary file that
+    ``commit()`` moves over ``path`` and ``discard()`` removes.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.count = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(f"{path}.tmp", "w", encoding="utf-8")  # noqa: SIM115
+        self._file.write(json.dumps({"k1": k1, "b": b}) + "\n")
+
+    def add(self, documents):
+        for doc in documents:
+            line = {"page_content": doc.page_content, "metadata": doc.metadata}
+            self._file.write(json.dumps(line) + "\n")
+            self.count += 1
+
+    def commit(self):
+        self._file.close()
+        os.replace(f"{self.path}.tmp", self.path)
+        logger.info("Saved BM25 index of %d chunks to %s", self.count, self.path)
+
+    def discard(self):
+        self._file.close()
+        os.remove(f"{self.path}.tmp")
@@ -0,0 +1,192 @@
+import re
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+
+from langchain_core.documents import Document
+
+from app.core.rag.embedding_ingestion import count_tokens, token_offsets
+
+HEADER_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+SECTION_SEPARATOR = " > "
+
+
+class Block:
+    """A header line or paragraph: ``text[start:end]`` under ``path``."""
+
+    def __init__(self, start: int, end: int, path: tuple[str, ...], header: bool):
+        self.start = start
+        self.end = end
+        self.path = path
+        self.header = header
+
+
+def parse_blocks(text: str) -> list[Block]:
+    """Splits Markdown into header lines and paragraphs, each tagged with
+    the path of headers it sits under. Blank lines and ``#`` lines inside
+    fenced code do not start a new block."""
+    blocks = []
+    path: list[tuple[int, str]] = []
+    start = last_end = None
+    fenced = False
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        end = offset + len(line.rstrip("\r\n"))
+        if FENCE_RE.match(line):
+            fenced = not fenced
+        header = None if fenced else HEADER_RE.match(line)
+        if header or (not line.strip() and not fenced):
+            if start is not None:
+                blocks.append(Block(start, last_end, _titles(path), False))
+                start = None
+            if header:
+                level = len(header.group(1))
+                path = [p for p in path if p[0] < level] + [(level, header.group(2))]
+                blocks.append(Block(offset, end, _titles(path), True))
+        else:
+            if start is None:
+                start = offset
+            last_end = end
+        offset += len(line)
+    if start is not None:
+        blocks.append(Block(start, last_end, _titles(path), False))
+    return blocks
+
+
+def _titles(path):
+    return tuple(title for _, title in path)
+
+
+def _common_path(blocks: list[Block]) -> tuple[str, ...]:
+    path = blocks[0].path
+    for block in blocks[1:]:
+        size = 0
+        while size < min(len(path), len(block.path)) and (
+            path[size] == block.path[size]
+        ):
+            size += 1
+        path = path[:size]
+    return path
+
+
+class MarkdownChunker:
+    """Single-pass, structure-aware splitter for the grant Markdown.
+
+    Each document is tokenised once; token counts for any span then come
+    from the token start offsets. Chunks break at headers first, so a
+    section is only split if it does not fit in ``chunk_size`` tokens on its
+    own, and then at paragraphs and lines, with ``chunk_overlap`` tokens of
+    trailing paragraphs repeated. Consecutive sections that fit whole share
+    a chunk.
+
+    Span counts are approximate: a BPE token that straddles a span edge is
+    counted on one side only, so a chunk can come out a token or two over
+    ``chunk_size``, far inside the embedding model's input limit. Each
+    final chunk is encoded once more for its ``token_count`` metadata,
+    which is exact, alongside ``section`` (the header path it sits under).
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        offsets: Callable[[str], list[int]] = token_offsets,
+        count: Callable[[str], int] = count_tokens,
+    ):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.offsets = offsets
+        self.count = count
+
+    def split_text(self, text: str) -> list[tuple[str, tuple[str, ...], int]]:
+        """Returns ``(chunk, section path, token count)`` for each chunk,
+        each chunk's count taken from encoding it on its own."""
+        starts = self.offsets(text)
+
+        def tokens(start, end):
+            return bisect_left(starts, end) - bisect_left(starts, start)
+
+        chunks = []
+        current: list[Block] = []
+
+        def flush():
+            if current:
+                chunk = text[current[0].start : current[-1].end]
+                chunks.append((chunk, _common_path(current), self.count(chunk)))
+
+        for section in self._sections(parse_blocks(text)):
+            joined = current + section
+            if tokens(joined[0].start, joined[-1].end) <= self.chunk_size:
+                current = joined
+                continue
+            if tokens(section[0].start, section[-1].end) <= self.chunk_size:
+                # A section that fits in a chunk of its own is never split
+                flush()
+                current = section
+                continue
+            # An oversized section starts in the space left after the
+            # sections before it
+            for block in self._fitting_blocks(section, text, starts, tokens):
+                if current and tokens(current[0].start, block.end) > self.chunk_size:
+                    flush()
+                    current = self._overlap(current, block, tokens)
+                current.append(block)
+            # The tail of a split section is not merged with the next one
+            flush()
+            current = []
+        flush()
+        return chunks
+
+    @staticmethod
+    def _sections(blocks: list[Block]) -> Iterable[list[Block]]:
+        section: list[Block] = []
+        for block in blocks:
+            if block.header and section:
+                yield section
+                section = []
+            section.append(block)
+        if section:
+            yield section
+
+    def _fitting_blocks(self, section, text, starts, tokens):
+        """Blocks of an oversized section, with any paragraph that is too long
+        on its own cut at line breaks, or failing that at token boundaries."""
+        for block in section:
+            if tokens(block.start, block.end) <= self.chunk_size:
+                yield block
+                continue
+            pieces = []
+            offset = block.start
+            for line in text[block.start : block.end].splitlines(keepends=True):
+                pieces.append((offset, offset + len(line.rstrip("\r\n"))))
+                offset += len(line)
+            for start, end in pieces:
+                first = bisect_left(starts, start)
+                last = bisect_left(starts, end)
+                step = self.chunk_size
+                cuts = [start, *starts[first + step : last : step], end]
+                for piece_start, piece_end in zip(cuts, cuts[1:]):
+                    yield Block(piece_start, piece_end, block.path, False)
+
+    def _overlap(self, previous, block, tokens):
+        """Trailing blocks of the last chunk to repeat before ``block``."""
+        overlap = []
+        for candidate in reversed(previous):
+            if candidate.path != block.path:
+                break
+            if tokens(candidate.start, previous[-1].end) > self.chunk_overlap:
+                break
+            if tokens(candidate.start, block.end) > self.chunk_size:
+                break
+            overlap.insert(0, candidate)
+        return overlap
+
+    def split_documents(self, documents: Iterable[Document]) -> list[Document]:
+        chunks = []
+        for doc in documents:
+            for text, path, count in self.split_text(doc.page_content):
+                metadata = dict(doc.metadata)
+                metadata["section"] = SECTION_SEPARATOR.join(path)
+                metadata["token_count"] = count
+                chunks.append(Document(page_content=text, metadata=metadata))
+        return chunks
@@ -0,0 +1,419 @@
+import json
+import os
+import uuid
+from collections.abc import Iterable
+from logging import getLogger
+from typing import Any, Literal, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+logger = getLogger(__name__)
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.json"
+# Compact copies used for the first search pass, e.g. vectors.int8.npy
+COMPACT_FILE = "vectors.{}.npy"
+SCALES_FILE = "scales.npy"
+# Rows converted to float32 at a time when scoring the compact matrix
+SCORE_BLOCK_ROWS = 4096
+
+
+def _normalise_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantise(matrix, quantisation):
+    """Returns the compact matrix and, for int8, the per-row scale factors."""
+    if quantisation == "float16":
+        return np.asarray(matrix, dtype=np.float16), None
+    # Symmetric int8 per row: each row's largest component maps to 127
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    compact = np.rint(matrix / scales[:, None]).astype(np.int8)
+    return compact, scales.astype(np.float32)
+
+
+def _append_rows(buffer, current, rows):
+    """``current`` with ``rows`` appended, as a view of ``buffer``.
+
+    ``current`` is expected to be the leading rows of ``buffer``; the rows
+    are written after them in place, and only when ``buffer`` is full (or is
+    not one ``current`` came from) is a new one allocated, at double the
+    size, so a run of appends costs amortised O(rows added).
+    """
+    used, needed = len(current), len(current) + len(rows)
+    if buffer is None or current.base is not buffer:
+        # Loaded, deleted from or cleared since the last append
+        buffer = current
+    if (
+        len(buffer) < needed
+        or not buffer.flags.writeable
+        or buffer.shape[1:] != rows.shape[1:]
+    ):
+        grown = np.empty((max(needed, 2 * used), *rows.shape[1:]), dtype=rows.dtype)
+        if used:
+            grown[:used] = current
+        buffer = grown
+    buffer[used:needed] = rows
+    return buffer, buffer[:needed]
+
+
+def approximate_scores(compact, scales, query):
+    """Dot products against the compact matrix, a block of rows at a time, so
+    no full-size float32 copy is ever made."""
+    scores = np.empty(len(compact), dtype=np.float32)
+    for start in range(0, len(compact), SCORE_BLOCK_ROWS):
+        block = compact[start : start + SCORE_BLOCK_ROWS].astype(np.float32)
+        scores[start : start + len(block)] = block @ query
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+class NumpyVectorStore(VectorStore):
+    """Brute-force vector store: a normalised float32 matrix and a JSON sidecar.
+
+    Search is one matrix-vector product plus ``argpartition``, which for a few
+    thousand chunks is faster than an HNSW index and its SQLite lookups. The
+    matrix is memory-mapped read-only on load, so worker processes share the
+    page cache. Scores are squared Euclidean distances between the normalised
+    vectors, as in Chroma's default space, so relevance scores (and the
+    relevance gate thresholds) are the same with either backend.
+    ``add_texts`` only updates memory; call ``persist()`` to write the files.
+
+    With ``quantisation`` set to "float16" or "int8", a compact copy of the
+    matrix is held in memory for a first pass over every row; the best
+    ``rescore_candidates`` rows are then rescored against the full-precision
+    matrix, of which only those rows are paged in from the memory map.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        path: Optional[str] = None,
+        quantisation: Literal["none", "float16", "int8"] = "none",
+        rescore_candidates: int = 40,
+    ):
+        self._embedding = embedding
+        self.path = path
+        self.quantisation = quantisation
+        self.rescore_candidates = rescore_candidates
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._compact = None
+        self._scales = None
+        # Arrays that _matrix, _compact and _scales are views of, with room
+        # to append further rows
+        self._buffers: dict[str, np.ndarray] = {}
+        self._ids: list[str] = []
+        # Row of each ID in the matrix
+        self._positions: dict[str, int] = {}
+        self._texts: list[str] = []
+        self._metadatas: list[dict] = []
+        if path and os.path.exists(os.path.join(path, VECTORS_FILE)):
+            self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _load(self):
+        self._matrix = np.load(os.path.join(self.path, VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(self.path, METADATA_FILE), encoding="utf-8") as f:
+            sidecar = json.load(f)
+        self._ids = sidecar["ids"]
+        self._positions = {id_: row for row, id_ in enumerate(self._ids)}
+        self._texts = sidecar["documents"]
+        self._metadatas = sidecar["metadatas"]
+        if self.quantisation != "none":
+            self._load_compact()
+
+    def _load_compact(self):
+        compact_path = os.path.join(self.path, COMPACT_FILE.format(self.quantisation))
+        scales_path = os.path.join(self.path, SCALES_FILE)
+        if os.path.exists(compact_path):
+            self._compact = np.load(compact_path)
+            if self.quantisation == "int8":
+                self._scales = np.load(scales_path)
+        if self._compact is None or len(self._compact) != len(self._matrix):
+            # Missing or stale (the matrix was rewritten under another setting)
+            self._compact, self._scales = quantise(self._matrix, self.quantisation)
+
+    def memory_per_chunk(self) -> int:
+        """Bytes held in memory per chunk for the first search pass."""
+        if not len(self):
+            return 0
+        if self._compact is None:
+            return self._matrix.itemsize * self._matrix.shape[1]
+        scale_bytes = self._scales.itemsize if self._scales is not None else 0
+        return self._compact.itemsize * self._compact.shape[1] + scale_bytes
+
+    def _save_array(self, name, array):
+        # Written to a temporary file and renamed, so a matrix that is
+        # currently memory-mapped (here or in another worker) is never truncated
+        path = os.path.join(self.path, name)
+        with open(f"{path}.tmp", "wb") as f:
+            np.save(f, np.asarray(array))
+        os.replace(f"{path}.tmp", path)
+
+    def persist(self):
+        os.makedirs(self.path, exist_ok=True)
+        if self._compact is not None:
+            self._save_array(COMPACT_FILE.format(self.quantisation), self._compact)
+            if self._scales is not None:
+                self._save_array(SCALES_FILE, self._scales)
+        self._save_array(VECTORS_FILE, self._matrix)
+        metadata_path = os.path.join(self.path, METADATA_FILE)
+        with open(f"{metadata_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.get(), f)
+        os.replace(f"{metadata_path}.tmp", metadata_path)
+        logger.info("Saved %d vectors to %s", len(self), self.path)
+
+    def add_vectors(self, vectors, texts, metadatas=None, ids=None) -> list[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        # Upsert, as Chroma does: re-adding an ID replaces the stored chunk
+        replaced = [id_ for id_ in ids if id_ in self._positions]
+        if replaced:
+            self.delete(replaced)
+        rows = _normalise_rows(vectors)
+        self._matrix = self._append("vectors", self._matrix, rows)
+        if self.quantisation != "none":
+            compact, scales = quantise(rows, self.quantisation)
+            if self._compact is None:
+                self._compact, self._scales = compact, scales
+            else:
+                self._compact = self._append("compact", self._compact, compact)
+                if scales is not None:
+                    self._scales = self._append("scales", self._scales, scales)
+        for row, id_ in enumerate(ids, start=len(self._ids)):
+            self._positions[id_] = row
+        self._ids.extend(ids)
+        self._texts.extend(texts)
+        self._metadatas.extend(metadatas)
+        return ids
+
+    def _append(self, name, current, rows):
+        self._buffers[name], current = _append_rows(
+            self._buffers.get(name), current, rows
+        )
+        return current
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        **kwargs: Any,  # noqa: ARG002
+    ) -> list[str]:
+        texts = list(texts)
+        return self.add_vectors(
+            self._embedding.embed_documents(texts), texts, metadatas, ids
+        )
+
+    async def aadd_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        **kwargs: Any,  # noqa: ARG002
+    ) -> list[str]:
+        texts = list(texts)
+        return self.add_vectors(
+            await self._embedding.aembed_documents(texts), texts, metadatas, ids
+        )
+
+    def delete(self, ids: Optional[list[str]] = None, **kwargs: Any) -> bool:  # noqa: ARG002
+        if not ids:
+            return False
+        removed = set(ids)
+        keep = np.array([id_ not in removed for id_ in self._ids], dtype=bool)
+        self._matrix = np.asarray(self._matrix)[keep]
+        if self._compact is not None:
+            self._compact = self._compact[keep]
+            if self._scales is not None:
+                self._scales = self._scales[keep]
+        self._ids = [id_ for id_, kept in zip(self._ids, keep) if kept]
+        self._positions = {id_: row for row, id_ in enumerate(self._ids)}
+        self._texts = [text for text, kept in zip(self._texts, keep) if kept]
+        self._metadatas = [
+            metadata for metadata, kept in zip(self._metadatas, keep) if kept
+        ]
+        return True
+
+    def clear(self):
+        """Removes every chunk, so vectors of another size can be added."""
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._compact = self._scales = None
+        self._ids, self._texts, self._metadatas = [], [], []
+        self._positions = {}
+
+    def get(
+        self, ids: Optional[list[str]] = None, include: Optional[list[str]] = None
+    ) -> dict[str, list]:
+        """Stored chunks, all of them or those in ``ids``, in the same shape
+        as ``Chroma.get()``.
+
+        Documents and metadatas are always returned; the float32 vectors are
+        added when ``include`` asks for "embeddings".
+        """
+        if ids is None:
+            rows = range(len(self._ids))
+        else:
+            rows = [self._positions[id_] for id_ in ids if id_ in self._positions]
+        stored = {
+            "ids": [self._ids[row] for row in rows],
+            "documents": [self._texts[row] for row in rows],
+            "metadatas": [self._metadatas[row] for row in rows],
+        }
+        if include and "embeddings" in include:
+            stored["embeddings"] = (
+                self._matrix if ids is None else np.asarray(self._matrix)[list(rows)]
+            )
+        return stored
+
+    def _top(self, query, k):
+        """Indices and similarities of the best rows, best first."""
+        if self._compact is None:
+            candidates = None
+            similarities = self._matrix @ query
+        else:
+            approximate = approximate_scores(self._compact, self._scales, query)
+            count = min(max(k, self.rescore_candidates), len(approximate))
+            candidates = np.argpartition(-approximate, count - 1)[:count]
+            candidates.sort()  # Ascending rows read the memory map sequentially
+            similarities = self._matrix[candidates] @ query
+        k = min(k, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        rows = top if candidates is None else candidates[top]
+        return rows, similarities[top]
+
+    def _search(self, query_vector, k):
+        if not len(self):
+            return []
+        rows, similarities = self._top(_normalise_rows(query_vector)[0], k)
+        return [
+            (
+                Document(
+                    page_content=self._texts[i],
+                    metadata=dict(self._metadatas[i]),
+                    id=self._ids[i],
+                ),
+                # Squared distance between unit vectors, as Chroma's l2 space
+                2.0 - 2.0 * float(similarity),
+            )
+            for i, similarity in zip(rows, similarities)
+        ]
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: list[float], k: int = 4
+    ) -> list[tuple[Document, float]]:
+        return self._search(embedding, k)
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        **kwargs: Any,  # noqa: ARG002
+    ) -> list[tuple[Document, float]]:
+        # Distances, like Chroma's method of the same name
+        return self._search(embedding, k)
+
+    def similarity_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        **kwargs: Any,  # noqa: ARG002
+    ) -> list[Document]:
+        return [doc for doc, _ in self._search(embedding, k)]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        **kwargs: Any,  # noqa: ARG002
+    ) -> list[tuple[Document, float]]:
+        return self._search(self._embedding.embed_query(query), k)
+
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        **kwargs: Any,  # noqa: ARG002
+    ) -> list[tuple[Document, float]]:
+        return self._search(await self._embedding.aembed_query(query), k)
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    async def asimilarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        return [
+            doc
+            for doc, _ in await self.asimilarity_search_with_score(query, k, **kwargs)
+        ]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: Optional[list[dict]] = None,
+        *,
+        ids: Optional[list[str]] = None,
+        path: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(embedding, path, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        if path:
+            store.persist()
+        return store
+
+    @classmethod
+    def from_chroma(
+        cls,
+        chroma,
+        embedding: Embeddings,
+        path: str,
+        dimensions: Optional[int] = None,
+        **kwargs: Any,
+    ):
+        """Copies a Chroma collection, reusing its stored embeddings.
+
+        With ``dimensions``, vectors are truncated to that many leading
+        components and renormalised, which for text-embedding-3 models is
+        equivalent to requesting that size from the API.
+        """
+        stored = chroma.get(include=["embeddings", "documents", "metadatas"])
+        store = cls(embedding, **kwargs)
+        store.path = path
+        if len(stored["ids"]):
+            store.add_vectors(
+                np.asarray(stored["embeddings"])[:, :dimensions],
+                stored["documents"],
+                [metadata or {} for metadata in stored["metadatas"]],
+                stored["ids"],
+            )
+        store.persist()
+        return store
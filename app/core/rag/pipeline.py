@@ -0,0 +1,271 @@
+import asyncio
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterable, Callable, Iterable
+from typing import Optional, Union
+
+from langchain_core.documents import Document
+
+from app.common.rate_limit import RateLimiter
+from app.config import config
+from app.core.rag.cpu_pool import CpuPool
+from app.core.rag.domain_centroid import CentroidSum
+from app.core.rag.embedding_ingestion import count_tokens, embed_batch
+from app.core.rag.index_manifest import IndexManifest, assign_chunk_ids
+from app.core.rag.lexical_index import BM25Writer
+from app.core.rag.numpy_store import NumpyVectorStore
+from app.core.rag.vector_store import (
+    add_embedded_documents,
+    clear_documents,
+    delete_documents,
+    iter_embeddings,
+)
+
+_DONE = object()
+
+
+class PipelineReport:
+    def __init__(self):
+        self.grants = 0
+        self.chunks_added = 0
+        self.chunks_unchanged = 0
+        self.chunks_deleted = 0
+        self.chunks_failed = 0
+        self.tokens = 0
+        self.retries = 0
+        self.seconds = 0.0
+        # Time until the first new chunk was written to the store
+        self.first_upsert_seconds = None
+
+    @property
+    def changed(self):
+        return bool(self.chunks_added or self.chunks_deleted)
+
+    def summary(self):
+        seconds = self.seconds or float("inf")
+        first = (
+            f"{self.first_upsert_seconds:.1f}s"
+            if self.first_upsert_seconds is not None
+            else "n/a"
+        )
+        return (
+            f"{self.grants} grants in {self.seconds:.1f}s: "
+            f"{self.chunks_added} chunks added, {self.chunks_deleted} deleted, "
+            f"{self.chunks_unchanged} unchanged, {self.chunks_failed} failed. "
+            f"{self.chunks_added / seconds:.1f} chunks/s, "
+            f"{self.tokens / seconds:.0f} tokens/s, {self.retries} retries, "
+            f"first chunk stored after {first}"
+        )
+
+
+class IngestionPipeline:
+    """split -> embed -> upsert stages joined by bounded queues.
+
+    Each grant's chunks are diffed against the previous manifest as they
+    arrive; new chunks are embedded and stored while later grants are still
+    being read, and only chunk IDs are held for the whole run. With a
+    ``lexical_writer``, unchanged chunks and newly stored ones are written to
+    the BM25 index as they pass; with a ``centroid_sum``, stored vectors are
+    added to it and deleted ones subtracted.
+    """
+
+    def __init__(
+        self,
+        split,
+        vector_store,
+        embedding_model,
+        previous,
+        cpu_pool,
+        lexical_writer=None,
+        centroid_sum=None,
+    ):
+        self.split = split
+        self.lexical_writer = lexical_writer
+        self.centroid_sum = centroid_sum
+        self.cpu_pool = cpu_pool
+        self.vector_store = vector_store
+        self.embedding_model = embedding_model
+        self.previous = previous
+        self.report = PipelineReport()
+        self.limiter = RateLimiter(
+            tokens_per_minute=config.embedding_tokens_per_minute,
+            requests_per_minute=config.embedding_requests_per_minute,
+        )
+        self.indexed: dict[str, list[str]] = {}
+        self.to_delete: list[str] = []
+        self.chunk_queue = asyncio.Queue(maxsize=config.pipeline_queue_size)
+        self.upsert_queue = asyncio.Queue(maxsize=config.pipeline_queue_size)
+        self.start = time.perf_counter()
+
+    async def run(self, records):
+        await asyncio.gather(
+            self.split_stage(records), self.embed_stage(), self.upsert_stage()
+        )
+        # Grants that were not in this run, and chunks replaced by new
+        # versions, are only removed once everything new is stored
+        for url, ids in self.previous.chunks.items():
+            if url not in self.indexed:
+                self.to_delete.extend(ids)
+        if self.to_delete:
+            if self.centroid_sum is not None:
+                await asyncio.to_thread(self.subtract_deleted)
+            await asyncio.to_thread(delete_documents, self.vector_store, self.to_delete)
+            self.report.chunks_deleted = len(self.to_delete)
+        self.report.seconds = time.perf_counter() - self.start
+        return IndexManifest(self.indexed, self.previous.embedding)
+
+    def subtract_deleted(self):
+        for vectors in iter_embeddings(self.vector_store, self.to_delete):
+            self.centroid_sum.remove(vectors)
+
+    def diff_record(self, chunks):
+        """Records unchanged and stale chunks; returns the ones to embed."""
+        current = defaultdict(set)
+        for chunk in chunks:
+            current[chunk.metadata.get("url", "")].add(chunk.id)
+        for url, ids in current.items():
+            old_ids = set(self.previous.chunks.get(url, ()))
+            self.to_delete.extend(old_ids - ids)
+            self.indexed[url] = sorted(old_ids & ids)
+            self.report.chunks_unchanged += len(self.indexed[url])
+        new_chunks = []
+        for chunk in chunks:
+            if chunk.id not in self.indexed[chunk.metadata.get("url", "")]:
+                new_chunks.append(chunk)
+            elif self.lexical_writer is not None:
+                self.lexical_writer.add([chunk])
+        return new_chunks
+
+    async def split_stage(self, records):
+        async for record, chunks, error in self.cpu_pool.map(self.split, records):
+            self.report.grants += 1
+            if error is not None:
+                # Keep whatever is indexed for this grant rather than delete
+                # it. Its text is not at hand, so it is left out of the BM25
+                # index until it next splits
+                url = record.get("metadata", {}).get("url", "")
+                self.indexed[url] = list(self.previous.chunks.get(url, ()))
+                print(f"Failed to split {url}: {error}")
+                continue
+            for chunk in self.diff_record(assign_chunk_ids(chunks)):
+                await self.chunk_queue.put(chunk)
+        await self.chunk_queue.put(_DONE)
+
+    async def embed(self, batch, semaphore):
+        try:
+            texts = [chunk.page_content for chunk in batch]
+            # The Markdown chunker has already counted each chunk's tokens
+            tokens = sum(
+                chunk.metadata.get("token_count") or count_tokens(chunk.page_content)
+                for chunk in batch
+            )
+            vectors = await embed_batch(
+                self.embedding_model,
+                self.limiter,
+                texts,
+                tokens,
+                config.ingest_max_retries,
+                self.report,
+            )
+            self.report.tokens += tokens
+            await self.upsert_queue.put((batch, vectors))
+        except Exception as e:
+            # Left out of the manifest, so the next run retries them
+            self.report.chunks_failed += len(batch)
+            print(f"Failed to embed {len(batch)} chunks: {e}")
+        finally:
+            semaphore.release()
+
+    async def embed_stage(self):
+        semaphore = asyncio.Semaphore(config.ingest_concurrency)
+        tasks = set()
+        batch = []
+        while True:
+            chunk = await self.chunk_queue.get()
+            if chunk is not _DONE:
+                batch.append(chunk)
+            # Partial batches go out whenever the splitter falls behind, so
+            # the first grants are stored without waiting for a full batch
+            full = len(batch) >= config.ingest_batch_size
+            if batch and (full or chunk is _DONE or self.chunk_queue.empty()):
+                # Waiting for a free slot here is what applies back-pressure
+                await semaphore.acquire()
+                task = asyncio.create_task(self.embed(batch, semaphore))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                batch = []
+            if chunk is _DONE:
+                break
+        await asyncio.gather(*tasks)
+        await self.upsert_queue.put(_DONE)
+
+    async def upsert_stage(self):
+        while (item := await self.upsert_queue.get()) is not _DONE:
+            batch, vectors = item
+            await asyncio.to_thread(
+                add_embedded_documents, self.vector_store, batch, vectors
+            )
+            if self.report.first_upsert_seconds is None:
+                self.report.first_upsert_seconds = time.perf_counter() - self.start
+            for chunk in batch:
+                self.indexed[chunk.metadata.get("url", "")].append(chunk.id)
+            if self.lexical_writer is not None:
+                self.lexical_writer.add(batch)
+            if self.centroid_sum is not None:
+                self.centroid_sum.add(vectors)
+            self.report.chunks_added += len(batch)
+            print(f"Stored {self.report.chunks_added} chunks")
+
+
+async def ingest_stream(
+    records: Union[Iterable[dict], AsyncIterable[dict]],
+    split: Callable[[dict], list[Document]],
+    vector_store,
+    embedding_model,
+    manifest_path: str,
+    embedding_name: str,
+    cpu_pool: Optional[CpuPool] = None,
+    lexical_writer: Optional[BM25Writer] = None,
+    centroid_sum: Optional[CentroidSum] = None,
+) -> PipelineReport:
+    """Streams processed grants through split -> embed -> upsert.
+
+    ``split`` runs in ``cpu_pool`` when one is given, so it must be a
+    module-level function. ``records`` must cover the whole corpus: grants that never arrive are
+    deleted at the end, once everything else is stored. Chunks that failed
+    to embed are left out of the saved manifest so the next run retries them.
+    ``embedding_name`` identifies the embedding model and dimensions; if the
+    index was built with another, the store is emptied and every chunk
+    re-embedded. Every chunk indexed at the end, except those of grants that
+    failed to split, is written to ``lexical_writer``, which the caller
+    commits. ``centroid_sum`` is updated with the vectors stored and deleted.
+    """
+    previous = IndexManifest.load(manifest_path)
+    if previous is None:
+        # No manifest yet: anything already stored came from the old random
+        # IDs and is replaced
+        stored = vector_store.get(include=[])["ids"]
+        previous = IndexManifest({"": stored} if stored else {}, embedding_name)
+    elif previous.embedding != embedding_name:
+        print(
+            f"Index was embedded with {previous.embedding}, not {embedding_name}: "
+            "re-embedding every chunk"
+        )
+        await asyncio.to_thread(clear_documents, vector_store)
+        previous = IndexManifest({}, embedding_name)
+        if centroid_sum is not None:
+            centroid_sum.clear()
+    pipeline = IngestionPipeline(
+        split,
+        vector_store,
+        embedding_model,
+        previous,
+        cpu_pool or CpuPool(workers=0),
+        lexical_writer,
+        centroid_sum,
+    )
+    manifest = await pipeline.run(records)
+    if isinstance(vector_store, NumpyVectorStore) and pipeline.report.changed:
+        vector_store.persist()
+    manifest.save(manifest_path)
+    return pipeline.report
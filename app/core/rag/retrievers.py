@@ -0,0 +1,143 @@
+import asyncio
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStoreRetriever
+
+RELEVANCE_SCORE_KEY = "relevance_score"
+RRF_SCORE_KEY = "rrf_score"
+
+
+def _with_scores(docs_and_scores):
+    docs = []
+    for doc, score in docs_and_scores:
+        doc.metadata[RELEVANCE_SCORE_KEY] = float(score)
+        docs.append(doc)
+    return docs
+
+
+class ScoredVectorStoreRetriever(VectorStoreRetriever):
+    """Similarity retriever that keeps each hit's relevance score (0 to 1,
+    higher is closer) in ``doc.metadata["relevance_score"]``, which the
+    standard ``as_retriever()`` discards."""
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,  # noqa: ARG002
+        **kwargs: Any,
+    ) -> list[Document]:
+        return _with_scores(
+            self.vectorstore.similarity_search_with_relevance_scores(
+                query, **(self.search_kwargs | kwargs)
+            )
+        )
+
+    def _search_by_vector(self, vector, **kwargs):
+        # Despite the name, Chroma's and the numpy store's methods return
+        # distances, converted here as similarity_search_with_relevance_scores does
+        relevance = self.vectorstore._select_relevance_score_fn()
+        return [
+            (doc, relevance(distance))
+            for doc, distance in (
+                self.vectorstore.similarity_search_by_vector_with_relevance_scores(
+                    vector, **kwargs
+                )
+            )
+        ]
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,  # noqa: ARG002
+        **kwargs: Any,
+    ) -> list[Document]:
+        # The query is embedded on the event loop, where concurrent queries can
+        # share a batched embeddings call; the stores' own async search would
+        # embed it with the blocking embed_query in an executor thread instead
+        vector = await self.vectorstore.embeddings.aembed_query(query)
+        return _with_scores(
+            await asyncio.to_thread(
+                self._search_by_vector, vector, **(self.search_kwargs | kwargs)
+            )
+        )
+
+
+def _doc_key(doc):
+    return doc.metadata.get("url"), doc.page_content
+
+
+def reciprocal_rank_fusion(rankings, k=4, rrf_k=60):
+    """Fuses ranked document lists by summing ``1 / (rrf_k + rank)`` per list.
+
+    Documents found by several lists are merged, keeping the first copy seen,
+    so a vector hit keeps its relevance score.
+    """
+    fused: dict[Any, list] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            entry = fused.setdefault(_doc_key(doc), [doc, 0.0])
+            entry[1] += 1.0 / (rrf_k + rank)
+    best = sorted(fused.values(), key=lambda entry: entry[1], reverse=True)[:k]
+    # Copies, as lexical hits are the index's own Document objects
+    return [
+        Document(
+            page_content=doc.page_content,
+            metadata={**doc.metadata, RRF_SCORE_KEY: score},
+            id=doc.id,
+        )
+        for doc, score in best
+    ]
+
+
+class HybridRetriever(BaseRetriever):
+    """Runs BM25 and vector search together and fuses them with reciprocal
+    rank fusion. On the async path the in-memory ``BM25Index`` is searched
+    in a worker thread while the vector query waits on the embedding call.
+
+    Only vector hits carry a ``relevance_score``; documents found by BM25
+    alone have an ``rrf_score`` only.
+    """
+
+    vector_retriever: BaseRetriever
+    lexical_index: Any
+    k: int = 4
+    candidates: int = 10
+    rrf_k: int = 60
+
+    def _lexical(self, query):
+        return [doc for doc, _ in self.lexical_index.search(query, self.candidates)]
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+    ) -> list[Document]:
+        vector_docs = self.vector_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        return reciprocal_rank_fusion(
+            [vector_docs, self._lexical(query)], self.k, self.rrf_k
+        )
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+    ) -> list[Document]:
+        vector_docs, lexical_docs = await asyncio.gather(
+            self.vector_retriever.ainvoke(
+                query, config={"callbacks": run_manager.get_child()}
+            ),
+            asyncio.to_thread(self._lexical, query),
+        )
+        return reciprocal_rank_fusion([vector_docs, lexical_docs], self.k, self.rrf_k)
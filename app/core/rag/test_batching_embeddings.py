@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.core.rag.batching_embeddings import BatchingEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            msg = "embeddings API unavailable"
+            raise RuntimeError(msg)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_share_one_call():
+    underlying = CountingEmbeddings()
+    batching = BatchingEmbeddings(underlying, window_ms=20)
+    texts = ["a", "bb", "ccc", "bb"]
+
+    vectors = await asyncio.gather(*(batching.aembed_query(t) for t in texts))
+
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+    assert underlying.calls == [["a", "bb", "ccc"]]
+    assert batching.stats()["mean_batch"] == 4
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_sent_before_the_window_ends():
+    underlying = CountingEmbeddings()
+    batching = BatchingEmbeddings(underlying, window_ms=10_000, max_batch_size=2)
+
+    vectors = await asyncio.wait_for(
+        asyncio.gather(*(batching.aembed_query(t) for t in ["a", "bb", "ccc", "dddd"])),
+        timeout=1,
+    )
+
+    assert [v[0] for v in vectors] == [1.0, 2.0, 3.0, 4.0]
+    assert underlying.calls == [["a", "bb"], ["ccc", "dddd"]]
+
+
+@pytest.mark.asyncio
+async def test_failed_call_raises_for_every_caller():
+    underlying = CountingEmbeddings(fail=True)
+    batching = BatchingEmbeddings(underlying, window_ms=5)
+
+    results = await asyncio.gather(
+        batching.aembed_query("a"), batching.aembed_query("b"), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert underlying.calls == [["a", "b"]]
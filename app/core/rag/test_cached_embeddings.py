@@ -0,0 +1,81 @@
+import pytest
+from langchain.storage import LocalFileStore
+from langchain_core.embeddings import Embeddings
+
+from app.config import config
+from app.core.rag.cached_embeddings import CachedEmbeddings, build_embedding_store
+from app.core.rag.vector_store import embedding_cache_model_name
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_only_unseen_texts_are_embedded():
+    underlying = CountingEmbeddings()
+    cached = CachedEmbeddings(underlying, model_name="test-model")
+
+    first = cached.embed_documents(["a", "bb", "a"])
+    second = cached.embed_documents(["bb", "ccc"])
+
+    assert first == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert second == [[2.0, 1.0], [3.0, 1.0]]
+    assert underlying.calls == [["a", "bb"], ["ccc"]]
+    assert cached.embed_query("ccc") == [3.0, 1.0]
+    assert len(underlying.calls) == 2
+
+
+def test_lru_is_bounded():
+    underlying = CountingEmbeddings()
+    cached = CachedEmbeddings(underlying, model_name="test-model", max_entries=2)
+
+    for text in ["a", "b", "c", "a"]:
+        cached.embed_query(text)
+
+    assert underlying.calls == [["a"], ["b"], ["c"], ["a"]]
+    assert cached.stats()["entries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_persistent_store_survives_restart(tmp_path):
+    texts = ["chunk one", "chunk two"]
+    first_run = CountingEmbeddings()
+    await CachedEmbeddings(
+        first_run, "test-model", store=LocalFileStore(tmp_path)
+    ).aembed_documents(texts)
+
+    second_run = CountingEmbeddings()
+    cached = CachedEmbeddings(second_run, "test-model", store=LocalFileStore(tmp_path))
+    vectors = await cached.aembed_documents(texts)
+
+    assert vectors == [[9.0, 1.0], [9.0, 1.0]]
+    assert second_run.calls == []
+    assert cached.stats()["store_hits"] == 2
+    assert cached.stats()["api_calls"] == 0
+
+
+def test_file_store_accepts_keys_for_reduced_dimensions(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "embedding_cache_store", "file")
+    monkeypatch.setattr(config, "embedding_cache_path", str(tmp_path))
+    monkeypatch.setattr(config, "embedding_dimensions", 512)
+    underlying = CountingEmbeddings()
+    cached = CachedEmbeddings(
+        underlying, embedding_cache_model_name(), store=build_embedding_store()
+    )
+
+    assert cached.embed_query("hedgerow grant") == [14.0, 1.0]
+    assert cached.embed_documents(["soil", "slurry"]) == [[4.0, 1.0], [6.0, 1.0]]
+
+    restarted = CachedEmbeddings(
+        underlying, embedding_cache_model_name(), store=build_embedding_store()
+    )
+    assert restarted.embed_query("hedgerow grant") == [14.0, 1.0]
+    assert len(underlying.calls) == 2
@@ -0,0 +1,128 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.rag import download_farming_grants
+from app.core.rag.cpu_pool import CpuPool
+from app.core.rag.download_farming_grants import HostRateLimiter, fetch_grants
+from app.core.rag.http_cache import HttpCache
+from app.core.rag.jsonl import iter_jsonl
+
+
+class FakeContentApi:
+    def __init__(self):
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request):
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+        path = request.url.path.removeprefix("/api/content")
+        if path == "/missing":
+            return httpx.Response(404)
+        etag = f'"{path}"'
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304)
+        return httpx.Response(
+            200, json={"title": path.strip("/")}, headers={"etag": etag}
+        )
+
+
+async def fetch(results, api, cache):
+    failed = set()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(api)) as client:
+        docs = [
+            doc
+            async for doc in fetch_grants(
+                client, cache, HostRateLimiter(1000), results, {}, failed, CpuPool(0)
+            )
+        ]
+    return docs, failed
+
+
+@pytest.mark.asyncio
+async def test_fetches_concurrently_and_revalidates_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_farming_grants.config, "govuk_fetch_concurrency", 4)
+    results = [{"link": f"/grant-{i}"} for i in range(12)]
+    results += [{"link": "/missing"}, {"link": "not-a-path"}]
+    api = FakeContentApi()
+    cache = HttpCache(str(tmp_path))
+
+    first, failed = await fetch(results, api, cache)
+    second, _ = await fetch(results, api, cache)
+
+    titles = sorted(doc["metadata"]["title"] for doc in first)
+    assert titles == sorted(f"grant-{i}" for i in range(12))
+    assert sorted(first, key=str) == sorted(second, key=str)
+    assert failed == {"/missing"}
+    assert api.max_in_flight == 4
+    assert cache.misses == 12
+    assert cache.hits == 12
+
+
+class FakeGovUk(FakeContentApi):
+    def __init__(self, grants):
+        super().__init__()
+        self.grants = grants  # link -> updated_at
+
+    async def __call__(self, request):
+        if request.url.path != "/api/search.json":
+            return await super().__call__(request)
+        self.requests.append(request)
+        start = int(request.url.params["start"])
+        count = int(request.url.params["count"])
+        links = sorted(self.grants)
+        results = [
+            {"link": link, "updated_at": self.grants[link]}
+            for link in links[start : start + count]
+        ]
+        return httpx.Response(200, json={"results": results, "total": len(links)})
+
+    def content_requests(self):
+        return sorted(
+            request.url.path.removeprefix("/api/content")
+            for request in self.requests
+            if request.url.path.startswith("/api/content")
+        )
+
+
+@pytest.mark.parametrize("filename", ["processed.jsonl", "processed.jsonl.zst"])
+def test_refresh_only_fetches_new_and_updated_grants(tmp_path, monkeypatch, filename):
+    monkeypatch.setattr(download_farming_grants, "SEARCH_PAGE_SIZE", 2)
+    config = download_farming_grants.config
+    monkeypatch.setattr(config, "processed_grants_path", str(tmp_path / filename))
+    monkeypatch.setattr(config, "govuk_crawl_state_path", str(tmp_path / "state.json"))
+    monkeypatch.setattr(config, "govuk_http_cache_path", str(tmp_path / "cache"))
+    monkeypatch.setattr(config, "govuk_requests_per_second", 1000)
+    api = FakeGovUk({"/a": "1", "/b": "1", "/c": "1", "/d": "1", "/e": "1"})
+    monkeypatch.setattr(
+        download_farming_grants,
+        "build_async_client",
+        lambda: httpx.AsyncClient(transport=httpx.MockTransport(api)),
+    )
+
+    def refresh():
+        api.requests.clear()
+        assert download_farming_grants.fetch_and_convert_grant_data() is not None
+        return list(iter_jsonl(config.processed_grants_path))
+
+    docs = refresh()
+    assert api.content_requests() == ["/a", "/b", "/c", "/d", "/e"]
+    assert len(docs) == 5
+
+    api.grants = {"/a": "1", "/b": "2", "/c": "1", "/e": "1", "/f": "1"}
+    docs = refresh()
+    assert api.content_requests() == ["/b", "/f"]
+    assert sorted(doc["metadata"]["url"] for doc in docs) == [
+        f"https://www.gov.uk/{name}" for name in "abcef"
+    ]
+
+    assert refresh() == docs
+    assert api.content_requests() == []
@@ -0,0 +1,31 @@
+import pytest
+
+from app.core.rag.jsonl import JsonlWriter, iter_jsonl, write_jsonl
+
+
+@pytest.mark.parametrize("filename", ["docs.jsonl", "docs.jsonl.zst"])
+def test_round_trip(tmp_path, filename):
+    path = str(tmp_path / filename)
+    records = [{"title": "Grant £1", "n": i} for i in range(3)]
+
+    assert write_jsonl(path, records) == 3
+
+    assert list(iter_jsonl(path)) == records
+
+
+def write_then_fail(path):
+    with JsonlWriter(path) as writer:
+        writer.write({"n": 2})
+        msg = "interrupted"
+        raise ValueError(msg)
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    path = str(tmp_path / "docs.jsonl")
+    write_jsonl(path, [{"n": 1}])
+
+    with pytest.raises(ValueError, match="interrupted"):
+        write_then_fail(path)
+
+    assert list(iter_jsonl(path)) == [{"n": 1}]
+    assert [p.name for p in tmp_path.iterdir()] == ["docs.jsonl"]
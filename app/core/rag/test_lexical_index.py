@@ -0,0 +1,60 @@
+import json
+
+from langchain_core.documents import Document
+
+from app.core.rag.lexical_index import BM25Index, tokenize
+
+DOCS = [
+    Document(
+        page_content="Capital Grants: hedgerow item CSHT1 pays £5,000",
+        metadata={"url": "a"},
+    ),
+    Document(
+        page_content="Sustainable Farming Incentive (SFI) actions for soil",
+        metadata={"url": "b"},
+    ),
+    Document(
+        page_content="Guidance on farming grants and farming payments",
+        metadata={"url": "c"},
+    ),
+]
+
+
+def test_tokenize_keeps_codes_and_amounts():
+    assert tokenize("What is CSHT1 worth? £5,000 for AHW-2") == [
+        "csht1",
+        "worth",
+        "5000",
+        "ahw-2",
+    ]
+
+
+def test_search_ranks_exact_code_matches_first():
+    index = BM25Index(DOCS)
+
+    results = index.search("How much is csht1?", k=2)
+
+    assert [doc.metadata["url"] for doc, _ in results] == ["a"]
+    assert index.search("5000")[0][0].metadata["url"] == "a"
+    assert index.search("unknown term") == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = tmp_path / "bm25_index.json"
+    BM25Index(DOCS).save(str(path))
+
+    loaded = BM25Index.load(str(path))
+
+    assert len(loaded) == len(DOCS)
+    assert loaded.search("SFI soil")[0][0].metadata["url"] == "b"
+
+
+def test_loads_index_saved_as_one_json_object(tmp_path):
+    path = tmp_path / "bm25_index.json"
+    documents = [{"page_content": d.page_content, "metadata": d.metadata} for d in DOCS]
+    path.write_text(json.dumps({"k1": 1.2, "b": 0.5, "documents": documents}))
+
+    loaded = BM25Index.load(str(path))
+
+    assert (len(loaded), loaded.k1, loaded.b) == (3, 1.2, 0.5)
+    assert loaded.search("csht1")[0][0].metadata["url"] == "a"
@@ -0,0 +1,122 @@
+import re
+
+from langchain_core.documents import Document
+
+from app.core.rag.markdown_chunker import MarkdownChunker, parse_blocks
+
+
+def word_offsets(text):
+    """One token per word, so counts are easy to check by hand."""
+    return [match.start() for match in re.finditer(r"\S+", text)]
+
+
+def word_count(text):
+    return len(word_offsets(text))
+
+
+def chunker(size, overlap=0, count=word_count):
+    return MarkdownChunker(size, overlap, offsets=word_offsets, count=count)
+
+
+def paragraph(word, count):
+    return " ".join([word] * count)
+
+
+GRANT = "\n\n".join(
+    [
+        "# Hedgerow grant",
+        "**URL:** https://www.gov.uk/hedgerows",
+        "## Description",
+        "Money for hedges.",
+        "## Details",
+        paragraph("alpha", 8),
+        paragraph("beta", 8),
+        paragraph("gamma", 8),
+        "## Change History",
+        "*   **2024:** Published.",
+    ]
+)
+
+
+def test_parse_blocks_tracks_header_path():
+    blocks = parse_blocks("# A\n\nintro\n\n## B\n\nbody\nmore\n\n# C\n\nend")
+
+    assert [(b.path, b.header) for b in blocks] == [
+        (("A",), True),
+        (("A",), False),
+        (("A", "B"), True),
+        (("A", "B"), False),
+        (("C",), True),
+        (("C",), False),
+    ]
+
+
+def test_fenced_code_is_one_block():
+    blocks = parse_blocks("```\n# not a header\n\nstill code\n```")
+
+    assert len(blocks) == 1
+    assert not blocks[0].header
+
+
+def test_sections_that_fit_are_never_split():
+    chunks = chunker(size=20).split_text(GRANT)
+
+    texts = [text for text, _, _ in chunks]
+    # The oversized Details section starts after the short sections, and its
+    # tail is not merged with Change History
+    assert texts == [
+        GRANT[: GRANT.index("\n\nbeta")],
+        GRANT[GRANT.index("beta") : GRANT.index("\n\n## Change History")],
+        GRANT[GRANT.index("## Change History") :],
+    ]
+    assert [path for _, path, _ in chunks] == [
+        ("Hedgerow grant",),
+        ("Hedgerow grant", "Details"),
+        ("Hedgerow grant", "Change History"),
+    ]
+    assert [count for _, _, count in chunks] == [
+        len(word_offsets(text)) for text in texts
+    ]
+    assert all(count <= 20 for _, _, count in chunks)
+
+
+def test_overlap_repeats_trailing_paragraphs():
+    text = "\n\n".join(paragraph(word, 4) for word in ["a", "b", "c", "d"])
+
+    chunks = chunker(size=8, overlap=4).split_text(text)
+
+    assert [chunk for chunk, _, _ in chunks] == [
+        "a a a a\n\nb b b b",
+        "b b b b\n\nc c c c",
+        "c c c c\n\nd d d d",
+    ]
+
+
+def test_oversized_paragraph_is_cut_within_budget():
+    chunks = chunker(size=10).split_text(paragraph("x", 25))
+
+    assert [count for _, _, count in chunks] == [10, 10, 5]
+    assert "".join(text for text, _, _ in chunks).split() == ["x"] * 25
+
+
+def test_split_documents_adds_section_and_token_count():
+    doc = Document(page_content=GRANT, metadata={"url": "/hedgerows"})
+
+    chunks = chunker(size=20).split_documents([doc])
+
+    assert chunks[1].metadata == {
+        "url": "/hedgerows",
+        "section": "Hedgerow grant > Details",
+        "token_count": 16,
+    }
+
+
+def test_token_count_comes_from_encoding_each_chunk():
+    # A tokenizer that merges words across the chunk edge would make the
+    # span counts drift; the recorded count is taken from the chunk itself
+    def exact(text):
+        return word_count(text) + 1
+
+    chunks = chunker(size=20, count=exact).split_text(GRANT)
+
+    assert [count for _, _, count in chunks] == [exact(text) for text, _, _ in chunks]
@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.core.rag.numpy_store import NumpyVectorStore
+
+WORDS = ["hedgerow", "grant", "soil", "slurry", "woodland"]
+TEXTS = ["hedgerow grant", "soil soil grant", "slurry store", "woodland hedgerow"]
+
+
+class BagOfWordsEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        words = text.split()
+        vector = np.array([float(words.count(word)) for word in WORDS])
+        return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+
+@pytest.fixture
+def store():
+    return NumpyVectorStore.from_texts(
+        TEXTS, BagOfWordsEmbeddings(), metadatas=[{"n": i} for i in range(4)]
+    )
+
+
+def test_search_returns_nearest_first(store):
+    docs = store.similarity_search("hedgerow", k=2)
+
+    assert [doc.page_content for doc in docs] == ["hedgerow grant", "woodland hedgerow"]
+    assert docs[0].metadata == {"n": 0}
+
+
+@pytest.mark.asyncio
+async def test_relevance_scores_match_chroma_scale(store):
+    results = await store.asimilarity_search_with_relevance_scores("slurry store", k=4)
+
+    assert results[0][0].page_content == "slurry store"
+    assert results[0][1] == pytest.approx(1.0)
+    # Orthogonal unit vectors have squared distance 2, as they would in Chroma
+    assert results[-1][1] == pytest.approx(1 - 2 / np.sqrt(2))
+
+
+def test_persist_and_memory_map(tmp_path, store):
+    store.path = str(tmp_path)
+    store.persist()
+
+    loaded = NumpyVectorStore(BagOfWordsEmbeddings(), str(tmp_path))
+
+    assert isinstance(loaded._matrix, np.memmap)
+    assert loaded.get() == store.get()
+    assert loaded.similarity_search("soil", k=1)[0].metadata == {"n": 1}
+
+    loaded.add_texts(["woodland"], [{"n": 4}])
+    loaded.persist()
+    assert len(NumpyVectorStore(BagOfWordsEmbeddings(), str(tmp_path))) == 5
+    assert loaded.similarity_search("soil", k=1)[0].metadata == {"n": 1}
+
+
+def test_export_from_chroma(tmp_path):
+    from langchain_chroma import Chroma
+
+    chroma = Chroma(
+        collection_name="numpy-export-test", embedding_function=BagOfWordsEmbeddings()
+    )
+    chroma.add_texts(TEXTS, metadatas=[{"n": i} for i in range(4)])
+
+    store = NumpyVectorStore.from_chroma(chroma, BagOfWordsEmbeddings(), str(tmp_path))
+
+    assert len(store) == 4
+    expected = chroma.similarity_search_with_relevance_scores("soil grant", k=2)
+    actual = store.similarity_search_with_relevance_scores("soil grant", k=2)
+    assert [doc.page_content for doc, _ in actual] == [
+        doc.page_content for doc, _ in expected
+    ]
+    assert [score for _, score in actual] == pytest.approx(
+        [score for _, score in expected], abs=1e-3
+    )
+
+
+@pytest.mark.parametrize("quantisation", ["float16", "int8"])
+def test_quantised_search_rescores_at_full_precision(tmp_path, quantisation):
+    vectors = np.random.default_rng(0).standard_normal((500, 64))
+    texts = [str(i) for i in range(500)]
+    exact = NumpyVectorStore(BagOfWordsEmbeddings())
+    exact.add_vectors(vectors, texts, ids=texts)
+    compact = NumpyVectorStore(
+        BagOfWordsEmbeddings(),
+        str(tmp_path),
+        quantisation=quantisation,
+        rescore_candidates=20,
+    )
+    compact.add_vectors(vectors, texts, ids=texts)
+    compact.persist()
+    reloaded = NumpyVectorStore(
+        BagOfWordsEmbeddings(), str(tmp_path), quantisation=quantisation
+    )
+
+    assert reloaded.memory_per_chunk() == compact.memory_per_chunk()
+    assert compact.memory_per_chunk() <= exact.memory_per_chunk() / 2
+    for query in np.random.default_rng(1).standard_normal((10, 64)):
+        expected = exact.similarity_search_by_vector_with_score(query, k=4)
+        actual = reloaded.similarity_search_by_vector_with_score(query, k=4)
+        assert [doc.id for doc, _ in actual] == [doc.id for doc, _ in expected]
+        # Returned scores come from the float32 rescoring pass
+        assert [score for _, score in actual] == pytest.approx(
+            [score for _, score in expected], abs=1e-5
+        )
+
+
+@pytest.mark.parametrize("quantisation", ["none", "int8"])
+def test_batched_adds_match_one_add(quantisation):
+    vectors = np.random.default_rng(0).standard_normal((300, 16))
+    texts = [str(i) for i in range(300)]
+    whole = NumpyVectorStore(BagOfWordsEmbeddings(), quantisation=quantisation)
+    whole.add_vectors(vectors, texts, ids=texts)
+    batched = NumpyVectorStore(BagOfWordsEmbeddings(), quantisation=quantisation)
+    for start in range(0, 300, 7):
+        batched.add_vectors(
+            vectors[start : start + 7],
+            texts[start : start + 7],
+            ids=texts[start : start + 7],
+        )
+
+    assert batched.get() == whole.get()
+    np.testing.assert_array_equal(batched._matrix, whole._matrix)
+    # Appends write into spare capacity rather than copying the whole matrix
+    assert len(batched._buffers["vectors"]) < 2 * 300
+    query = vectors[42]
+    assert batched.similarity_search_by_vector_with_score(query, k=3) == (
+        whole.similarity_search_by_vector_with_score(query, k=3)
+    )
+
+
+def test_readding_an_id_in_a_later_batch_replaces_it():
+    store = NumpyVectorStore(BagOfWordsEmbeddings())
+    store.add_vectors(np.eye(3), ["a", "b", "c"], ids=["a", "b", "c"])
+    store.add_vectors([[0.0, 1.0, 1.0]], ["b2"], ids=["b"])
+    store.add_vectors([[1.0, 1.0, 0.0]], ["d"], ids=["d"])
+
+    assert store.get()["ids"] == ["a", "c", "b", "d"]
+    assert store.get(ids=["d", "b"])["documents"] == ["d", "b2"]
+    doc, _ = store.similarity_search_by_vector_with_score([0.0, 1.0, 1.0], k=1)[0]
+    assert doc.id == "b"
@@ -0,0 +1,249 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.core.rag import embedding_ingestion, pipeline
+from app.core.rag.domain_centroid import CentroidSum, DomainCentroid
+from app.core.rag.index_manifest import IndexManifest
+from app.core.rag.lexical_index import BM25Index, BM25Writer
+from app.core.rag.numpy_store import NumpyVectorStore
+from app.core.rag.pipeline import ingest_stream
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.embedded = []
+        self.dimensions = 2
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        padding = [1.0] * (self.dimensions - 1)
+        return [[float(len(text)), *padding] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+def split(record):
+    url, texts = record
+    return [Document(page_content=text, metadata={"url": url}) for text in texts]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "count_tokens", len)
+    return NumpyVectorStore(CountingEmbeddings(), str(tmp_path / "numpy"))
+
+
+def manifest_ids(manifest):
+    return {id_ for ids in manifest.chunks.values() for id_ in ids}
+
+
+async def ingest(store, pages, manifest_path, embedding_name="test-model"):
+    return await ingest_stream(
+        pages.items(), split, store, store.embeddings, manifest_path, embedding_name
+    )
+
+
+@pytest.mark.asyncio
+async def test_reindexing_only_embeds_changes(tmp_path, store):
+    manifest_path = str(tmp_path / "manifest.json")
+    model = store.embeddings
+    pages = {"/a": ["a1", "a2"], "/b": ["b1"], "/c": ["c1"]}
+
+    report = await ingest(store, pages, manifest_path)
+    assert report.chunks_added == 4
+    assert sorted(model.embedded) == ["a1", "a2", "b1", "c1"]
+    ids = set(store.get()["ids"])
+
+    model.embedded.clear()
+    report = await ingest(store, pages, manifest_path)
+    assert not report.changed
+    assert report.chunks_unchanged == 4
+    assert model.embedded == []
+    assert set(store.get()["ids"]) == ids
+
+    pages = {"/a": ["a1", "a2 edited"], "/b": ["b1"]}
+    report = await ingest(store, pages, manifest_path)
+    assert model.embedded == ["a2 edited"]
+    assert report.chunks_deleted == 2
+    assert sorted(store.get()["documents"]) == ["a1", "a2 edited", "b1"]
+    manifest = IndexManifest.load(manifest_path)
+    assert set(manifest.chunks) == {"/a", "/b"}
+    assert manifest_ids(manifest) == set(store.get()["ids"])
+
+
+@pytest.mark.asyncio
+async def test_first_run_replaces_chunks_with_random_ids(tmp_path, store):
+    store.add_texts(["a1", "a1"], [{"url": "/a"}, {"url": "/a"}])
+
+    await ingest(store, {"/a": ["a1"]}, str(tmp_path / "m.json"))
+
+    assert store.get()["documents"] == ["a1"]
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_stored_before_the_stream_ends(tmp_path, store):
+    async def records():
+        yield "/a", ["a1"]
+        # The next grant only arrives once the first one is searchable
+        for _ in range(100):
+            if store.get()["ids"]:
+                break
+            await asyncio.sleep(0.01)
+        else:
+            pytest.fail("first grant was not stored")
+        yield "/b", ["b1"]
+
+    report = await ingest_stream(
+        records(), split, store, store.embeddings, str(tmp_path / "m.json"), "test"
+    )
+
+    assert report.chunks_added == 2
+    assert report.first_upsert_seconds < report.seconds
+
+
+@pytest.mark.asyncio
+async def test_new_embedding_dimensions_reembed_every_chunk(tmp_path, store):
+    manifest_path = str(tmp_path / "manifest.json")
+    model = store.embeddings
+    pages = {"/a": ["a1", "a2"], "/b": ["b1"]}
+    await ingest(store, pages, manifest_path, "test-model")
+
+    model.embedded.clear()
+    model.dimensions = 4
+    report = await ingest(store, pages, manifest_path, "test-model@4")
+
+    assert sorted(model.embedded) == ["a1", "a2", "b1"]
+    assert report.chunks_added == 3
+    assert sorted(store.get()["documents"]) == ["a1", "a2", "b1"]
+    assert store.get(include=["embeddings"])["embeddings"].shape == (3, 4)
+    assert IndexManifest.load(manifest_path).embedding == "test-model@4"
+
+
+@pytest.mark.asyncio
+async def test_bm25_index_is_written_from_the_stream(tmp_path, store):
+    manifest_path = str(tmp_path / "manifest.json")
+    index_path = str(tmp_path / "bm25.json")
+
+    async def ingest_with_index(pages):
+        writer = BM25Writer(index_path)
+        await ingest_stream(
+            pages.items(),
+            split,
+            store,
+            store.embeddings,
+            manifest_path,
+            "test-model",
+            lexical_writer=writer,
+        )
+        writer.commit()
+        return sorted(doc.page_content for doc in BM25Index.load(index_path).documents)
+
+    assert await ingest_with_index({"/a": ["a1", "a2"], "/b": ["b1"]}) == [
+        "a1",
+        "a2",
+        "b1",
+    ]
+    # Unchanged chunks come from the splitter, new ones from the upsert stage
+    texts = await ingest_with_index({"/a": ["a1", "a2 edited"], "/c": ["c1"]})
+    assert texts == ["a1", "a2 edited", "c1"]
+    assert texts == sorted(store.get()["documents"])
+
+
+@pytest.mark.asyncio
+async def test_centroid_sum_tracks_stored_and_deleted_vectors(tmp_path, store):
+    manifest_path = str(tmp_path / "manifest.json")
+    centroid_path = str(tmp_path / "centroid.npy")
+
+    async def ingest_with_centroid(pages):
+        centroid_sum = CentroidSum.load(centroid_path)
+        await ingest_stream(
+            pages.items(),
+            split,
+            store,
+            store.embeddings,
+            manifest_path,
+            "test-model",
+            centroid_sum=centroid_sum,
+        )
+        centroid_sum.centroid().save(centroid_path)
+        return centroid_sum
+
+    await ingest_with_centroid({"/a": ["a1", "a2"], "/b": ["bb1"]})
+    centroid_sum = await ingest_with_centroid(
+        {"/a": ["a1", "a2 edited"], "/c": ["c1 longer"]}
+    )
+
+    stored = store.get(include=["embeddings"])["embeddings"]
+    assert centroid_sum.count == len(stored) == 3
+    expected = DomainCentroid.from_vectors(stored).centroid
+    assert DomainCentroid.load(centroid_path).centroid == pytest.approx(expected)
+
+
+def rate_limit_error():
+    request = httpx.Request("POST", "https://example.openai.azure.com/embeddings")
+    response = httpx.Response(429, headers={"retry-after-ms": "10"}, request=request)
+    return openai.RateLimitError("Too many requests", response=response, body=None)
+
+
+class FlakyEmbeddings(Embeddings):
+    """Rate limits the batch holding "chunk 0" once and always rejects
+    "broken"."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rate_limited = False
+
+    def embed_documents(self, texts):
+        raise NotImplementedError
+
+    def embed_query(self, text):
+        raise NotImplementedError
+
+    async def aembed_documents(self, texts):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.02)
+            if "chunk 0" in texts and not self.rate_limited:
+                self.rate_limited = True
+                raise rate_limit_error()
+            if "broken" in texts:
+                msg = "invalid input"
+                raise ValueError(msg)
+            return [[float(len(text)), 1.0] for text in texts]
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.mark.asyncio
+async def test_embedding_retries_and_leaves_failed_batches_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_ingestion, "backoff_delay", lambda _: 0)
+    monkeypatch.setattr(pipeline, "count_tokens", len)
+    monkeypatch.setattr(pipeline.config, "ingest_batch_size", 5)
+    monkeypatch.setattr(pipeline.config, "ingest_concurrency", 3)
+    monkeypatch.setattr(pipeline.config, "ingest_max_retries", 2)
+    model = FlakyEmbeddings()
+    store = NumpyVectorStore(model, str(tmp_path / "numpy"))
+    pages = {f"/{i}": [f"chunk {i}"] for i in range(20)} | {"/x": ["broken"]}
+    manifest_path = str(tmp_path / "m.json")
+
+    report = await ingest_stream(
+        pages.items(), split, store, model, manifest_path, "test"
+    )
+
+    stored = store.get()
+    assert "chunk 0" in stored["documents"]
+    assert "broken" not in stored["documents"]
+    assert report.retries == 1
+    assert report.chunks_failed >= 1
+    assert report.chunks_added + report.chunks_failed == 21
+    assert model.max_in_flight <= 3
+    # Failed chunks are left out of the manifest so the next run retries them
+    assert manifest_ids(IndexManifest.load(manifest_path)) == set(stored["ids"])
@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from app.core.rag.batching_embeddings import BatchingEmbeddings
+from app.core.rag.lexical_index import BM25Index
+from app.core.rag.numpy_store import NumpyVectorStore
+from app.core.rag.retrievers import (
+    RRF_SCORE_KEY,
+    HybridRetriever,
+    ScoredVectorStoreRetriever,
+)
+
+
+def doc(url, text="text", **metadata):
+    return Document(page_content=text, metadata={"url": url, **metadata})
+
+
+class FixedRetriever(BaseRetriever):
+    docs: list[Document]
+
+    def _get_relevant_documents(self, query, *, run_manager):  # noqa: ARG002
+        return [d.model_copy(deep=True) for d in self.docs]
+
+
+@pytest.mark.asyncio
+async def test_hybrid_fuses_lexical_and_vector_rankings():
+    lexical = BM25Index(
+        [doc("code", "CSHT1 hedgerow item"), doc("shared", "hedgerow grants")]
+    )
+    vector = FixedRetriever(
+        docs=[
+            doc("semantic", "planting hedges", relevance_score=0.5),
+            doc("shared", "hedgerow grants", relevance_score=0.4),
+        ]
+    )
+    retriever = HybridRetriever(vector_retriever=vector, lexical_index=lexical, k=3)
+
+    results = await retriever.ainvoke("CSHT1 hedgerow")
+
+    urls = [d.metadata["url"] for d in results]
+    assert urls[0] == "shared"
+    assert set(urls) == {"shared", "code", "semantic"}
+    # Vector hits keep their relevance score for the relevance gate
+    assert results[0].metadata["relevance_score"] == 0.4
+    assert "relevance_score" not in results[urls.index("code")].metadata
+    assert all(RRF_SCORE_KEY in d.metadata for d in results)
+    assert RRF_SCORE_KEY not in lexical.documents[0].metadata
+    assert retriever.invoke("CSHT1 hedgerow") == results
+
+
+class SlowLexicalIndex:
+    def search(self, query, k):  # noqa: ARG002
+        time.sleep(0.1)
+        return [(doc("lexical"), 1.0)]
+
+
+class SlowVectorRetriever(FixedRetriever):
+    async def _aget_relevant_documents(self, query, *, run_manager):  # noqa: ARG002
+        await asyncio.sleep(0.1)
+        return [d.model_copy(deep=True) for d in self.docs]
+
+
+@pytest.mark.asyncio
+async def test_hybrid_searches_run_concurrently():
+    retriever = HybridRetriever(
+        vector_retriever=SlowVectorRetriever(docs=[doc("vector")]),
+        lexical_index=SlowLexicalIndex(),
+    )
+
+    start = time.perf_counter()
+    results = await retriever.ainvoke("hedgerow")
+
+    assert time.perf_counter() - start < 0.18
+    assert {d.metadata["url"] for d in results} == {"vector", "lexical"}
+
+
+class KeywordEmbeddings(Embeddings):
+    WORDS = ["soil", "hedgerow", "slurry", "woodland"]
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(word in text) for word in self.WORDS] + [0.1] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+async def test_concurrent_retrievals_share_one_embedding_call(backend):
+    underlying = KeywordEmbeddings()
+    embeddings = BatchingEmbeddings(underlying, window_ms=20)
+    texts = ["soil grant", "hedgerow grant", "slurry grant", "woodland grant"]
+    if backend == "chroma":
+        store = Chroma(
+            collection_name="batched-retrieval-test", embedding_function=embeddings
+        )
+    else:
+        store = NumpyVectorStore(embeddings)
+    store.add_texts(texts, ids=texts)
+    underlying.calls.clear()
+    retriever = ScoredVectorStoreRetriever(vectorstore=store, search_kwargs={"k": 1})
+    queries = [f"{text}, question {i}" for i in range(5) for text in texts]
+
+    results = await asyncio.gather(*(retriever.ainvoke(q) for q in queries))
+
+    assert len(underlying.calls) == 1
+    assert sorted(underlying.calls[0]) == sorted(queries)
+    assert [docs[0].page_content for docs in results] == [
+        query.split(",")[0] for query in queries
+    ]
+    assert results[0][0].metadata["relevance_score"] == pytest.approx(
+        retriever.invoke(queries[0])[0].metadata["relevance_score"]
+    )
@@ -1,96 +1,371 @@
+import json
 import os
+import time
+import uuid
 
 from langchain_chroma import Chroma
 from langchain_openai import AzureOpenAIEmbeddings
 
 from app.config import config as configs
+from app.core.rag.batching_embeddings import BatchingEmbeddings
+from app.core.rag.cached_embeddings import CachedEmbeddings, build_embedding_store
+from app.core.rag.domain_centroid import CentroidSum, DomainCentroid
+from app.core.rag.lexical_index import BM25Index
+from app.core.rag.numpy_store import NumpyVectorStore
+from app.core.rag.retrievers import HybridRetriever, ScoredVectorStoreRetriever
 
 # --- Configuration ---
 # Define the path where the vector store will be persisted
 GRANTS_VECTORSTORE_PATH = "./chroma_db_grants"
 COLLECTION_NAME = "rag-chroma"
-embedding_model = None
-
-try:
-    # Define model used for embedding
-    embedding_model = AzureOpenAIEmbeddings(
-        model="text-embedding-3-small",
-        azure_deployment="text-embedding-3-small",
-        azure_endpoint=configs.AZURE_OPENAI_ENDPOINT,
-        api_key=configs.AZURE_OPENAI_API_KEY,
-        api_version=configs.AZURE_API_VERSION,
-    )
-    print("Embedding model initialized successfully.")
-except Exception as e:
-    print(
-        f"CRITICAL: Error initializing embedding model: {e}. Vector store operations will likely fail."
-    )
-
+EMBEDDING_MODEL_NAME = "text-embedding-3-small"
+# Written by each ingestion run; anything derived from the index (e.g. cached
+# answers) is tagged with this version and ignored once it changes.
+INDEX_VERSION_PATH = os.path.join(GRANTS_VECTORSTORE_PATH, "index_version.json")
+# Chunk IDs indexed per source URL, diffed by ingestion to re-index incrementally
+MANIFEST_PATH = os.path.join(GRANTS_VECTORSTORE_PATH, "manifest.json")
+# Matrix and metadata sidecar used when VECTOR_BACKEND=numpy
+NUMPY_STORE_PATH = os.path.join(GRANTS_VECTORSTORE_PATH, "numpy_index")
+# BM25 index over the same chunks, written by ingestion for hybrid retrieval
+LEXICAL_INDEX_PATH = os.path.join(GRANTS_VECTORSTORE_PATH, "bm25_index.json")
+# Mean chunk embedding, written by ingestion for the query router
+DOMAIN_CENTROID_PATH = os.path.join(GRANTS_VECTORSTORE_PATH, "domain_centroid.npy")
 
-# --- Initialize/Load Vector Store ---
+# Populated by init_vector_store(), which runs from the FastAPI lifespan or on
+# first use, so importing this module stays free of network and disk access.
+embedding_model = None
 vector_store_grants = None
 retriever = None
+lexical_index = None
+domain_centroid = None
+_initialised = False
+_index_version = (None, "unversioned")  # (file mtime, version)
 
 
-# --- Initialize Retriever ---
-if embedding_model:  # Proceed only if the embedding model was initialized
+def embedding_cache_model_name():
+    # Vectors of different sizes must not share cache entries. The name is
+    # part of each cache key, which LocalFileStore limits to [a-zA-Z0-9_.\-/]
+    if configs.embedding_dimensions:
+        return f"{EMBEDDING_MODEL_NAME}-d{configs.embedding_dimensions}"
+    return EMBEDDING_MODEL_NAME
+
+
+def init_embedding_model():
+    global embedding_model
     try:
-        # Initialising a Chroma object for vector_store_grants.
-        # If GRANTS_VECTORSTORE_PATH exists, Chroma will attempt to load it.
-        # If not, it's an in-memory ready instance for ingest_markdown_docs.py to populate and persist.
+        # Define model used for embedding
+        azure_embeddings = AzureOpenAIEmbeddings(
+            model=EMBEDDING_MODEL_NAME,
+            azure_deployment=EMBEDDING_MODEL_NAME,
+            azure_endpoint=configs.AZURE_OPENAI_ENDPOINT,
+            api_key=configs.AZURE_OPENAI_API_KEY,
+            api_version=configs.AZURE_API_VERSION,
+            dimensions=configs.embedding_dimensions,
+        )
+        if configs.embedding_batch_window_ms > 0:
+            # Concurrent query cache misses share one embeddings API call
+            azure_embeddings = BatchingEmbeddings(
+                azure_embeddings,
+                window_ms=configs.embedding_batch_window_ms,
+                max_batch_size=configs.embedding_batch_max_size,
+            )
+        # Query embedding and ingestion both go through the cache, so repeated
+        # queries and unchanged chunks are not re-embedded.
+        embedding_model = CachedEmbeddings(
+            azure_embeddings,
+            model_name=embedding_cache_model_name(),
+            max_entries=configs.embedding_cache_max_entries,
+            store=build_embedding_store(),
+        )
+        print("Embedding model initialized successfully.")
+    except Exception as e:
         print(
-            f"Initializing Chroma for 'vector_store_grants' with path: {GRANTS_VECTORSTORE_PATH} and collection: '{COLLECTION_NAME}'"
+            f"CRITICAL: Error initializing embedding model: {e}. Vector store operations will likely fail."
         )
+    return embedding_model
+
+
+def open_vector_store():
+    """Opens the vector index selected by ``vector_backend``.
 
-        vector_store_grants = Chroma(
-            persist_directory=GRANTS_VECTORSTORE_PATH,
-            embedding_function=embedding_model,
-            collection_name=COLLECTION_NAME,
+    The numpy backend is exported from the Chroma collection the first time
+    it is opened, after which Chroma is not loaded at all.
+    """
+    if configs.vector_backend == "numpy":
+        options = {
+            "quantisation": configs.vector_quantisation,
+            "rescore_candidates": configs.rescore_candidates,
+        }
+        store = NumpyVectorStore(embedding_model, NUMPY_STORE_PATH, **options)
+        if len(store) or not os.path.isdir(GRANTS_VECTORSTORE_PATH):
+            return store
+        chroma = open_chroma()
+        if not chroma._collection.count():
+            return store
+        print(f"Exporting Chroma collection '{COLLECTION_NAME}' to {NUMPY_STORE_PATH}")
+        return NumpyVectorStore.from_chroma(
+            chroma,
+            embedding_model,
+            NUMPY_STORE_PATH,
+            dimensions=configs.embedding_dimensions,
+            **options,
         )
-        print("'vector_store_grants' (Chroma instance) initialized.")
-
-        # Initialize retriever only if the persistent store exists AND has documents.
-        # Check if the collection actually has documents before creating a retriever
-        if os.path.exists(GRANTS_VECTORSTORE_PATH) and os.path.isdir(
-            GRANTS_VECTORSTORE_PATH
-        ):
-            # The vector_store_grants instance above would have loaded data if the path existed.
-            if (
-                vector_store_grants._collection.count() > 0
-            ):  # Check if the collection has any documents
-                retriever = vector_store_grants.as_retriever()
-                print(
-                    f"Retriever initialized from existing vector store with {vector_store_grants._collection.count()} documents."
-                )
+    return open_chroma()
+
+
+def open_chroma():
+    return Chroma(
+        persist_directory=GRANTS_VECTORSTORE_PATH,
+        embedding_function=embedding_model,
+        collection_name=COLLECTION_NAME,
+    )
+
+
+def document_count(vector_store):
+    if isinstance(vector_store, NumpyVectorStore):
+        return len(vector_store)
+    return vector_store._collection.count()
+
+
+def load_lexical_index():
+    global lexical_index
+    if not os.path.exists(LEXICAL_INDEX_PATH):
+        print(f"No BM25 index at {LEXICAL_INDEX_PATH}. Using vector search only.")
+        return None
+    try:
+        lexical_index = BM25Index.load(LEXICAL_INDEX_PATH)
+        print(f"Loaded BM25 index with {len(lexical_index)} chunks.")
+    except Exception as e:
+        print(f"Error loading BM25 index: {e}. Using vector search only.")
+        lexical_index = None
+    return lexical_index
+
+
+def load_domain_centroid():
+    global domain_centroid
+    if not os.path.exists(DOMAIN_CENTROID_PATH):
+        return None
+    try:
+        domain_centroid = DomainCentroid.load(DOMAIN_CENTROID_PATH)
+    except Exception as e:
+        print(f"Error loading domain centroid: {e}. Routing on keywords only.")
+        domain_centroid = None
+    return domain_centroid
+
+
+def save_domain_centroid(vector_store, centroid_sum):
+    """Saves the centroid of ingestion's running embedding sum.
+
+    If the sum does not cover exactly the stored chunks, as when no sum was
+    saved by an earlier run, it is rebuilt once from every stored embedding.
+    """
+    global domain_centroid
+    if centroid_sum.count != document_count(vector_store):
+        print("Rebuilding the domain centroid from the stored embeddings.")
+        centroid_sum = CentroidSum()
+        centroid_sum.add(vector_store.get(include=["embeddings"])["embeddings"])
+    domain_centroid = centroid_sum.centroid()
+    if domain_centroid is None:
+        return None
+    domain_centroid.save(DOMAIN_CENTROID_PATH)
+    return domain_centroid
+
+
+def build_retriever(vector_store):
+    # Keep similarity scores on each Document so the relevance gate can use them
+    hybrid = configs.retrieval_mode == "hybrid" and lexical_index is not None
+    k = configs.hybrid_candidates if hybrid else configs.retrieval_k
+    if configs.retriever_keep_scores:
+        vector_retriever = ScoredVectorStoreRetriever(
+            vectorstore=vector_store, search_kwargs={"k": k}
+        )
+    else:
+        vector_retriever = vector_store.as_retriever(search_kwargs={"k": k})
+    if not hybrid:
+        return vector_retriever
+    return HybridRetriever(
+        vector_retriever=vector_retriever,
+        lexical_index=lexical_index,
+        k=configs.retrieval_k,
+        candidates=configs.hybrid_candidates,
+        rrf_k=configs.hybrid_rrf_k,
+    )
+
+
+def init_vector_store():
+    """Builds the embedding client, opens the Chroma store and its retriever."""
+    global vector_store_grants, retriever, _initialised
+    _initialised = True
+    init_embedding_model()
+
+    # --- Initialize Retriever ---
+    if embedding_model:  # Proceed only if the embedding model was initialized
+        try:
+            # Initialising a Chroma object for vector_store_grants.
+            # If GRANTS_VECTORSTORE_PATH exists, Chroma will attempt to load it.
+            # If not, it's an in-memory ready instance for ingest_markdown_docs.py to populate and persist.
+            print(
+                f"Initializing {configs.vector_backend} vector store for 'vector_store_grants' with path: {GRANTS_VECTORSTORE_PATH} and collection: '{COLLECTION_NAME}'"
+            )
+
+            vector_store_grants = open_vector_store()
+            print(
+                f"'vector_store_grants' ({type(vector_store_grants).__name__} instance) initialized."
+            )
+
+            # Initialize retriever only if the persistent store exists AND has documents.
+            # Check if the collection actually has documents before creating a retriever
+            if os.path.exists(GRANTS_VECTORSTORE_PATH) and os.path.isdir(
+                GRANTS_VECTORSTORE_PATH
+            ):
+                # The vector_store_grants instance above would have loaded data if the path existed.
+                if (
+                    document_count(vector_store_grants) > 0
+                ):  # Check if the collection has any documents
+                    if configs.retrieval_mode == "hybrid":
+                        load_lexical_index()
+                    if configs.query_router_centroid:
+                        load_domain_centroid()
+                    retriever = build_retriever(vector_store_grants)
+                    print(
+                        f"Retriever initialized from existing vector store with {document_count(vector_store_grants)} documents."
+                    )
+                else:
+                    # This means the directory exists but the specific collection is empty or not found as expected.
+                    print(
+                        f"Vector store path {GRANTS_VECTORSTORE_PATH} exists but collection '{COLLECTION_NAME}' is empty. Retriever not initialized. Run ingestion."
+                    )
             else:
-                # This means the directory exists but the specific collection is empty or not found as expected.
+                # This case will be hit by ingest_markdown_docs.py on its first run.
+                # vector_store_grants is a Chroma instance, but retriever remains None.
                 print(
-                    f"Vector store path {GRANTS_VECTORSTORE_PATH} exists but collection '{COLLECTION_NAME}' is empty. Retriever not initialized. Run ingestion."
+                    f"Vector store path {GRANTS_VECTORSTORE_PATH} does not exist. Retriever not initialized. Ingestion script should create it."
                 )
-        else:
-            # This case will be hit by ingest_markdown_docs.py on its first run.
-            # vector_store_grants is a Chroma instance, but retriever remains None.
-            print(
-                f"Vector store path {GRANTS_VECTORSTORE_PATH} does not exist. Retriever not initialized. Ingestion script should create it."
-            )
 
-    except Exception as e:
-        print(f"Error during Chroma/Retriever initialization: {e}")
-        vector_store_grants = None  # Ensure reset on error
-        retriever = None
-else:
-    print(
-        "Embedding model not initialized. Vector store and retriever will be unavailable."
-    )
+        except Exception as e:
+            print(f"Error during Chroma/Retriever initialization: {e}")
+            vector_store_grants = None  # Ensure reset on error
+            retriever = None
+    else:
+        print(
+            "Embedding model not initialized. Vector store and retriever will be unavailable."
+        )
 
+    # Final status print for clarity during startup
+    if vector_store_grants is None:
+        # This should now only happen if embedding_model failed OR the Chroma() call itself failed.
+        print(
+            "`vector_store_grants` is None. Ingestion script might not work as expected if it relies on this instance being pre-loaded."
+        )
+    if retriever is None:
+        print(
+            "`retriever` is None. Agentic graph queries to the vector store will likely fail or use no context."
+        )
 
-# Final status print for clarity during startup
-if vector_store_grants is None:
-    # This should now only happen if embedding_model failed OR the Chroma() call itself failed.
-    print(
-        "`vector_store_grants` is None. Ingestion script might not work as expected if it relies on this instance being pre-loaded."
-    )
-if retriever is None:
-    print(
-        "`retriever` is None. Agentic graph queries to the vector store will likely fail or use no context."
-    )
+
+def add_embedded_documents(vector_store, documents, embeddings, ids=None):
+    """Writes already-embedded documents to the store in bulk, without the
+    store calling the embedding model again."""
+    texts = [doc.page_content for doc in documents]
+    ids = ids or [doc.id or uuid.uuid4().hex for doc in documents]
+    if isinstance(vector_store, NumpyVectorStore):
+        metadatas = [doc.metadata for doc in documents]
+        vector_store.add_vectors(embeddings, texts, metadatas, ids)
+        return ids
+    # Chroma rejects empty metadata dicts but accepts None
+    metadatas = [doc.metadata or None for doc in documents]
+    max_batch = vector_store._client.get_max_batch_size()
+    for start in range(0, len(ids), max_batch):
+        end = start + max_batch
+        vector_store._collection.upsert(
+            ids=ids[start:end],
+            embeddings=embeddings[start:end],
+            documents=texts[start:end],
+            metadatas=metadatas[start:end],
+        )
+    return ids
+
+
+def clear_documents(vector_store):
+    """Empties the store, which for Chroma means recreating the collection
+    so it accepts vectors of a new size."""
+    if isinstance(vector_store, NumpyVectorStore):
+        vector_store.clear()
+        return
+    vector_store.reset_collection()
+
+
+def iter_embeddings(vector_store, ids, batch_size=1000):
+    """Stored vectors of the chunks ``ids``, a batch at a time."""
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start : start + batch_size]
+        yield vector_store.get(ids=batch, include=["embeddings"])["embeddings"]
+
+
+def delete_documents(vector_store, ids):
+    if isinstance(vector_store, NumpyVectorStore):
+        vector_store.delete(ids)
+        return
+    max_batch = vector_store._client.get_max_batch_size()
+    for start in range(0, len(ids), max_batch):
+        vector_store.delete(ids=ids[start : start + max_batch])
+
+
+def write_index_version():
+    """Records a new index version. Called by ingestion after the store changes."""
+    version = uuid.uuid4().hex
+    os.makedirs(GRANTS_VECTORSTORE_PATH, exist_ok=True)
+    with open(INDEX_VERSION_PATH, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "created_at": time.time()}, f)
+    print(f"Wrote index version {version} to {INDEX_VERSION_PATH}")
+    return version
+
+
+def read_index_version():
+    """Returns the current index version, re-reading the file only when it changes."""
+    global _index_version
+    try:
+        mtime = os.stat(INDEX_VERSION_PATH).st_mtime
+    except OSError:
+        return "unversioned"
+    if _index_version[0] != mtime:
+        with open(INDEX_VERSION_PATH, encoding="utf-8") as f:
+            _index_version = (mtime, json.load(f)["version"])
+    return _index_version[1]
+
+
+def embedding_cache_stats():
+    if isinstance(embedding_model, CachedEmbeddings):
+        return embedding_model.stats()
+    return None
+
+
+def embedding_batch_stats():
+    underlying = getattr(embedding_model, "underlying", None)
+    if isinstance(underlying, BatchingEmbeddings):
+        return underlying.stats()
+    return None
+
+
+def get_embedding_model():
+    if not _initialised:
+        init_vector_store()
+    return embedding_model
+
+
+def get_vector_store():
+    if not _initialised:
+        init_vector_store()
+    return vector_store_grants
+
+
+def get_domain_centroid():
+    if not _initialised:
+        init_vector_store()
+    return domain_centroid
+
+
+def get_retriever():
+    if not _initialised:
+        init_vector_store()
+    return retriever
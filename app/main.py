@@ -1,14 +1,22 @@
 # Use standard logging setup
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
 from app.chat.router import router as chat_router
+from app.clients.azure_openai_config import close_chat_clients, llm_pool_stats
 from app.common.mongo import get_mongo_client
+from app.common.tls import init_custom_certificates
 from app.common.tracing import TraceIdMiddleware
+from app.config import config
+from app.core.agents.agentic_graph import get_graph
+from app.core.prompts.registry import load_prompts
+from app.core.rag.vector_store import init_vector_store
 from app.example.router import router as example_router
 from app.health.router import router as health_router
+from app.stats.router import router as stats_router
 
 # --- Configure logging (ensure this is done) ---
 # Example basic config (replace with your preferred setup if needed):
@@ -23,10 +31,16 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     # Startup
+    init_custom_certificates()
+    await asyncio.to_thread(load_prompts, config.prompt_hub_refresh)
+    await asyncio.to_thread(init_vector_store)
+    get_graph()
     client = await get_mongo_client()
     logger.info("MongoDB client connected")
     yield
     # Shutdown
+    logger.info("LLM connection pool stats: %s", llm_pool_stats())
+    await close_chat_clients()
     if client:
         # Motor's close is not awaitable according to docs
         client.close()  # Corrected based on Motor docs
@@ -42,6 +56,7 @@ app.add_middleware(TraceIdMiddleware)
 app.include_router(health_router)
 app.include_router(example_router)
 app.include_router(chat_router)
+app.include_router(stats_router)
 
 logger.info("Application startup complete with query endpoint.")
 
@@ -0,0 +1,28 @@
+from fastapi import APIRouter
+
+from app.clients.azure_openai_config import llm_pool_stats
+from app.core.agents.agentic_graph import relevance_gate_stats
+from app.core.agents.budget import degradation_stats
+from app.core.agents.query_router import query_route_stats
+from app.core.agents.speculation import speculation_summary
+from app.core.cache.response_cache import response_cache
+from app.core.cache.semantic_cache import semantic_cache
+from app.core.rag.vector_store import embedding_batch_stats, embedding_cache_stats
+
+router = APIRouter()
+
+
+# Runtime counters for the shared clients and caches used by the query path
+@router.get("/stats")
+async def stats():
+    return {
+        "llm_connection_pool": llm_pool_stats(),
+        "response_cache": response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "embedding_batching": embedding_batch_stats(),
+        "relevance_gate": relevance_gate_stats,
+        "query_router": query_route_stats,
+        "speculative_retrieval": speculation_summary(),
+        "budget_degradation": degradation_stats,
+    }
@@ -0,0 +1,90 @@
+"""Speed and shape of the Markdown chunker against the recursive splitter.
+
+Both split the processed grants (PROCESSED_GRANTS_PATH) with the chunk size
+and overlap used by ingestion. Reported per splitter: time, chunk count,
+mean tokens per chunk, and how many chunks straddle a section, i.e. start
+part-way through one section and run on into the next header.
+
+    python -m tests.benchmarks.bench_chunkers
+    python -m tests.benchmarks.bench_chunkers --synthetic 500
+"""
+
+import argparse
+import statistics
+import time
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.config import config
+from app.core.rag.embedding_ingestion import count_tokens
+from app.core.rag.ingest_markdown_docs import (
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    record_to_document,
+)
+from app.core.rag.jsonl import iter_jsonl
+from app.core.rag.markdown_chunker import HEADER_RE, MarkdownChunker
+
+
+def synthetic_records(count):
+    from app.core.rag.download_farming_grants import convert_fetched_item
+    from tests.benchmarks.bench_cpu_stages import synthetic_items
+
+    return [convert_fetched_item(item) for item in synthetic_items(count)]
+
+
+def straddles(text):
+    """Starts mid-section and crosses into another one."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    return not HEADER_RE.match(lines[0]) and any(
+        HEADER_RE.match(line) for line in lines[1:]
+    )
+
+
+def measure(name, splitter, documents):
+    start = time.perf_counter()
+    chunks = splitter.split_documents(documents)
+    seconds = time.perf_counter() - start
+    tokens = [count_tokens(chunk.page_content) for chunk in chunks]
+    straddling = sum(straddles(chunk.page_content) for chunk in chunks)
+    print(
+        f"{name:>10} {seconds:>8.2f} {len(chunks):>7} "
+        f"{statistics.mean(tokens):>8.0f} {max(tokens):>6} {straddling:>10}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processed", default=config.processed_grants_path)
+    parser.add_argument("--synthetic", type=int, metavar="GRANTS")
+    args = parser.parse_args()
+
+    records = (
+        synthetic_records(args.synthetic)
+        if args.synthetic
+        else list(iter_jsonl(args.processed))
+    )
+    documents = [doc for doc in map(record_to_document, records) if doc is not None]
+    count_tokens("warm up")  # Load the encoding outside the timings
+
+    print(f"chunk_size={CHUNK_SIZE}, chunk_overlap={CHUNK_OVERLAP}")
+    print(
+        f"{'splitter':>10} {'seconds':>8} {'chunks':>7} "
+        f"{'mean tok':>8} {'max':>6} {'straddling':>10}"
+    )
+    measure(
+        "recursive",
+        RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+        ),
+        documents,
+    )
+    measure(
+        "markdown",
+        MarkdownChunker(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP),
+        documents,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Memory per chunk and recall of compact embedding settings.
+
+Recall@k is measured against exact search over the full 1536-dim float32
+vectors, for every combination of reduced dimension and quantisation. Reduced
+dimensions are made by truncating and renormalising the stored vectors, which
+is what the embedding API does for text-embedding-3 models.
+
+By default the chunks come from the ingested Chroma collection and the queries
+below are embedded with the configured model, so Azure OpenAI credentials are
+needed. ``--synthetic`` runs offline on generated vectors instead.
+
+    python -m tests.benchmarks.bench_compact_embeddings
+    python -m tests.benchmarks.bench_compact_embeddings --synthetic 5000
+"""
+
+import argparse
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.rag.numpy_store import NumpyVectorStore
+
+QUERIES = (
+    "What grants are available for hedgerow planting?",
+    "How much does the Capital Grants scheme pay for stone wall restoration?",
+    "Who is eligible for the Sustainable Farming Incentive?",
+    "What is the payment rate for herbal leys?",
+    "Can tenant farmers apply for SFI actions?",
+    "What are the rules for CSHT1 hedgerow management?",
+    "Is there funding for slurry stores and covers?",
+    "How do I apply for a Farming Equipment and Technology Fund grant?",
+    "What support is there for woodland creation on farmland?",
+    "When is the deadline for Countryside Stewardship Higher Tier applications?",
+    "Are there grants for improving water quality on farms?",
+    "What records do I need to keep for an SFI agreement?",
+    "Can I get funding for animal health and welfare reviews?",
+    "What is the maximum grant for the Improving Farm Productivity scheme?",
+    "Do I need a Rural Payments account to apply?",
+    "How are payments made for the no-use of insecticide action?",
+    "Is there funding for agroforestry?",
+    "What are the eligibility criteria for the Water Management grant?",
+    "Can I combine SFI with Countryside Stewardship?",
+    "What grants exist for protecting historic farm buildings?",
+)
+DIMENSIONS = (1536, 768, 512, 256)
+QUANTISATIONS = ("none", "float16", "int8")
+
+
+class UnusedEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        raise NotImplementedError
+
+    def embed_query(self, text):
+        raise NotImplementedError
+
+
+def synthetic_vectors(chunks, queries, dim=1536):
+    """Vectors whose variance falls off along the dimensions, as it does for
+    Matryoshka-trained models, with queries near randomly chosen chunks."""
+    rng = np.random.default_rng(0)
+    falloff = 1 / np.sqrt(1 + np.arange(dim) / 64)
+    vectors = rng.standard_normal((chunks, dim)) * falloff
+    picked = vectors[rng.choice(chunks, queries, replace=False)]
+    noise = rng.standard_normal((queries, dim)) * falloff
+    return vectors, picked + 0.8 * noise
+
+
+def indexed_vectors():
+    from app.core.rag.vector_store import (
+        get_embedding_model,
+        open_chroma,
+    )
+
+    embedding_model = get_embedding_model()
+    stored = open_chroma().get(include=["embeddings"])
+    queries = embedding_model.embed_documents(list(QUERIES))
+    return np.asarray(stored["embeddings"]), np.asarray(queries)
+
+
+def recall(store, queries, truth, dim, k):
+    found = 0
+    for query, expected in zip(queries, truth):
+        docs = store.similarity_search_by_vector(query[:dim], k=k)
+        found += len({doc.id for doc in docs} & expected)
+    return found / (len(queries) * k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--synthetic", type=int, metavar="CHUNKS")
+    parser.add_argument("--queries", type=int, default=len(QUERIES))
+    parser.add_argument("--rescore-candidates", type=int, default=40)
+    parser.add_argument("-k", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors, queries = synthetic_vectors(args.synthetic, args.queries)
+    else:
+        vectors, queries = indexed_vectors()
+    ids = [str(i) for i in range(len(vectors))]
+
+    exact = NumpyVectorStore(UnusedEmbeddings())
+    exact.add_vectors(vectors, ids, ids=ids)
+    truth = [
+        {doc.id for doc in exact.similarity_search_by_vector(query, k=args.k)}
+        for query in queries
+    ]
+
+    print(f"{len(vectors)} chunks, {len(queries)} queries, recall@{args.k}")
+    print(f"{'dims':>5} {'storage':>8} {'bytes/chunk':>12} {'recall':>7}")
+    for dim in DIMENSIONS:
+        for quantisation in QUANTISATIONS:
+            store = NumpyVectorStore(
+                UnusedEmbeddings(),
+                quantisation=quantisation,
+                rescore_candidates=args.rescore_candidates,
+            )
+            store.add_vectors(vectors[:, :dim], ids, ids=ids)
+            print(
+                f"{dim:>5} {quantisation:>8} {store.memory_per_chunk():>12} "
+                f"{recall(store, queries, truth, dim, args.k):>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Speedup of HTML conversion and token splitting with worker processes.
+
+The corpus snapshot is the GOV.UK content API responses saved in the HTTP
+cache by ``download_farming_grants`` (GOVUK_HTTP_CACHE_PATH), so no network
+is needed once a crawl has run. ``--synthetic`` generates grant pages
+instead. Each worker count runs both stages through ``CpuPool`` exactly as
+ingestion does; 0 is the in-process baseline.
+
+    python -m tests.benchmarks.bench_cpu_stages
+    python -m tests.benchmarks.bench_cpu_stages --synthetic 500 --workers 0 1 2 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from app.config import config
+from app.core.rag.cpu_pool import CpuPool
+from app.core.rag.download_farming_grants import convert_fetched_item
+from app.core.rag.ingest_markdown_docs import split_record
+
+PARAGRAPH = (
+    "<p>You can get funding for <strong>hedgerow planting</strong>, gapping up "
+    "and laying. Payments are made per metre once the work is complete and "
+    "has been checked by the Rural Payments Agency.</p>"
+)
+
+
+def snapshot_items(cache_path):
+    """Content API responses from the HTTP cache, as fetched items."""
+    items = []
+    for root, _, files in os.walk(cache_path):
+        for name in files:
+            with open(os.path.join(root, name), encoding="utf-8") as f:
+                entry = json.load(f)
+            link = entry["url"].split("/api/content", 1)[-1]
+            items.append({"link": link, "content_data": json.loads(entry["body"])})
+    return items
+
+
+def synthetic_items(count):
+    items = []
+    for i in range(count):
+        sections = "".join(
+            f"<h2>Section {s}</h2><ul><li>Item one</li><li>Item two</li></ul>"
+            + PARAGRAPH * 6
+            for s in range(8)
+        )
+        items.append(
+            {
+                "link": f"/synthetic-grant-{i}",
+                "content_data": {
+                    "title": f"Synthetic grant {i}",
+                    "description": "A generated grant page.",
+                    "details": {"body": sections},
+                },
+            }
+        )
+    return items
+
+
+async def collect(stream):
+    return [result async for _, result, error in stream if error is None]
+
+
+def run_stages(items, workers, chunksize):
+    with CpuPool(workers, chunksize) as pool:
+        start = time.perf_counter()
+        docs = asyncio.run(collect(pool.map(convert_fetched_item, items)))
+        converted = time.perf_counter()
+        chunks = asyncio.run(collect(pool.map(split_record, docs)))
+        split = time.perf_counter()
+    return converted - start, split - converted, sum(map(len, chunks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--snapshot", default=config.govuk_http_cache_path)
+    parser.add_argument("--synthetic", type=int, metavar="GRANTS")
+    parser.add_argument("--workers", type=int, nargs="+")
+    parser.add_argument("--chunksize", type=int, default=config.ingest_worker_chunksize)
+    args = parser.parse_args()
+
+    items = (
+        synthetic_items(args.synthetic)
+        if args.synthetic
+        else snapshot_items(args.snapshot)
+    )
+    if not items:
+        parser.error(f"no cached responses in {args.snapshot}; run a crawl first")
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted(
+        {0, cores} | {n for n in (1, 2, 4, 8) if n <= cores}
+    )
+
+    print(f"{len(items)} grants, {cores} cores, chunksize {args.chunksize}")
+    print(
+        f"{'workers':>7} {'convert s':>10} {'split s':>8} {'chunks':>7} {'speedup':>8}"
+    )
+    baseline = None
+    for count in workers:
+        convert, split, chunks = run_stages(items, count, args.chunksize)
+        total = convert + split
+        baseline = baseline or total
+        print(
+            f"{count:>7} {convert:>10.2f} {split:>8.2f} {chunks:>7} "
+            f"{baseline / total:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
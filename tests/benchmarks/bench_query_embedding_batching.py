@@ -0,0 +1,197 @@
+"""Retrieval under concurrent load, with and without query micro-batching.
+
+Starts a local fake Azure OpenAI embeddings server and points
+AzureOpenAIEmbeddings at it. The fake takes LATENCY_MS per request plus
+PER_TEXT_MS per input and serves at most --server-concurrency requests at
+once, like a deployment being throttled. Queries go through the same stack
+as the app: ScoredVectorStoreRetriever over a Chroma or numpy store of
+--chunks random vectors, embedding through CachedEmbeddings. For each
+concurrency it fires that many distinct queries at once, --rounds times, and
+reports the requests the server saw, throughput and per-query latency.
+
+    python -m tests.benchmarks.bench_query_embedding_batching
+    python -m tests.benchmarks.bench_query_embedding_batching --concurrency 50 200
+    python -m tests.benchmarks.bench_query_embedding_batching --backend numpy
+"""
+
+import argparse
+import asyncio
+import base64
+import statistics
+import threading
+import time
+import uuid
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from langchain_chroma import Chroma
+from langchain_openai import AzureOpenAIEmbeddings
+
+from app.core.rag.batching_embeddings import BatchingEmbeddings
+from app.core.rag.cached_embeddings import CachedEmbeddings
+from app.core.rag.numpy_store import NumpyVectorStore
+from app.core.rag.retrievers import ScoredVectorStoreRetriever
+
+DIMENSIONS = 1536
+
+
+class FakeEmbeddingsServer:
+    def __init__(self, latency_ms, per_text_ms, concurrency, port):
+        self.latency = latency_ms / 1000
+        self.per_text = per_text_ms / 1000
+        self.concurrency = concurrency
+        self.port = port
+        self.requests = 0
+        self.app = FastAPI()
+        self.app.post("/openai/deployments/{deployment}/embeddings")(self.embeddings)
+        self.server = uvicorn.Server(
+            uvicorn.Config(
+                self.app, port=port, log_level="warning", timeout_keep_alive=300
+            )
+        )
+        self.slots = None
+
+    async def embeddings(self, deployment: str, request: Request):  # noqa: ARG002
+        body = await request.json()
+        texts = body["input"]
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.concurrency)
+        async with self.slots:
+            self.requests += 1
+            await asyncio.sleep(self.latency + self.per_text * len(texts))
+        vector = np.full(DIMENSIONS, 0.01, dtype=np.float32)
+        if body.get("encoding_format") == "base64":
+            embedding = base64.b64encode(vector.tobytes()).decode()
+        else:
+            embedding = vector.tolist()
+        return {
+            "object": "list",
+            "model": "text-embedding-3-small",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": embedding}
+                for i in range(len(texts))
+            ],
+            "usage": {"prompt_tokens": len(texts), "total_tokens": len(texts)},
+        }
+
+    def start(self):
+        thread = threading.Thread(target=self.server.run, daemon=True)
+        thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+
+def azure_embeddings(port):
+    return AzureOpenAIEmbeddings(
+        model="text-embedding-3-small",
+        azure_deployment="text-embedding-3-small",
+        azure_endpoint=f"http://127.0.0.1:{port}",
+        api_key="fake",
+        api_version="2024-02-01",
+        # Token-length checks need the tiktoken encoding, which is not needed here
+        check_embedding_ctx_length=False,
+        max_retries=0,
+    )
+
+
+def build_retriever(backend, embeddings, vectors):
+    ids = [str(i) for i in range(len(vectors))]
+    texts = [f"chunk {i}" for i in ids]
+    if backend == "numpy":
+        store = NumpyVectorStore(embeddings)
+        store.add_vectors(vectors, texts, ids=ids)
+    else:
+        store = Chroma(
+            collection_name=f"bench-{uuid.uuid4().hex}", embedding_function=embeddings
+        )
+        store._collection.upsert(ids=ids, embeddings=vectors, documents=texts)
+    return ScoredVectorStoreRetriever(vectorstore=store, search_kwargs={"k": 4})
+
+
+def query_embeddings(azure, batched, args):
+    embeddings = azure
+    if batched:
+        embeddings = BatchingEmbeddings(
+            azure, window_ms=args.window_ms, max_batch_size=args.max_batch_size
+        )
+    # A fresh cache per run, so every query is a miss
+    return CachedEmbeddings(embeddings, model_name="text-embedding-3-small")
+
+
+async def run(retriever, concurrency, rounds):
+    latencies = []
+
+    async def retrieve(query):
+        start = time.perf_counter()
+        await retriever.ainvoke(query)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for r in range(rounds):
+        await asyncio.gather(
+            *(retrieve(f"grant question {r}-{i}") for i in range(concurrency))
+        )
+    return time.perf_counter() - start, sorted(latencies)
+
+
+async def measure(name, retriever, server, concurrency, rounds):
+    requests = server.requests
+    seconds, latencies = await run(retriever, concurrency, rounds)
+    queries = concurrency * rounds
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{concurrency:>6} {name:>9} {server.requests - requests:>9} "
+        f"{queries / seconds:>9.0f} {statistics.median(latencies) * 1000:>8.0f} "
+        f"{p99 * 1000:>8.0f}"
+    )
+
+
+async def compare(args, server):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.chunks, DIMENSIONS)).astype(np.float32)
+    # One client for every run: clients built and dropped one after another
+    # share an HTTP pool, and requests on it were left hanging
+    azure = azure_embeddings(args.port)
+    for concurrency in args.concurrency:
+        for name, batched in [("single", False), ("batched", True)]:
+            embeddings = query_embeddings(azure, batched, args)
+            retriever = build_retriever(args.backend, embeddings, vectors)
+            await measure(name, retriever, server, concurrency, args.rounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--per-text-ms", type=float, default=0.2)
+    parser.add_argument("--server-concurrency", type=int, default=8)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8799)
+    args = parser.parse_args()
+
+    server = FakeEmbeddingsServer(
+        args.latency_ms, args.per_text_ms, args.server_concurrency, args.port
+    )
+    server.start()
+
+    print(
+        f"server: {args.latency_ms} ms + {args.per_text_ms} ms/text, "
+        f"{args.server_concurrency} requests at once; window {args.window_ms} ms; "
+        f"{args.chunks} chunks in {args.backend}"
+    )
+    print(
+        f"{'conc':>6} {'embedder':>9} {'requests':>9} {'queries/s':>9} "
+        f"{'p50 ms':>8} {'p99 ms':>8}"
+    )
+    # One event loop throughout, as the OpenAI client's HTTP pool is bound to it
+    asyncio.run(compare(args, server))
+    server.server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
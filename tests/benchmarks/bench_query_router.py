@@ -0,0 +1,93 @@
+"""Per-query overhead of the query router that runs before any LLM call.
+
+Times the keyword match, the centroid similarity for an already-embedded
+query, and the whole classify_query() with the embedding served from memory,
+as it is when the semantic cache has embedded the query first. A real
+embedding cache miss adds one embeddings API round trip on top. For scale,
+the agent LLM call the router saves typically takes 0.5-2 s.
+
+    python -m tests.benchmarks.bench_query_router --runs 20000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+
+from app.config import config
+from app.core.agents import query_router
+from app.core.rag.domain_centroid import DomainCentroid
+
+QUERIES = (
+    "What grants are available for hedgerow planting?",
+    "Who is eligible for the Sustainable Farming Incentive?",
+    "What is the payment rate for herbal leys?",
+    "Can tenant farmers apply for SFI actions?",
+    "How do I reset my password?",
+    "What is the weather like in London tomorrow?",
+    "Tell me a joke about tractors",
+    "Is there funding for slurry stores and covers?",
+)
+
+
+class MemoryEmbeddings:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    async def aembed_query(self, text):
+        return self.vectors[text]
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p50 = statistics.median(timings) * 1e6
+    p99 = timings[int(len(timings) * 0.99)] * 1e6
+    print(f"{name:>22} p50 {p50:>8.2f} us   p99 {p99:>8.2f} us")
+
+
+def time_calls(func, runs):
+    timings = []
+    for i in range(runs):
+        query = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        func(query)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def time_classify(runs):
+    timings = []
+    for i in range(runs):
+        query = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        await query_router.classify_query(query)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centroid = DomainCentroid.from_vectors(rng.standard_normal((1000, args.dimensions)))
+    vectors = {q: rng.standard_normal(args.dimensions).tolist() for q in QUERIES}
+    query_router.get_domain_centroid = lambda: centroid
+    query_router.get_embedding_model = lambda: MemoryEmbeddings(vectors)
+    config.query_router_centroid = True
+
+    print(f"{args.runs} queries, {args.dimensions}-dim centroid")
+    report("keyword match", time_calls(query_router.match_keyword, args.runs))
+    report(
+        "centroid similarity",
+        time_calls(lambda q: centroid.similarity(vectors[q]), args.runs),
+    )
+    report("classify_query", asyncio.run(time_classify(args.runs)))
+
+
+if __name__ == "__main__":
+    main()
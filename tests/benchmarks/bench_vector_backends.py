@@ -0,0 +1,135 @@
+"""Query latency and memory of the Chroma and numpy vector backends.
+
+Each backend is built on disk with random unit vectors, then reopened in a
+fresh process that runs the queries, so the reported peak RSS is what a
+serving worker would pay for that index size.
+
+    python -m tests.benchmarks.bench_vector_backends --sizes 1000 10000 100000
+"""
+
+import argparse
+import multiprocessing
+import resource
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+CHROMA_MAX_BATCH = 5000
+
+
+class UnusedEmbeddings(Embeddings):
+    """Queries are run by vector, so the embedding model is never called."""
+
+    def embed_documents(self, texts):
+        raise NotImplementedError
+
+    def embed_query(self, text):
+        raise NotImplementedError
+
+
+def random_unit_vectors(count, dim, seed):
+    vectors = np.random.default_rng(seed).standard_normal((count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def open_store(backend, path):
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+
+        return Chroma(
+            persist_directory=path,
+            embedding_function=UnusedEmbeddings(),
+            collection_name="bench",
+        )
+    from app.core.rag.numpy_store import NumpyVectorStore
+
+    return NumpyVectorStore(UnusedEmbeddings(), path)
+
+
+def build(backend, path, size, dim):
+    vectors = random_unit_vectors(size, dim, seed=0)
+    ids = [str(i) for i in range(size)]
+    texts = [f"chunk {i}" for i in range(size)]
+    store = open_store(backend, path)
+    if backend == "chroma":
+        for start in range(0, size, CHROMA_MAX_BATCH):
+            end = start + CHROMA_MAX_BATCH
+            store._collection.add(
+                ids=ids[start:end],
+                embeddings=vectors[start:end],
+                documents=texts[start:end],
+            )
+    else:
+        store.add_vectors(vectors, texts, ids=ids)
+        store.persist()
+
+
+def query(backend, path, dim, queries, k, results):
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    store = open_store(backend, path)
+    latencies = []
+    for vector in random_unit_vectors(queries, dim, seed=1):
+        start = time.perf_counter()
+        store.similarity_search_by_vector(vector.tolist(), k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    results.put(
+        {
+            "p50_ms": statistics.median(latencies),
+            "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+            # ru_maxrss is in KiB on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "index_rss_mb": (
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+            )
+            / 1024,
+        }
+    )
+
+
+def run_in_process(target, *args):
+    context = multiprocessing.get_context("spawn")
+    process = context.Process(target=target, args=args)
+    process.start()
+    process.join()
+    if process.exitcode:
+        msg = f"{target.__name__}{args[:2]} exited with {process.exitcode}"
+        raise RuntimeError(msg)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy"])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=4)
+    args = parser.parse_args()
+
+    results = multiprocessing.get_context("spawn").Queue()
+    print(
+        f"{'backend':<8} {'chunks':>8} {'build s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'peak RSS MB':>12} {'index RSS MB':>13}"
+    )
+    for size in args.sizes:
+        for backend in args.backends:
+            with tempfile.TemporaryDirectory() as path:
+                start = time.perf_counter()
+                run_in_process(build, backend, path, size, args.dim)
+                build_seconds = time.perf_counter() - start
+                run_in_process(
+                    query, backend, path, args.dim, args.queries, args.k, results
+                )
+                row = results.get()
+            print(
+                f"{backend:<8} {size:>8} {build_seconds:>8.1f} {row['p50_ms']:>8.3f} "
+                f"{row['p99_ms']:>8.3f} {row['peak_rss_mb']:>12.0f} "
+                f"{row['index_rss_mb']:>13.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
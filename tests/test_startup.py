@@ -0,0 +1,99 @@
+"""Cold start benchmarks for a uvicorn worker.
+
+Importing app.main must stay side-effect free and cheap; all network and disk
+set-up happens in the FastAPI lifespan. The budgets can be tuned per machine
+with STARTUP_IMPORT_BUDGET_SECONDS and STARTUP_HEALTH_BUDGET_SECONDS.
+"""
+
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import httpx
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+IMPORT_BUDGET = float(os.environ.get("STARTUP_IMPORT_BUDGET_SECONDS", "5"))
+HEALTH_BUDGET = float(os.environ.get("STARTUP_HEALTH_BUDGET_SECONDS", "15"))
+
+
+def app_env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = str(REPO_ROOT)
+    return env
+
+
+def cumulative_import_seconds(importtime_output, module):
+    pattern = re.compile(rf"^import time:\s+\d+ \|\s+(\d+) \|\s*{re.escape(module)}$")
+    for line in importtime_output.splitlines():
+        match = pattern.match(line)
+        if match:
+            return int(match.group(1)) / 1_000_000
+    msg = f"{module} not found in -X importtime output"
+    raise AssertionError(msg)
+
+
+def mongo_reachable():
+    uri = urlparse(os.environ.get("MONGO_URI", "mongodb://127.0.0.1:27017/"))
+    try:
+        with socket.create_connection((uri.hostname, uri.port or 27017), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_import_is_fast_and_side_effect_free(tmp_path):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=tmp_path,
+        env=app_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    import_seconds = cumulative_import_seconds(result.stderr, "app.main")
+    print(f"import app.main: {import_seconds:.3f}s (budget {IMPORT_BUDGET}s)")
+    assert import_seconds < IMPORT_BUDGET
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.skipif(not mongo_reachable(), reason="lifespan needs MongoDB")
+def test_time_to_first_health_check(tmp_path):
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(  # noqa: S603
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        cwd=tmp_path,
+        env=app_env(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        elapsed = None
+        while time.perf_counter() - start < HEALTH_BUDGET:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/health", timeout=1)
+                if response.status_code == 200:
+                    elapsed = time.perf_counter() - start
+                    break
+            except httpx.TransportError:
+                pass
+            time.sleep(0.05)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    print(f"time to first /health: {elapsed}s (budget {HEALTH_BUDGET}s)")
+    assert elapsed is not None